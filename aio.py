@@ -0,0 +1,153 @@
+import asyncio
+import os
+from concurrent.futures import Executor
+from typing import AsyncIterator, Callable, Optional
+
+from classfile import ClassFile
+from classpath import ParseResult, parse_bytes
+
+
+def _read_file(path) -> bytes:
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+async def read_source(source):
+    """The bytes of one source: bytes-like as is, a path read in a thread, an
+    asyncio.StreamReader read to EOF, or a callable returning bytes or an awaitable of them.
+    """
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return source
+    if isinstance(source, (str, os.PathLike)):
+        return await asyncio.get_running_loop().run_in_executor(None, _read_file, source)
+    if isinstance(source, asyncio.StreamReader):
+        return await source.read()
+    if callable(source):
+        data = source()
+        return await data if asyncio.iscoroutine(data) or isinstance(data, asyncio.Future) else data
+    raise TypeError('cannot read a class from {!r}'.format(source))
+
+
+async def _keyed(sources):
+    # (key, source): explicit (name, source) pairs, paths by path and anything else by position
+    if hasattr(sources, '__aiter__'):
+        i = 0
+        async for item in sources:
+            yield _key(i, item)
+            i += 1
+    else:
+        for i, item in enumerate(sources):
+            yield _key(i, item)
+
+
+def _key(i, item):
+    if isinstance(item, tuple):
+        return item
+    if isinstance(item, (str, os.PathLike)):
+        return os.fspath(item), item
+    return i, item
+
+
+async def parse_sources(sources, executor: Optional[Executor] = None, concurrency=8, max_pending=None,
+                        project: Optional[Callable[[ClassFile], object]] = None, lazy=False,
+                        header_only=False) -> AsyncIterator[ParseResult]:
+    """Reads and parses every source, yielding one ParseResult per source in completion order.
+
+    `sources` is an iterable or async iterable of sources as accepted by read_source(),
+    or of (name, source) pairs; a result's `source` is that name, the path, or the
+    position of the source. At most `concurrency` sources are read or parsed at a
+    time and at most `max_pending` (default `concurrency`) finished results wait to be
+    consumed; when the consumer falls behind no further source is taken, so memory
+    stays flat however fast `sources` produces. Parsing runs in `executor`. If None,
+    that is the loop's default thread pool, which overlaps reads with parsing but,
+    because of the GIL, parses one class at a time; pass a ProcessPoolExecutor to
+    parse in parallel. There `project` must be picklable, and only its result
+    crosses the process boundary. Failures are reported on the result and never
+    stop the run; an error raised by `sources` itself is raised to the consumer.
+    """
+    loop = asyncio.get_running_loop()
+    results = asyncio.Queue(max_pending or concurrency)
+    slots = asyncio.Semaphore(concurrency)
+    done = object()
+
+    async def work(key, source):
+        try:
+            try:
+                data = await read_source(source)
+                if isinstance(data, memoryview):
+                    # process pools pickle the arguments, and memoryviews cannot be pickled
+                    data = data.tobytes()
+                # parse_bytes is the CPU-bound half and must be picklable for process pools
+                value = await loop.run_in_executor(executor, parse_bytes, data, project, lazy, header_only)
+                result = ParseResult(key, None, value)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                result = ParseResult(key, None, error='{}: {}'.format(type(e).__name__, e))
+            await results.put(result)
+        finally:
+            slots.release()
+
+    async def produce():
+        tasks = set()
+        try:
+            async for key, source in _keyed(sources):
+                await slots.acquire()
+                task = asyncio.ensure_future(work(key, source))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+            if tasks:
+                await asyncio.gather(*tasks)
+        except BaseException as e:
+            for task in tasks:
+                task.cancel()
+            if isinstance(e, asyncio.CancelledError):
+                raise
+            await results.put(e)
+            return
+        await results.put(done)
+
+    producer = asyncio.ensure_future(produce())
+    try:
+        while True:
+            item = await results.get()
+            if item is done:
+                break
+            if isinstance(item, BaseException):
+                raise item
+            yield item
+    finally:
+        if not producer.done():
+            producer.cancel()
+            try:
+                await producer
+            except asyncio.CancelledError:
+                pass
+
+
+if __name__ == "__main__":
+    import argparse
+    import sys
+    from concurrent.futures import ProcessPoolExecutor
+
+    from classpath import class_summary
+
+    parser = argparse.ArgumentParser(description='Parse .class files concurrently with asyncio.')
+    parser.add_argument('paths', nargs='+')
+    parser.add_argument('-j', '--workers', type=int, default=None, help='parser processes')
+    parser.add_argument('-c', '--concurrency', type=int, default=16, help='sources in flight')
+    args = parser.parse_args()
+
+    async def main() -> int:
+        failed = 0
+        with ProcessPoolExecutor(args.workers) as executor:
+            async for result in parse_sources(args.paths, executor, args.concurrency, project=class_summary,
+                                              header_only=True):
+                if result.ok:
+                    print('{}\t{} fields\t{} methods'.format(*result.value))
+                else:
+                    failed += 1
+                    print('{}\t{}'.format(result.source, result.error), file=sys.stderr)
+        return failed
+
+    sys.exit(1 if asyncio.run(main()) else 0)
@@ -0,0 +1,365 @@
+import json
+import os
+import sys
+from array import array
+from struct import Struct
+from typing import Dict, List, Optional, Tuple
+
+import store
+from attribute import (AnnotationElementValue, ArrayElementValue, ClassElementValue, ConstElementValue,
+                       EnumElementValue, RuntimeVisibleAnnotations, RuntimeVisibleParameterAnnotations)
+from base import Object
+from classpath import ARCHIVE_SUFFIXES, list_entries, map_classpath, split_classpath
+from const import ConstantPool
+from stream import BufferStream
+from visitor import SKIP, ClassVisitor, visit
+
+_FLOAT = Struct('>f')
+_DOUBLE = Struct('>d')
+
+# (annotation type descriptor, class name, kind, member name, member descriptor, parameter, values):
+# kind is 'class', 'field', 'method' or 'parameter', the member name and descriptor are empty for
+# a class and the parameter is -1 unless kind is 'parameter'. values is a dict from element
+# name to resolved value, see element_value(), as JSON written by encode_values().
+Record = Tuple[str, str, str, str, str, int, str]
+
+
+def element_value(pool: ConstantPool, value):
+    """An ElementValue resolved to Python literals: numbers, str and bool for constants,
+    ('enum', type descriptor, name), ('class', descriptor), ('@', type descriptor, {name: value})
+    for nested annotations and lists for arrays.
+    """
+    if isinstance(value, ConstElementValue):
+        const = pool[value.const_value_index]
+        tag = value.tag
+        if tag == 's':
+            return const.value
+        if tag == 'J':
+            bits = (const.high_bytes << 32) | const.low_bytes
+            return bits - (1 << 64) if bits >> 63 else bits
+        if tag == 'D':
+            return _DOUBLE.unpack(((const.high_bytes << 32) | const.low_bytes).to_bytes(8, 'big'))[0]
+        if tag == 'F':
+            return _FLOAT.unpack(const.bytes.to_bytes(4, 'big'))[0]
+        bits = const.bytes
+        number = bits - (1 << 32) if bits >> 31 else bits
+        if tag == 'Z':
+            return bool(number)
+        if tag == 'C':
+            return chr(number)
+        return number
+    if isinstance(value, EnumElementValue):
+        return 'enum', _utf8(pool, value.type_name_index), _utf8(pool, value.const_name_index)
+    if isinstance(value, ClassElementValue):
+        return 'class', _utf8(pool, value.class_info_index)
+    if isinstance(value, AnnotationElementValue):
+        return '@', _utf8(pool, value.annotation.type_index), _pairs(pool, value.annotation)
+    if isinstance(value, ArrayElementValue):
+        return [element_value(pool, v) for v in value.array_value]
+    raise ValueError('unknown element value {!r}'.format(value))
+
+
+def _encode(value):
+    # JSON has no tuples, NaN or infinities: floats keep their repr and the tuples
+    # element_value() returns become single-key objects named after their tag
+    if isinstance(value, float):
+        return {'float': repr(value)}
+    if isinstance(value, list):
+        return [_encode(v) for v in value]
+    if isinstance(value, tuple):
+        if value[0] == '@':
+            return {'@': [value[1], {k: _encode(v) for k, v in value[2].items()}]}
+        return {value[0]: list(value[1:])}
+    return value
+
+
+def _decode(value):
+    if isinstance(value, list):
+        return [_decode(v) for v in value]
+    if isinstance(value, dict):
+        (tag, body), = value.items()
+        if tag == 'float':
+            return float(body)
+        if tag == '@':
+            return '@', body[0], {k: _decode(v) for k, v in body[1].items()}
+        return (tag,) + tuple(body)
+    return value
+
+
+def encode_values(values: Dict[str, object]) -> str:
+    """Element values as resolved by element_value(), as JSON that decode_values() reads back exactly."""
+    return json.dumps({k: _encode(v) for k, v in values.items()}, separators=(',', ':'))
+
+
+def decode_values(text: str) -> Dict[str, object]:
+    return {k: _decode(v) for k, v in json.loads(text).items()}
+
+
+def _utf8(pool, index) -> str:
+    return pool[index].value
+
+
+def _pairs(pool, annotation) -> Dict[str, object]:
+    return {_utf8(pool, pair.element_name_index): element_value(pool, pair.value)
+            for pair in annotation.element_value_pairs}
+
+
+class _Collector(ClassVisitor):
+    # decodes only the two visible annotation attributes and skips everything else
+    def __init__(self):
+        self.records: List[Record] = []
+        self.pool = None
+        self.class_name = None
+        self.member = None
+
+    def visit_constant_pool(self, pool):
+        self.pool = pool
+
+    def visit_class(self, version, access_flags, name, super_name, interfaces):
+        self.class_name = name
+
+    def visit_field(self, access_flags, name, descriptor):
+        self.member = ('field', name, descriptor)
+
+    def visit_method(self, access_flags, name, descriptor):
+        self.member = ('method', name, descriptor)
+
+    def visit_field_end(self):
+        self.member = None
+
+    def visit_method_end(self):
+        self.member = None
+
+    def visit_attribute(self, name, body):
+        if name == 'RuntimeVisibleAnnotations':
+            kind, member, descriptor = self.member or ('class', '', '')
+            for annotation in RuntimeVisibleAnnotations(None, body).annotations:
+                self._add(annotation, kind, member, descriptor, -1)
+        elif name == 'RuntimeVisibleParameterAnnotations' and self.member is not None:
+            _, member, descriptor = self.member
+            parameters = RuntimeVisibleParameterAnnotations(None, body).parameter_annotations
+            for i, parameter in enumerate(parameters):
+                for annotation in parameter.annotations:
+                    self._add(annotation, 'parameter', member, descriptor, i)
+        return SKIP
+
+    def _add(self, annotation, kind, member, descriptor, parameter):
+        pool = self.pool
+        self.records.append((_utf8(pool, annotation.type_index), self.class_name, kind, member, descriptor,
+                             parameter, encode_values(_pairs(pool, annotation))))
+
+
+def scan_class(data) -> List[Record]:
+    """The visible class, field, method and parameter annotations of one class."""
+    collector = _Collector()
+    visit(BufferStream(data), collector)
+    return collector.records
+
+
+class AnnotatedElement(Object):
+    __slots__ = ('annotation', 'class_name', 'kind', 'name', 'descriptor', 'parameter', '_values')
+
+    def __init__(self, record: Record):
+        (self.annotation, self.class_name, self.kind, self.name, self.descriptor, self.parameter,
+         self._values) = record
+
+    @property
+    def values(self) -> Dict[str, object]:
+        """Element name to value, as resolved by element_value()."""
+        return decode_values(self._values)
+
+    def __repr__(self):
+        where = self.class_name
+        if self.kind != 'class':
+            where += '.{}{}'.format(self.name, self.descriptor)
+        if self.kind == 'parameter':
+            where += '#{}'.format(self.parameter)
+        return '{} {} {}'.format(self.annotation, self.kind, where)
+
+
+def _signature(path) -> Tuple[int, int]:
+    # (newest mtime in ns, total size) of an archive, or of the classes under a directory
+    if not os.path.isdir(path):
+        st = os.stat(path)
+        return st.st_mtime_ns, st.st_size
+    source, names = list_entries(path)
+    newest = total = 0
+    for name in names:
+        st = os.stat(os.path.join(source, name))
+        newest = max(newest, st.st_mtime_ns)
+        total += st.st_size
+    return newest, total + len(names)
+
+
+def _source(path) -> str:
+    if os.path.isdir(path) or path.endswith(ARCHIVE_SUFFIXES):
+        return path
+    return os.path.dirname(path) or '.'
+
+
+def _descriptor(annotation) -> str:
+    # accepts 'com/example/Component' as well as 'Lcom/example/Component;'
+    return annotation if annotation.startswith('L') and annotation.endswith(';') else 'L{};'.format(annotation)
+
+
+class AnnotationIndex(Object):
+    """Visible annotations of a classpath, from annotation type to the elements carrying it.
+
+    Records are kept per classpath entry together with that entry's modification
+    time and size, so update_classpath() rescans only the jars and directories that
+    changed. Lookups go through an annotation type index built on first use.
+    """
+    MAGIC = b'CFANNOT\0'
+    VERSION = 2
+
+    def __init__(self):
+        self.sources: Dict[str, Tuple[int, int]] = {}
+        self.records: Dict[str, List[Record]] = {}
+        self._by_type: Optional[Dict[str, List[Record]]] = None
+
+    def __repr__(self):
+        return 'AnnotationIndex({} sources, {} annotations)'.format(
+            len(self.sources), sum(map(len, self.records.values())))
+
+    @staticmethod
+    def from_classpath(paths, workers=None) -> 'AnnotationIndex':
+        index = AnnotationIndex()
+        index.update_classpath(paths, workers)
+        return index
+
+    def update_classpath(self, paths, workers=None, drop_missing=True) -> List[Tuple[str, str, str]]:
+        """Rescans the entries of `paths` that changed since they were indexed; returns
+        (source, entry, error) for classes that failed. Sources no longer on `paths` are
+        dropped unless `drop_missing` is False.
+        """
+        wanted = split_classpath(paths)
+        errors = []
+        stale = []
+        for path in wanted:
+            try:
+                signature = _signature(path)
+            except OSError as e:
+                self.sources.pop(path, None)
+                self.records.pop(path, None)
+                errors.append((path, '', '{}: {}'.format(type(e).__name__, e)))
+                continue
+            if self.sources.get(path) != signature:
+                self.sources[path] = signature
+                self.records[path] = []
+                stale.append(path)
+        if drop_missing:
+            for path in set(self.sources) - set(wanted):
+                del self.sources[path]
+                del self.records[path]
+        # jars and directories are reported under their own path; a lone .class file as
+        # (its directory, its name), which a directory on the classpath may report too,
+        # so the lone files are scanned on their own
+        trees = [path for path in stale if _source(path) == path]
+        files = {(_source(path), os.path.basename(path)): path for path in stale if _source(path) != path}
+        for paths, owner in ((trees, lambda r: r.source), (list(files.values()), lambda r: files[r.source, r.name])):
+            if not paths:
+                continue
+            for result in map_classpath(paths, scan_class, workers):
+                if result.ok:
+                    self.records[owner(result)].extend(result.value)
+                else:
+                    errors.append((result.source, result.name or '', result.error))
+        self._by_type = None
+        return errors
+
+    def _index(self) -> Dict[str, List[Record]]:
+        if self._by_type is None:
+            by_type = {}
+            for records in self.records.values():
+                for record in records:
+                    by_type.setdefault(record[0], []).append(record)
+            self._by_type = by_type
+        return self._by_type
+
+    def types(self) -> List[str]:
+        return sorted(self._index())
+
+    def annotated(self, annotation, kind=None) -> List[AnnotatedElement]:
+        """Every element annotated with `annotation`, optionally only of one kind."""
+        return [AnnotatedElement(r) for r in self._index().get(_descriptor(annotation), ())
+                if kind is None or r[2] == kind]
+
+    def classes_with(self, annotation) -> List[str]:
+        """Classes annotated with `annotation` themselves, not through a member."""
+        return sorted({r[1] for r in self._index().get(_descriptor(annotation), ()) if r[2] == 'class'})
+
+    def save(self, path):
+        symbols = []
+        symbol_ids = {}
+
+        def intern(s):
+            i = symbol_ids.get(s)
+            if i is None:
+                i = symbol_ids[s] = len(symbols)
+                symbols.append(s)
+            return i
+
+        sources = list(self.sources)
+        mtimes = array('q', [self.sources[s][0] for s in sources])
+        sizes = array('q', [self.sources[s][1] for s in sources])
+        offsets = array('I', [0])
+        # one flat row of 7 ints per record; the parameter is stored as is
+        rows = array('i')
+        for source in sources:
+            for record in self.records[source]:
+                rows.extend([intern(part) for part in record[:5]] + [record[5], intern(record[6])])
+            offsets.append(len(rows) // 7)
+
+        def write(out):
+            store.write_header(out, self.MAGIC, self.VERSION)
+            store.write_strings(out, sources)
+            store.write_strings(out, symbols)
+            for values in (mtimes, sizes, offsets, rows):
+                store.write_array(out, values)
+        store.save(path, write)
+
+    @staticmethod
+    def load(path) -> 'AnnotationIndex':
+        stream = store.load(path)
+        store.read_header(stream, AnnotationIndex.MAGIC, AnnotationIndex.VERSION)
+        sources = store.read_strings(stream)
+        symbols = store.read_strings(stream)
+        mtimes = store.read_array(stream, 'q')
+        sizes = store.read_array(stream, 'q')
+        offsets = store.read_array(stream, 'I')
+        rows = store.read_array(stream, 'i')
+        index = AnnotationIndex()
+        for i, source in enumerate(sources):
+            index.sources[source] = (mtimes[i], sizes[i])
+            index.records[source] = [
+                (symbols[rows[j]], symbols[rows[j + 1]], symbols[rows[j + 2]], symbols[rows[j + 3]],
+                 symbols[rows[j + 4]], rows[j + 5], symbols[rows[j + 6]])
+                for j in range(7 * offsets[i], 7 * offsets[i + 1], 7)]
+        return index
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Build, update or query an annotation index of a classpath.')
+    sub = parser.add_subparsers(dest='command', required=True)
+    build = sub.add_parser('build', help='index the given paths, rescanning only what changed')
+    build.add_argument('index')
+    build.add_argument('paths', nargs='+')
+    build.add_argument('-j', '--workers', type=int, default=None)
+    query = sub.add_parser('query')
+    query.add_argument('index')
+    query.add_argument('annotation', help='e.g. org/springframework/stereotype/Component')
+    query.add_argument('--kind', choices=['class', 'field', 'method', 'parameter'])
+    query.add_argument('--values', action='store_true', help='also print the element values')
+    args = parser.parse_args()
+
+    if args.command == 'build':
+        annotations = AnnotationIndex.load(args.index) if os.path.exists(args.index) else AnnotationIndex()
+        for source, name, error in annotations.update_classpath(args.paths, args.workers):
+            print('{}{}\t{}'.format(source, '!' + name if name else '', error), file=sys.stderr)
+        annotations.save(args.index)
+        print(annotations)
+    else:
+        for element in AnnotationIndex.load(args.index).annotated(args.annotation, args.kind):
+            print('{}\t{}'.format(element, element.values) if args.values else element)
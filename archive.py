@@ -0,0 +1,196 @@
+import mmap
+import zlib
+from struct import Struct
+from typing import Dict, Iterator, List, Optional, Union
+
+from base import Object
+from stream import BufferStream
+
+_EOCD = Struct('<4s4H2IH')
+_EOCD64_LOCATOR = Struct('<4sIQI')
+_EOCD64 = Struct('<4sQ2H2I4Q')
+_CENTRAL = Struct('<4s6H3I5H2I')
+_LOCAL = Struct('<4s5H3I2H')
+_ZIP64_EXTRA = 0x0001
+_STORED = 0
+_DEFLATED = 8
+# jmod files are a zip behind a 4-byte header
+JMOD_MAGIC = b'JM\x01\x00'
+
+
+class ArchiveEntry(Object):
+    __slots__ = ('name', 'method', 'flags', 'crc', 'compressed_size', 'size', 'header_offset')
+
+    def __init__(self, name, method, flags, crc, compressed_size, size, header_offset):
+        self.name = name
+        self.method = method
+        self.flags = flags
+        self.crc = crc
+        self.compressed_size = compressed_size
+        self.size = size
+        # of the local file header, from the start of the mapped file
+        self.header_offset = header_offset
+
+
+class Archive(Object):
+    """A zip, jar or jmod mapped into memory and indexed from its central directory.
+
+    Nothing but the central directory is read up front. Stored entries are returned
+    as memoryviews over the map and deflated ones are inflated when read. Classes are
+    looked up by name in a dict, so a jmod's `classes/` prefix needs no scanning.
+    Classes parsed lazily from the views keep the map alive; close() only unmaps once
+    none of them are left. Entry CRCs are not verified.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            self.entries: Dict[str, ArchiveEntry] = {}
+            self.classes: Dict[str, ArchiveEntry] = {}
+            self._read_central_directory()
+        except Exception:
+            self.map.close()
+            raise
+        self.class_prefix = 'classes/' if self.map[:4] == JMOD_MAGIC else ''
+        prefix = self.class_prefix
+        for name, entry in self.entries.items():
+            if name.endswith('.class') and name.startswith(prefix):
+                self.classes[name[len(prefix):-6]] = entry
+
+    def _read_central_directory(self):
+        data = self.map
+        # the end record is followed by a comment of at most 64K
+        eocd = data.rfind(b'PK\x05\x06', max(0, len(data) - _EOCD.size - 0xFFFF))
+        if eocd < 0:
+            raise ValueError('{}: not a zip file'.format(self.path))
+        _, _, _, _, count, cd_size, cd_offset, _ = _EOCD.unpack_from(data, eocd)
+        end = eocd
+        locator = eocd - _EOCD64_LOCATOR.size
+        if locator >= 0 and data[locator:locator + 4] == b'PK\x06\x07':
+            end = locator - _EOCD64.size
+            signature, _, _, _, _, _, _, count, cd_size, cd_offset = _EOCD64.unpack_from(data, end)
+            if signature != b'PK\x06\x06':
+                raise ValueError('{}: bad zip64 end of central directory'.format(self.path))
+        # bytes in front of the zip, such as a jmod header; offsets in the directory exclude them
+        base = end - cd_size - cd_offset
+        if base < 0:
+            raise ValueError('{}: bad central directory offset'.format(self.path))
+        pos = base + cd_offset
+        for _ in range(count):
+            (signature, _, _, flags, method, _, _, crc, compressed_size, size, name_length, extra_length,
+             comment_length, _, _, _, header_offset) = _CENTRAL.unpack_from(data, pos)
+            if signature != b'PK\x01\x02':
+                raise ValueError('{}: bad central directory entry at {}'.format(self.path, pos))
+            pos += _CENTRAL.size
+            raw_name = data[pos:pos + name_length]
+            # bit 11: the name is UTF-8, otherwise cp437
+            name = raw_name.decode('utf-8' if flags & 0x800 else 'cp437')
+            pos += name_length
+            if 0xFFFFFFFF in (size, compressed_size, header_offset):
+                size, compressed_size, header_offset = _zip64_extra(
+                    data[pos:pos + extra_length], size, compressed_size, header_offset)
+            pos += extra_length + comment_length
+            self.entries[name] = ArchiveEntry(name, method, flags, crc, compressed_size, size, base + header_offset)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        try:
+            self.map.close()
+        except BufferError:
+            # views are still in use; the map is released with the last of them
+            pass
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, name):
+        return name in self.entries
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.entries)
+
+    def __repr__(self):
+        return 'Archive({!r}, {} entries)'.format(self.path, len(self.entries))
+
+    def class_entry_names(self) -> List[str]:
+        """Entry names of every class, e.g. for classpath work units."""
+        return [entry.name for entry in self.classes.values()]
+
+    def read(self, name) -> Union[memoryview, bytes]:
+        return self.read_entry(self.entries[name])
+
+    def read_entry(self, entry: ArchiveEntry) -> Union[memoryview, bytes]:
+        if entry.flags & 0x1:
+            raise ValueError('{}: {} is encrypted'.format(self.path, entry.name))
+        data = self.map
+        signature, _, _, _, _, _, _, _, _, name_length, extra_length = _LOCAL.unpack_from(data, entry.header_offset)
+        if signature != b'PK\x03\x04':
+            raise ValueError('{}: bad local header for {}'.format(self.path, entry.name))
+        start = entry.header_offset + _LOCAL.size + name_length + extra_length
+        view = memoryview(data)[start:start + entry.compressed_size]
+        if entry.method == _STORED:
+            return view
+        if entry.method == _DEFLATED:
+            inflater = zlib.decompressobj(-zlib.MAX_WBITS)
+            return inflater.decompress(view) + inflater.flush()
+        raise ValueError('{}: {} uses unsupported compression method {}'.format(self.path, entry.name, entry.method))
+
+    def read_class(self, class_name) -> Optional[Union[memoryview, bytes]]:
+        """The bytes of the class named like 'java/lang/String', None if it is not in the archive."""
+        entry = self.classes.get(class_name)
+        return None if entry is None else self.read_entry(entry)
+
+    def stream(self, name) -> BufferStream:
+        return BufferStream(self.read(name))
+
+
+def _zip64_extra(extra, size, compressed_size, header_offset):
+    # the zip64 field holds, in this order, only those values that overflowed
+    pos = 0
+    while pos + 4 <= len(extra):
+        tag = int.from_bytes(extra[pos:pos + 2], 'little')
+        length = int.from_bytes(extra[pos + 2:pos + 4], 'little')
+        if tag == _ZIP64_EXTRA:
+            field = pos + 4
+            values = []
+            for value in (size, compressed_size, header_offset):
+                if value == 0xFFFFFFFF:
+                    value = int.from_bytes(extra[field:field + 8], 'little')
+                    field += 8
+                values.append(value)
+            return values
+        pos += 4 + length
+    raise ValueError('zip64 sizes without a zip64 extra field')
+
+
+if __name__ == "__main__":
+    import argparse
+    import sys
+    import time
+
+    from classfile import ClassFile
+
+    parser = argparse.ArgumentParser(description='List or look up classes in a jar or jmod without extracting it.')
+    parser.add_argument('archive')
+    parser.add_argument('classes', nargs='*', help="class names such as java/lang/String; all if omitted")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    with Archive(args.archive) as archive:
+        opened = time.perf_counter()
+        for name in args.classes or archive.classes:
+            data = archive.read_class(name)
+            if data is None:
+                print('{}: not found'.format(name), file=sys.stderr)
+                continue
+            cf = ClassFile(BufferStream(data), header_only=True)
+            print('{}\t{} bytes\t{} fields\t{} methods'.format(cf.name, len(data), len(cf.fields), len(cf.methods)))
+            del cf, data
+    print('{} indexed in {:.1f} ms'.format(archive, (opened - start) * 1000), file=sys.stderr)
@@ -1,70 +1,233 @@
-from io import BytesIO
+from time import perf_counter
 from typing import List
 
 from base import Object
+from cfg import ControlFlowGraph
 from const import Utf8Info
-from instruction import Instruction, INSTRUCTIONS
-from stream import Stream
+from instruction import Instruction, InstructionTable, INSTRUCTIONS
+from stream import BufferStream, OutputStream, Stream
 
 
 class Attribute(Object):
+    __slots__ = ('name_index',)
+
     @staticmethod
     def read(class_file, stream: Stream):
         name_index = stream.read_u2()
         name: Utf8Info = class_file.constants[name_index]
-        # noinspection PyTypeChecker
-        s = Stream(BytesIO(stream.read_bytes(stream.read_u4())))
-        return ATTRIBUTES[name.bytes](class_file, s)
+        body = stream.sub_stream(stream.read_u4())
+        if class_file.hook is not None:
+            class_file.hook('attribute', name.value, body.end - body.start)
+        if class_file.lazy:
+            return LazyAttribute(class_file, name_index, ATTRIBUTES.get(name.bytes, UnknownAttribute), body)
+        attr = ATTRIBUTES.get(name.bytes, UnknownAttribute)(class_file, body)
+        attr.name_index = name_index
+        return attr
+
+    def write(self, out: OutputStream):
+        out.write_u2(self.name_index)
+        length_pos = out.tell()
+        out.write_u4(0)
+        self.write_info(out)
+        out.patch_u4(length_pos, out.tell() - length_pos - 4)
+
+    def write_info(self, out: OutputStream):
+        # the body, i.e. everything __init__ reads
+        raise NotImplementedError(type(self).__name__)
+
+
+def skip_attributes(stream: Stream):
+    for _ in range(stream.read_u2()):
+        _, length = stream.read_fields('u2 u4')
+        stream.skip(length)
+
+
+def write_attributes(out: OutputStream, attributes):
+    out.write_u2(len(attributes))
+    for attr in attributes:
+        attr.write(out)
+
+
+class UnknownAttribute(Attribute):
+    """Attribute with a name this library does not decode; the body is kept as is."""
+    __slots__ = ('info',)
+
+    def __init__(self, _, stream: BufferStream):
+        self.info = stream.read_bytes(stream.remaining())
+
+    def write_info(self, out: OutputStream):
+        out.write_bytes(self.info)
+
+
+class LazyAttribute(Object):
+    """Undecoded attribute: its name index plus the byte range of its body.
+
+    `cls` is the attribute class the name maps to, UnknownAttribute for names
+    without one, so lookups by type never need to decode anything.
+    """
+    __slots__ = ('class_file', 'name_index', 'cls', 'buffer', 'offset', 'length')
+
+    def __init__(self, class_file, name_index, cls, body: BufferStream):
+        self.class_file = class_file
+        self.name_index = name_index
+        self.cls = cls
+        self.buffer = body.buffer
+        self.offset = body.start
+        self.length = body.end - body.start
+
+    def decode(self) -> Attribute:
+        attr = self.cls(self.class_file, BufferStream(self.buffer, self.offset, self.length))
+        attr.name_index = self.name_index
+        return attr
+
+    def write(self, out: OutputStream):
+        out.write_u2(self.name_index)
+        out.write_u4(self.length)
+        out.write_bytes(self.buffer[self.offset:self.offset + self.length])
+
+    def __getstate__(self):
+        # keep only this attribute's bytes rather than the whole class buffer
+        state = self.get_state()
+        state['buffer'] = self.buffer[self.offset:self.offset + self.length].tobytes()
+        state['offset'] = 0
+        return None, state
+
+    def __setstate__(self, state):
+        for name, value in state[1].items():
+            setattr(self, name, value)
+        self.buffer = memoryview(self.buffer)
+
+    def __repr__(self):
+        return 'LazyAttribute({}, {} bytes)'.format(self.cls.__name__, self.length)
 
 
 class AttributeMixin(object):
+    __slots__ = ()
+
     def get_attribute(self, cls):
-        for attr in self.attributes:
+        attributes = self.attributes
+        for i, attr in enumerate(attributes):
+            if isinstance(attr, LazyAttribute):
+                if not issubclass(attr.cls, cls):
+                    continue
+                # decoded attributes replace their placeholder, so each is decoded once
+                attr = attributes[i] = attr.decode()
             if isinstance(attr, cls):
                 return attr
 
 
 class ConstantValue(Attribute):
+    __slots__ = ('constant_index',)
+
     def __init__(self, _, stream: Stream):
         self.constant_index = stream.read_u2()
 
+    def write_info(self, out: OutputStream):
+        out.write_u2(self.constant_index)
+
 
 class ExceptionTableEntry(Object):
+    __slots__ = ('start_pc', 'end_pc', 'handler_pc', 'catch_type')
+
     def __init__(self, stream: Stream):
-        self.start_pc = stream.read_u2()
-        self.end_pc = stream.read_u2()
-        self.handler_pc = stream.read_u2()
-        self.catch_type = stream.read_u2()
+        self.start_pc, self.end_pc, self.handler_pc, self.catch_type = stream.read_fields('u2 u2 u2 u2')
+
+    def write(self, out: OutputStream):
+        out.write_fields('u2 u2 u2 u2', self.start_pc, self.end_pc, self.handler_pc, self.catch_type)
 
 
 class Code(Attribute, AttributeMixin):
+    __slots__ = ('max_stack', 'max_locals', 'code', '_instructions', '_table', '_cfg', 'exception_table',
+                 'attributes')
+
     def __init__(self, class_file, stream: Stream):
-        self.max_stack = stream.read_u2()
-        self.max_locals = stream.read_u2()
-        code_length = stream.read_u4()
-        code = stream.read_bytes(code_length)
-        # noinspection PyTypeChecker
-        self.instructions: List[Instruction] = self.read_bytecode(code_length, Stream(BytesIO(code)))
+        self.max_stack, self.max_locals, code_length = stream.read_fields('u2 u2 u4')
+        code = stream.read_view(code_length)
+        self._table = None
+        self._cfg = None
+        if class_file.lazy:
+            self.code = code
+            self._instructions = None
+        else:
+            # an eager parse keeps no reference into the class buffer
+            self.code = code.tobytes()
+            hook = class_file.hook
+            if hook is None:
+                self._instructions = self.read_bytecode(code_length, BufferStream(code))
+            else:
+                start = perf_counter()
+                self._instructions = self.read_bytecode(code_length, BufferStream(code))
+                hook('phase', 'bytecode', perf_counter() - start)
+                counts = {}
+                for ins in self._instructions:
+                    counts[ins.OPCODE] = counts.get(ins.OPCODE, 0) + 1
+                for opcode, count in counts.items():
+                    hook('opcode', opcode, count)
         self.exception_table = [ExceptionTableEntry(stream) for _ in range(stream.read_u2())]
         self.attributes = [Attribute.read(class_file, stream) for _ in range(stream.read_u2())]
 
+    def __getstate__(self):
+        state = self.get_state()
+        state['code'] = bytes(self.code)
+        return None, state
+
+    def write_info(self, out: OutputStream):
+        # the bytecode is written from `code`; `instructions` and `table` are read-only views of it
+        out.write_fields('u2 u2 u4', self.max_stack, self.max_locals, len(self.code))
+        out.write_bytes(self.code)
+        out.write_u2(len(self.exception_table))
+        for entry in self.exception_table:
+            entry.write(out)
+        write_attributes(out, self.attributes)
+
+    @property
+    def instructions(self) -> List[Instruction]:
+        if self._instructions is None:
+            self._instructions = self.read_bytecode(len(self.code), BufferStream(self.code))
+        return self._instructions
+
+    @property
+    def table(self) -> InstructionTable:
+        # compact alternative to .instructions, decoded independently of it
+        if self._table is None:
+            self._table = InstructionTable.read(len(self.code), BufferStream(self.code))
+        return self._table
+
+    @property
+    def cfg(self) -> ControlFlowGraph:
+        if self._cfg is None:
+            self._cfg = ControlFlowGraph.build(self.table, self.exception_table)
+        return self._cfg
+
     # noinspection PyMethodMayBeStatic
     def read_bytecode(self, code_length, stream: Stream) -> List[Instruction]:
+        # each instruction class's __init__ is the decoder compiled for its opcode
         instructions = []
-        addr = stream.tell()
+        append = instructions.append
+        read_u1 = stream.read_u1
+        tell = stream.tell
+        addr = tell()
         while addr < code_length:
-            opcode = stream.read_u1()
-            instructions.append(INSTRUCTIONS[opcode](addr, stream))
-            addr = stream.tell()
+            append(INSTRUCTIONS[read_u1()](addr, stream))
+            addr = tell()
         return instructions
 
 
 class StackMapTable(Attribute):
+    __slots__ = ('entries',)
+
     def __init__(self, _, stream: Stream):
         self.entries = [StackMapFrame(stream) for _ in range(stream.read_u2())]
 
+    def write_info(self, out: OutputStream):
+        out.write_u2(len(self.entries))
+        for frame in self.entries:
+            frame.write(out)
+
 
 class VerificationTypeInfoTag(Object):
+    __slots__ = ()
+
     TOP = 0
     INTEGER = 1
     FLOAT = 2
@@ -77,6 +240,8 @@ class VerificationTypeInfoTag(Object):
 
 
 class VerificationTypeInfo(Object):
+    __slots__ = ('tag', 'const_pool_index', 'offset')
+
     def __init__(self, stream: Stream):
         self.tag = stream.read_u1()
         self.const_pool_index = 0
@@ -86,8 +251,17 @@ class VerificationTypeInfo(Object):
         if self.tag == VerificationTypeInfoTag.UNINITIALIZED:
             self.offset = stream.read_u2()
 
+    def write(self, out: OutputStream):
+        out.write_u1(self.tag)
+        if self.tag == VerificationTypeInfoTag.OBJECT:
+            out.write_u2(self.const_pool_index)
+        elif self.tag == VerificationTypeInfoTag.UNINITIALIZED:
+            out.write_u2(self.offset)
+
 
 class StackMapFrameType(Object):
+    __slots__ = ()
+
     SAME = 0  # 0 - 63
     SAME_LOCALS_1_STACK_ITEM = 64  # 64 - 127
     SAME_LOCALS_1_STACK_ITEM_EXTENDED = 247
@@ -115,13 +289,17 @@ class StackMapFrameType(Object):
 
 
 class StackMapFrame(Object):
+    __slots__ = ('tag', 'frame_type', 'offset_delta', 'locals', 'stack')
+
     def __init__(self, stream: Stream):
         self.tag = stream.read_u1()
         self.frame_type = StackMapFrameType.get_type(self.tag)
-        self.offset_delta = 0
+        self.offset_delta = self.tag
         self.locals: List[VerificationTypeInfo] = []
         self.stack: List[VerificationTypeInfo] = []
         if self.frame_type == StackMapFrameType.SAME_LOCALS_1_STACK_ITEM:
+            # the two short forms carry their offset delta in the tag
+            self.offset_delta = self.tag - 64
             self.stack = [VerificationTypeInfo(stream)]
         elif self.frame_type == StackMapFrameType.SAME_LOCALS_1_STACK_ITEM_EXTENDED:
             self.offset_delta = stream.read_u2()
@@ -138,98 +316,195 @@ class StackMapFrame(Object):
             self.locals = [VerificationTypeInfo(stream) for _ in range(stream.read_u2())]
             self.stack = [VerificationTypeInfo(stream) for _ in range(stream.read_u2())]
 
+    def write(self, out: OutputStream):
+        out.write_u1(self.tag)
+        if self.frame_type not in (StackMapFrameType.SAME, StackMapFrameType.SAME_LOCALS_1_STACK_ITEM):
+            out.write_u2(self.offset_delta)
+        if self.frame_type == StackMapFrameType.FULL_FRAME:
+            out.write_u2(len(self.locals))
+            for info in self.locals:
+                info.write(out)
+            out.write_u2(len(self.stack))
+            for info in self.stack:
+                info.write(out)
+        else:
+            for info in self.locals + self.stack:
+                info.write(out)
+
 
 class Exceptions(Attribute):
+    __slots__ = ('exception_index_table',)
+
     def __init__(self, _, stream: Stream):
         self.exception_index_table = [stream.read_u2() for _ in range(stream.read_u2())]
 
+    def write_info(self, out: OutputStream):
+        out.write_u2(len(self.exception_index_table))
+        for index in self.exception_index_table:
+            out.write_u2(index)
+
 
 class InnerClassEntry(Object):
+    __slots__ = ('inner_class_info_index', 'outer_class_info_index', 'inner_name_index', 'inner_class_access_flags')
+
     def __init__(self, stream: Stream):
-        self.inner_class_info_index = stream.read_u2()
-        self.outer_class_info_index = stream.read_u2()
-        self.inner_name_index = stream.read_u2()
-        self.inner_class_access_flags = stream.read_u2()
+        (self.inner_class_info_index, self.outer_class_info_index,
+         self.inner_name_index, self.inner_class_access_flags) = stream.read_fields('u2 u2 u2 u2')
+
+    def write(self, out: OutputStream):
+        out.write_fields('u2 u2 u2 u2', self.inner_class_info_index, self.outer_class_info_index,
+                         self.inner_name_index, self.inner_class_access_flags)
 
 
 class InnerClasses(Attribute):
+    __slots__ = ('classes',)
+
     def __init__(self, _, stream: Stream):
         self.classes = [InnerClassEntry(stream) for _ in range(stream.read_u2())]
 
+    def write_info(self, out: OutputStream):
+        out.write_u2(len(self.classes))
+        for entry in self.classes:
+            entry.write(out)
+
 
 class EnclosingMethod(Attribute):
+    __slots__ = ('class_index', 'method_index')
+
     def __init__(self, _, stream: Stream):
         self.class_index = stream.read_u2()
         self.method_index = stream.read_u2()
 
+    def write_info(self, out: OutputStream):
+        out.write_fields('u2 u2', self.class_index, self.method_index)
+
 
 class Synthetic(Attribute):
+    __slots__ = ()
+
     # noinspection PyUnusedLocal
     def __init__(self, _, stream: Stream):
         pass
 
+    def write_info(self, out: OutputStream):
+        pass
+
 
 class Signature(Attribute):
+    __slots__ = ('signature_index',)
+
     def __init__(self, _, stream: Stream):
         self.signature_index = stream.read_u2()
 
+    def write_info(self, out: OutputStream):
+        out.write_u2(self.signature_index)
+
 
 class SourceFile(Attribute):
+    __slots__ = ('sourcefile_index',)
+
     def __init__(self, _, stream: Stream):
         self.sourcefile_index = stream.read_u2()
 
+    def write_info(self, out: OutputStream):
+        out.write_u2(self.sourcefile_index)
+
 
 class SourceDebugExtension(Attribute):
+    __slots__ = ('debug_extension',)
+
     def __init__(self, _, stream: Stream):
-        self.debug_extension = stream.read_bytes(stream.read_u4())
+        # the whole body is the extension string; it has no length prefix of its own
+        self.debug_extension = stream.read_bytes(stream.remaining())
+
+    def write_info(self, out: OutputStream):
+        out.write_bytes(self.debug_extension)
 
 
 class LineNumberTableEntry(Object):
+    __slots__ = ('start_pc', 'line_number')
+
     def __init__(self, stream: Stream):
-        self.start_pc = stream.read_u2()
-        self.line_number = stream.read_u2()
+        self.start_pc, self.line_number = stream.read_fields('u2 u2')
+
+    def write(self, out: OutputStream):
+        out.write_fields('u2 u2', self.start_pc, self.line_number)
 
 
 class LineNumberTable(Attribute):
+    __slots__ = ('line_number_table',)
+
     def __init__(self, _, stream: Stream):
         self.line_number_table = [LineNumberTableEntry(stream) for _ in range(stream.read_u2())]
 
+    def write_info(self, out: OutputStream):
+        out.write_u2(len(self.line_number_table))
+        for entry in self.line_number_table:
+            entry.write(out)
+
 
 class LocalVariableTableEntry(Object):
+    __slots__ = ('start_pc', 'length', 'name_index', 'descriptor_index', 'index')
+
     def __init__(self, stream: Stream):
-        self.start_pc = stream.read_u2()
-        self.length = stream.read_u2()
-        self.name_index = stream.read_u2()
-        self.descriptor_index = stream.read_u2()
-        self.index = stream.read_u2()
+        self.start_pc, self.length, self.name_index, self.descriptor_index, self.index = \
+            stream.read_fields('u2 u2 u2 u2 u2')
+
+    def write(self, out: OutputStream):
+        out.write_fields('u2 u2 u2 u2 u2', self.start_pc, self.length, self.name_index, self.descriptor_index,
+                         self.index)
 
 
 class LocalVariableTable(Attribute):
+    __slots__ = ('local_variable_table',)
+
     def __init__(self, _, stream: Stream):
         self.local_variable_table = [LocalVariableTableEntry(stream) for _ in range(stream.read_u2())]
 
+    def write_info(self, out: OutputStream):
+        out.write_u2(len(self.local_variable_table))
+        for entry in self.local_variable_table:
+            entry.write(out)
+
 
 class LocalVariableTypeTableEntry(Object):
+    __slots__ = ('start_pc', 'length', 'name_index', 'signature_index', 'index')
+
     def __init__(self, stream: Stream):
-        self.start_pc = stream.read_u2()
-        self.length = stream.read_u2()
-        self.name_index = stream.read_u2()
-        self.signature_index = stream.read_u2()
-        self.index = stream.read_u2()
+        self.start_pc, self.length, self.name_index, self.signature_index, self.index = \
+            stream.read_fields('u2 u2 u2 u2 u2')
+
+    def write(self, out: OutputStream):
+        out.write_fields('u2 u2 u2 u2 u2', self.start_pc, self.length, self.name_index, self.signature_index,
+                         self.index)
 
 
 class LocalVariableTypeTable(Attribute):
+    __slots__ = ('local_variable_type_table',)
+
     def __init__(self, _, stream: Stream):
         self.local_variable_type_table = [LocalVariableTypeTableEntry(stream) for _ in range(stream.read_u2())]
 
+    def write_info(self, out: OutputStream):
+        out.write_u2(len(self.local_variable_type_table))
+        for entry in self.local_variable_type_table:
+            entry.write(out)
+
 
 class Deprecated(Attribute):
+    __slots__ = ()
+
     # noinspection PyUnusedLocal
     def __init__(self, _, stream: Stream):
         pass
 
+    def write_info(self, out: OutputStream):
+        pass
+
 
 class ElementValue(Object):
+    __slots__ = ()
+
     @staticmethod
     def get_value(stream: Stream):
         # type: (Stream) -> ElementValue
@@ -248,83 +523,184 @@ class ElementValue(Object):
 
 
 class ConstElementValue(ElementValue):
+    __slots__ = ('tag', 'const_value_index')
+
     def __init__(self, tag, stream: Stream):
         self.tag = tag
         self.const_value_index = stream.read_u2()
 
+    def write(self, out: OutputStream):
+        out.write_u1(ord(self.tag))
+        out.write_u2(self.const_value_index)
+
 
 class EnumElementValue(ElementValue):
+    __slots__ = ('type_name_index', 'const_name_index')
+
     def __init__(self, stream: Stream):
         self.type_name_index = stream.read_u2()
         self.const_name_index = stream.read_u2()
 
+    def write(self, out: OutputStream):
+        out.write_u1(ord('e'))
+        out.write_fields('u2 u2', self.type_name_index, self.const_name_index)
+
 
 class ClassElementValue(ElementValue):
+    __slots__ = ('class_info_index',)
+
     def __init__(self, stream: Stream):
         self.class_info_index = stream.read_u2()
 
+    def write(self, out: OutputStream):
+        out.write_u1(ord('c'))
+        out.write_u2(self.class_info_index)
+
 
 class AnnotationElementValue(ElementValue):
+    __slots__ = ('annotation',)
+
     def __init__(self, stream: Stream):
         self.annotation = Annotation(stream)
 
+    def write(self, out: OutputStream):
+        out.write_u1(ord('@'))
+        self.annotation.write(out)
+
 
 class ArrayElementValue(ElementValue):
+    __slots__ = ('array_value',)
+
     def __init__(self, stream: Stream):
         self.array_value = [ElementValue.get_value(stream) for _ in range(stream.read_u2())]
 
+    def write(self, out: OutputStream):
+        out.write_u1(ord('['))
+        out.write_u2(len(self.array_value))
+        for value in self.array_value:
+            value.write(out)
+
 
 class ElementValuePair(Object):
+    __slots__ = ('element_name_index', 'value')
+
     def __init__(self, stream: Stream):
         self.element_name_index = stream.read_u2()
         self.value = ElementValue.get_value(stream)
 
+    def write(self, out: OutputStream):
+        out.write_u2(self.element_name_index)
+        self.value.write(out)
+
 
 class Annotation(Object):
+    __slots__ = ('type_index', 'element_value_pairs')
+
     def __init__(self, stream: Stream):
         self.type_index = stream.read_u2()
         self.element_value_pairs = [ElementValuePair(stream) for _ in range(stream.read_u2())]
 
+    def write(self, out: OutputStream):
+        out.write_u2(self.type_index)
+        out.write_u2(len(self.element_value_pairs))
+        for pair in self.element_value_pairs:
+            pair.write(out)
+
 
 class RuntimeVisibleAnnotations(Attribute):
+    __slots__ = ('annotations',)
+
     def __init__(self, _, stream: Stream):
         self.annotations = [Annotation(stream) for _ in range(stream.read_u2())]
 
+    def write_info(self, out: OutputStream):
+        out.write_u2(len(self.annotations))
+        for annotation in self.annotations:
+            annotation.write(out)
+
 
 class RuntimeInvisibleAnnotations(Attribute):
+    __slots__ = ('annotations',)
+
     def __init__(self, _, stream: Stream):
-        self.element_value_pairs = [ElementValuePair(stream) for _ in range(stream.read_u2())]
+        self.annotations = [Annotation(stream) for _ in range(stream.read_u2())]
+
+    def write_info(self, out: OutputStream):
+        out.write_u2(len(self.annotations))
+        for annotation in self.annotations:
+            annotation.write(out)
 
 
 class ParameterAnnotation(Object):
+    __slots__ = ('annotations',)
+
     def __init__(self, stream: Stream):
         self.annotations = [Annotation(stream) for _ in range(stream.read_u2())]
 
+    def write(self, out: OutputStream):
+        out.write_u2(len(self.annotations))
+        for annotation in self.annotations:
+            annotation.write(out)
+
 
 class RuntimeVisibleParameterAnnotations(Attribute):
+    __slots__ = ('parameter_annotations',)
+
     def __init__(self, _, stream: Stream):
         self.parameter_annotations = [ParameterAnnotation(stream) for _ in range(stream.read_u1())]
 
+    def write_info(self, out: OutputStream):
+        out.write_u1(len(self.parameter_annotations))
+        for parameter in self.parameter_annotations:
+            parameter.write(out)
+
 
 class RuntimeInvisibleParameterAnnotations(Attribute):
+    __slots__ = ('parameter_annotations',)
+
     def __init__(self, _, stream: Stream):
         self.parameter_annotations = [ParameterAnnotation(stream) for _ in range(stream.read_u1())]
 
+    def write_info(self, out: OutputStream):
+        out.write_u1(len(self.parameter_annotations))
+        for parameter in self.parameter_annotations:
+            parameter.write(out)
+
 
 class AnnotationDefault(Attribute):
+    __slots__ = ('default_value',)
+
     def __init__(self, _, stream: Stream):
         self.default_value = ElementValue.get_value(stream)
 
+    def write_info(self, out: OutputStream):
+        self.default_value.write(out)
+
 
 class BootstrapMethodEntry(Object):
+    __slots__ = ('bootstrap_method_ref', 'bootstrap_arguments')
+
     def __init__(self, stream: Stream):
         self.bootstrap_method_ref = stream.read_u2()
         self.bootstrap_arguments = [stream.read_u2() for _ in range(stream.read_u2())]
 
+    def write(self, out: OutputStream):
+        out.write_u2(self.bootstrap_method_ref)
+        out.write_u2(len(self.bootstrap_arguments))
+        for index in self.bootstrap_arguments:
+            out.write_u2(index)
+
 
 class BootstrapMethods(Attribute):
+    __slots__ = ('bootstrap_methods',)
+
     def __init__(self, _, stream: Stream):
-        self.bootstrap_methods = [BootstrapMethodEntry(stream) for _ in (stream.read_u2())]
+        self.bootstrap_methods = [BootstrapMethodEntry(stream) for _ in range(stream.read_u2())]
+
+    def write_info(self, out: OutputStream):
+        out.write_u2(len(self.bootstrap_methods))
+        for entry in self.bootstrap_methods:
+            entry.write(out)
 
 
 ATTRIBUTES = {
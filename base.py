@@ -1,4 +1,33 @@
-
 class Object(object):
+    # Subclasses declare __slots__ for their fields; repr and pickling go through
+    # get_state(), which also picks up a __dict__ for subclasses that keep one.
+    __slots__ = ()
+
+    def get_state(self) -> dict:
+        state = {}
+        for name in _slot_names(type(self)):
+            try:
+                state[name] = getattr(self, name)
+            except AttributeError:
+                pass
+        state.update(getattr(self, '__dict__', ()))
+        return state
+
     def __repr__(self):
-        return '{}({})'.format(self.__class__.__name__, self.__dict__)
\ No newline at end of file
+        return '{}({})'.format(self.__class__.__name__, self.get_state())
+
+
+_SLOT_NAMES = {}
+
+
+def _slot_names(cls):
+    names = _SLOT_NAMES.get(cls)
+    if names is None:
+        names = []
+        for klass in reversed(cls.__mro__):
+            slots = klass.__dict__.get('__slots__', ())
+            for name in (slots,) if isinstance(slots, str) else slots:
+                if name not in ('__dict__', '__weakref__') and name not in names:
+                    names.append(name)
+        names = _SLOT_NAMES[cls] = tuple(names)
+    return names
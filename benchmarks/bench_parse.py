@@ -0,0 +1,232 @@
+import gc
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from attribute import Attribute, Code, LazyAttribute, StackMapTable  # noqa: E402
+from classfile import ClassFile  # noqa: E402
+from instrument import ParseStats  # noqa: E402
+from stream import BufferStream  # noqa: E402
+from classgen import ClassGenerator  # noqa: E402
+
+# Results files carry this version; bump it when a phase changes what it measures.
+FORMAT = 1
+
+
+class Workload(object):
+    """The corpus cut into the inputs of each phase, prepared once outside the timed runs.
+
+    Every phase decodes the same bytes on every run, and its MB/sec is computed
+    from the bytes that phase actually reads.
+    """
+
+    def __init__(self, data):
+        self.data = data
+        self.constants = []
+        self.attributes = []
+        self.code = []
+        self.stack_maps = []
+        for d in data:
+            self._add(d)
+        self.sizes = {
+            'read_constants': sum(end - 8 for _, end in self.constants),
+            'Attribute.read': sum(length for _, _, _, length in self.attributes),
+            'Code.read_bytecode': sum(len(c) for _, c in self.code),
+            'StackMapFrame': sum(map(len, self.stack_maps)),
+            'ClassFile': sum(map(len, data)),
+        }
+
+    def _add(self, data):
+        stream = BufferStream(data, 8)
+        constants = ClassFile.read_constants(None, stream)
+        self.constants.append((data, stream.tell() + 8))
+        cf = ClassFile(BufferStream(data), lazy=True)
+        for owner in [cf] + cf.fields + cf.methods:
+            for attr in owner.attributes:
+                # the 6-byte name and length header is part of what Attribute.read consumes
+                self.attributes.append((cf, attr.buffer, attr.offset - 6, attr.length + 6))
+        for m in cf.methods:
+            code = m.get_attribute(Code)
+            if code is None:
+                continue
+            self.code.append((code, bytes(code.code)))
+            for attr in code.attributes:
+                if isinstance(attr, LazyAttribute) and attr.cls is StackMapTable:
+                    self.stack_maps.append(attr.buffer[attr.offset:attr.offset + attr.length].tobytes())
+        # the attribute phase decodes eagerly against a fully decoded pool
+        cf.constants = constants
+        cf.lazy = False
+
+    def read_constants(self):
+        read = ClassFile.read_constants
+        return [read(None, BufferStream(data, 8)) for data, _ in self.constants]
+
+    def read_attributes(self):
+        read = Attribute.read
+        return [read(cf, BufferStream(buffer, offset, length)) for cf, buffer, offset, length in self.attributes]
+
+    def read_bytecode(self):
+        return [code.read_bytecode(len(b), BufferStream(b)) for code, b in self.code]
+
+    def read_stack_maps(self):
+        return [StackMapTable(None, BufferStream(b)) for b in self.stack_maps]
+
+    def read_class_files(self):
+        return [ClassFile(BufferStream(d)) for d in self.data]
+
+    def phases(self):
+        return {
+            'read_constants': self.read_constants,
+            'Attribute.read': self.read_attributes,
+            'Code.read_bytecode': self.read_bytecode,
+            'StackMapFrame': self.read_stack_maps,
+            'ClassFile': self.read_class_files,
+        }
+
+
+def profile(data) -> ParseStats:
+    """Where one full parse of every class spends its time, by phase, attribute and opcode."""
+    stats = ParseStats()
+    for d in data:
+        ClassFile(BufferStream(d), hook=stats)
+    return stats
+
+
+def measure(run, repeat, min_time=0.2):
+    """(best time of one run, peak traced bytes of one run).
+
+    Like timeit, each of the `repeat` samples loops over `run` until it has taken
+    at least `min_time`, so short phases are not dominated by timer noise.
+    """
+    best = float('inf')
+    loops = 1
+    enabled = gc.isenabled()
+    for _ in range(repeat):
+        gc.collect()
+        gc.disable()
+        try:
+            while True:
+                start = time.perf_counter()
+                for _ in range(loops):
+                    run()
+                elapsed = time.perf_counter() - start
+                if elapsed >= min_time:
+                    break
+                loops *= 2
+            best = min(best, elapsed / loops)
+        finally:
+            if enabled:
+                gc.enable()
+    gc.collect()
+    tracemalloc.start()
+    try:
+        run()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return best, peak
+
+
+def run_suite(config, count, repeat, min_time=0.2, only=None):
+    generator = ClassGenerator(**config)
+    data = [generator.generate(i) for i in range(count)]
+    workload = Workload(data)
+    phases = {}
+    for name, run in workload.phases().items():
+        if only and name not in only:
+            continue
+        seconds, peak = measure(run, repeat, min_time)
+        phases[name] = {
+            'seconds': seconds,
+            'classes_per_sec': count / seconds,
+            'mb_per_sec': workload.sizes[name] / seconds / 1e6,
+            'bytes': workload.sizes[name],
+            'peak_bytes': peak,
+        }
+    return {
+        'format': FORMAT,
+        'python': platform.python_version(),
+        'implementation': platform.python_implementation(),
+        'machine': platform.machine(),
+        'corpus': dict(config, classes=count, bytes=sum(map(len, data))),
+        'repeat': repeat,
+        'phases': phases,
+    }
+
+
+def report(results):
+    corpus = results['corpus']
+    print('{} classes, {:.2f} MB, python {}'.format(corpus['classes'], corpus['bytes'] / 1e6, results['python']))
+    print('{:20} {:>12} {:>10} {:>12}'.format('phase', 'classes/s', 'MB/s', 'peak MB'))
+    for name, r in results['phases'].items():
+        print('{:20} {:12.0f} {:10.2f} {:12.2f}'.format(
+            name, r['classes_per_sec'], r['mb_per_sec'], r['peak_bytes'] / 1e6))
+
+
+def compare(results, baseline, threshold) -> bool:
+    """Prints the change of every phase against `baseline`; False if any regressed by more than `threshold`."""
+    if baseline.get('format') != results['format'] or baseline.get('corpus') != results['corpus']:
+        print('warning: the baseline was measured on a different corpus or results format', file=sys.stderr)
+    ok = True
+    print('{:20} {:>12} {:>12}'.format('phase', 'throughput', 'peak memory'))
+    for name, r in results['phases'].items():
+        base = baseline['phases'].get(name)
+        if base is None:
+            continue
+        speed = r['classes_per_sec'] / base['classes_per_sec'] - 1
+        memory = r['peak_bytes'] / base['peak_bytes'] - 1 if base['peak_bytes'] else 0
+        regressed = speed < -threshold or memory > threshold
+        ok = ok and not regressed
+        print('{:20} {:+11.1%} {:+11.1%}{}'.format(name, speed, memory, '  REGRESSION' if regressed else ''))
+    return ok
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Measure per-phase parse throughput on a synthetic corpus.')
+    parser.add_argument('-n', '--count', type=int, default=500, help='classes in the corpus')
+    parser.add_argument('-r', '--repeat', type=int, default=5, help='timed runs per phase, the best one counts')
+    parser.add_argument('--min-time', type=float, default=0.2, help='minimum seconds per timed run')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--methods', type=int, default=8)
+    parser.add_argument('--statements', type=int, default=24, help='statements per method, i.e. code length')
+    parser.add_argument('--fields', type=int, default=4)
+    parser.add_argument('--constants', type=int, default=0, help='extra constant pool entries per class')
+    parser.add_argument('--switch-density', type=float, default=0.05,
+                        help='probability of a statement being a tableswitch or lookupswitch')
+    parser.add_argument('--no-stack-map', action='store_true')
+    parser.add_argument('--no-annotations', action='store_true')
+    parser.add_argument('--phase', action='append', help='only run the named phase (repeatable)')
+    parser.add_argument('--profile', action='store_true',
+                        help='instead, show where a full parse of the corpus spends its time')
+    parser.add_argument('--json', help='write the results to this file')
+    parser.add_argument('--compare', help='baseline results file to compare against')
+    parser.add_argument('--threshold', type=float, default=0.2,
+                        help='relative slowdown or memory growth that counts as a regression')
+    args = parser.parse_args()
+
+    config = {
+        'seed': args.seed, 'methods': args.methods, 'statements': args.statements, 'fields': args.fields,
+        'extra_constants': args.constants, 'switch_density': args.switch_density,
+        'stack_map': not args.no_stack_map, 'annotations': not args.no_annotations,
+    }
+    if args.profile:
+        generator = ClassGenerator(**config)
+        print(profile([generator.generate(i) for i in range(args.count)]).report())
+        sys.exit(0)
+    results = run_suite(config, args.count, args.repeat, args.min_time, args.phase)
+    report(results)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        print()
+        sys.exit(0 if compare(results, baseline, args.threshold) else 1)
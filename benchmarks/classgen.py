@@ -0,0 +1,413 @@
+"""Deterministic generator of synthetic class files for the benchmarks.
+
+Every class is built from (seed, index) alone, so a corpus is reproducible
+without shipping any jars.
+"""
+import random
+import struct
+
+
+class ConstantPoolBuilder(object):
+    def __init__(self):
+        self.entries = [None]
+        self.index = {}
+
+    def _add(self, key, data, wide=False):
+        if key in self.index:
+            return self.index[key]
+        i = len(self.entries)
+        self.index[key] = i
+        self.entries.append(data)
+        if wide:
+            self.entries.append(None)
+        return i
+
+    def utf8(self, s):
+        b = s.encode('utf-8') if isinstance(s, str) else s
+        return self._add(('utf8', b), struct.pack('>BH', 1, len(b)) + b)
+
+    def integer(self, v):
+        return self._add(('int', v), struct.pack('>Bi', 3, v))
+
+    def float_(self, v):
+        return self._add(('float', v), struct.pack('>Bf', 4, v))
+
+    def long(self, v):
+        return self._add(('long', v), struct.pack('>Bq', 5, v), wide=True)
+
+    def double(self, v):
+        return self._add(('double', v), struct.pack('>Bd', 6, v), wide=True)
+
+    def class_(self, name):
+        return self._add(('class', name), struct.pack('>BH', 7, self.utf8(name)))
+
+    def string(self, s):
+        return self._add(('string', s), struct.pack('>BH', 8, self.utf8(s)))
+
+    def name_and_type(self, name, desc):
+        return self._add(('nat', name, desc), struct.pack('>BHH', 12, self.utf8(name), self.utf8(desc)))
+
+    def _ref(self, tag, owner, name, desc):
+        return self._add((tag, owner, name, desc),
+                         struct.pack('>BHH', tag, self.class_(owner), self.name_and_type(name, desc)))
+
+    def field(self, owner, name, desc):
+        return self._ref(9, owner, name, desc)
+
+    def method(self, owner, name, desc):
+        return self._ref(10, owner, name, desc)
+
+    def interface_method(self, owner, name, desc):
+        return self._ref(11, owner, name, desc)
+
+    def method_handle(self, kind, ref):
+        return self._add(('mh', kind, ref), struct.pack('>BBH', 15, kind, ref))
+
+    def method_type(self, desc):
+        return self._add(('mt', desc), struct.pack('>BH', 16, self.utf8(desc)))
+
+    def invoke_dynamic(self, bsm, name, desc):
+        return self._add(('indy', bsm, name, desc), struct.pack('>BHH', 18, bsm, self.name_and_type(name, desc)))
+
+    def to_bytes(self):
+        return struct.pack('>H', len(self.entries)) + b''.join(e for e in self.entries[1:] if e is not None)
+
+
+def attribute(cp, name, body):
+    return struct.pack('>HI', cp.utf8(name), len(body)) + body
+
+
+class CodeBuilder(object):
+    def __init__(self):
+        self.code = bytearray()
+        self.labels = {}
+        self.fixups = []
+
+    def pc(self):
+        return len(self.code)
+
+    def op(self, opcode, fmt='', *args):
+        self.code.append(opcode)
+        if fmt:
+            self.code += struct.pack('>' + fmt, *args)
+
+    def label(self, name):
+        self.labels[name] = self.pc()
+
+    def branch(self, opcode, name, wide=False):
+        at = self.pc()
+        self.code.append(opcode)
+        self.fixups.append((len(self.code), at, name, 'i' if wide else 'h'))
+        self.code += b'\0' * (4 if wide else 2)
+
+    def switch(self, opcode, default, pairs):
+        at = self.pc()
+        self.code.append(opcode)
+        while len(self.code) % 4:
+            self.code.append(0)
+        self.fixups.append((len(self.code), at, default, 'i'))
+        self.code += b'\0' * 4
+        if opcode == 0xaa:
+            keys = [k for k, _ in pairs]
+            self.code += struct.pack('>ii', keys[0], keys[-1])
+            for _, name in pairs:
+                self.fixups.append((len(self.code), at, name, 'i'))
+                self.code += b'\0' * 4
+        else:
+            self.code += struct.pack('>i', len(pairs))
+            for key, name in pairs:
+                self.code += struct.pack('>i', key)
+                self.fixups.append((len(self.code), at, name, 'i'))
+                self.code += b'\0' * 4
+
+    def resolve(self):
+        for pos, at, name, fmt in self.fixups:
+            struct.pack_into('>' + fmt, self.code, pos, self.labels[name] - at)
+        return bytes(self.code)
+
+
+class ClassGenerator(object):
+    """Builds well-formed synthetic class files from a seed."""
+
+    def __init__(self, seed=0, methods=8, statements=24, fields=4, extra_constants=0,
+                 switch_density=0.05, stack_map=True, annotations=True, debug=True):
+        self.seed = seed
+        self.methods = methods
+        self.statements = statements
+        self.fields = fields
+        self.extra_constants = extra_constants
+        self.switch_density = switch_density
+        self.stack_map = stack_map
+        self.annotations = annotations
+        self.debug = debug
+
+    def generate(self, index=0):
+        rnd = random.Random(self.seed * 1000003 + index)
+        self._bootstrap = None
+        cp = ConstantPoolBuilder()
+        name = 'gen/p{}/C{}'.format(index % 7, index)
+        this = cp.class_(name)
+        sup = cp.class_('java/lang/Object')
+        interfaces = [cp.class_('java/lang/Runnable')] if index % 2 else []
+        fields = []
+        for i in range(self.fields):
+            desc = 'I' if i % 2 == 0 else 'Ljava/lang/String;'
+            attrs = []
+            if i == 0:
+                attrs.append(attribute(cp, 'ConstantValue', struct.pack('>H', cp.integer(42))))
+            if self.annotations and i % 2:
+                attrs.append(attribute(cp, 'RuntimeVisibleAnnotations', self._annotations(cp, rnd, 1)))
+            flags = 0x0019 if i == 0 else 0x0009
+            fields.append(struct.pack('>HHHH', flags, cp.utf8('f{}'.format(i)), cp.utf8(desc), len(attrs)) +
+                          b''.join(attrs))
+        methods = [self._init(cp)]
+        for i in range(self.methods):
+            methods.append(self._method(cp, rnd, name, i))
+        if index % 2:
+            methods.append(struct.pack('>HHHH', 0x0401, cp.utf8('run'), cp.utf8('()V'), 0))
+        attrs = []
+        if self.debug:
+            attrs.append(attribute(cp, 'SourceFile', struct.pack('>H', cp.utf8('C{}.java'.format(index)))))
+        if self.annotations:
+            attrs.append(attribute(cp, 'RuntimeVisibleAnnotations', self._annotations(cp, rnd, 2)))
+            attrs.append(attribute(cp, 'RuntimeInvisibleAnnotations', self._annotations(cp, rnd, 1)))
+        attrs.append(attribute(cp, 'Signature', struct.pack('>H', cp.utf8('Ljava/lang/Object;'))))
+        if self._bootstrap:
+            attrs.append(attribute(cp, 'BootstrapMethods', struct.pack('>HHH', 1, self._bootstrap, 0)))
+        for i in range(self.extra_constants):
+            cp.string('padding constant {} {}'.format(index, i))
+        body = struct.pack('>HHH', 0x0021 if not index % 2 else 0x0421, this, sup)
+        body += struct.pack('>H', len(interfaces)) + b''.join(struct.pack('>H', i) for i in interfaces)
+        body += struct.pack('>H', len(fields)) + b''.join(fields)
+        body += struct.pack('>H', len(methods)) + b''.join(methods)
+        body += struct.pack('>H', len(attrs)) + b''.join(attrs)
+        return struct.pack('>IHH', 0xCAFEBABE, 0, 52) + cp.to_bytes() + body
+
+    def _annotations(self, cp, rnd, n):
+        out = struct.pack('>H', n)
+        for i in range(n):
+            out += self._annotation(cp, rnd, 'Lgen/Anno{};'.format(rnd.randrange(4)), depth=0)
+        return out
+
+    def _annotation(self, cp, rnd, desc, depth):
+        pairs = []
+        kinds = 'sIecZ' + ('@[' if depth < 2 else '')
+        for j in range(rnd.randrange(1, 4)):
+            kind = rnd.choice(kinds)
+            pairs.append(struct.pack('>H', cp.utf8('v{}'.format(j))) + self._element(cp, rnd, kind, depth))
+        return struct.pack('>HH', cp.utf8(desc), len(pairs)) + b''.join(pairs)
+
+    def _element(self, cp, rnd, kind, depth):
+        if kind == 's':
+            return b's' + struct.pack('>H', cp.utf8('value{}'.format(rnd.randrange(10))))
+        if kind == 'I':
+            return b'I' + struct.pack('>H', cp.integer(rnd.randrange(100)))
+        if kind == 'Z':
+            return b'Z' + struct.pack('>H', cp.integer(rnd.randrange(2)))
+        if kind == 'e':
+            return b'e' + struct.pack('>HH', cp.utf8('Lgen/Color;'), cp.utf8('RED'))
+        if kind == 'c':
+            return b'c' + struct.pack('>H', cp.utf8('Ljava/lang/String;'))
+        if kind == '@':
+            return b'@' + self._annotation(cp, rnd, 'Lgen/Nested;', depth + 1)
+        items = [self._element(cp, rnd, 's', depth + 1) for _ in range(rnd.randrange(3))]
+        return b'[' + struct.pack('>H', len(items)) + b''.join(items)
+
+    def _init(self, cp):
+        c = CodeBuilder()
+        c.op(0x2a)
+        c.op(0xb7, 'H', cp.method('java/lang/Object', '<init>', '()V'))
+        c.op(0xb1)
+        code = c.resolve()
+        attrs = []
+        if self.debug:
+            attrs.append(attribute(cp, 'LineNumberTable', struct.pack('>HHH', 1, 0, 1)))
+        body = struct.pack('>HHI', 1, 1, len(code)) + code + struct.pack('>H', 0)
+        body += struct.pack('>H', len(attrs)) + b''.join(attrs)
+        return struct.pack('>HHHH', 0x0001, cp.utf8('<init>'), cp.utf8('()V'), 1) + attribute(cp, 'Code', body)
+
+    def _method(self, cp, rnd, owner, index):
+        c = CodeBuilder()
+        frames = {}  # label -> kind ('same' or 'exc')
+        exceptions = []
+        n = [0]
+
+        def new_label():
+            n[0] += 1
+            return 'L{}'.format(n[0])
+
+        c.op(0x03)  # iconst_0
+        c.op(0x3c)  # istore_1
+        lines = [(0, 1)]
+        for s in range(self.statements):
+            if self.debug and rnd.random() < 0.3:
+                lines.append((c.pc(), s + 2))
+            if rnd.random() < self.switch_density:
+                end = new_label()
+                default = new_label()
+                count = rnd.randrange(1, 6)
+                cases = [new_label() for _ in range(count)]
+                c.op(0x1a)  # iload_0
+                if rnd.random() < 0.5:
+                    low = rnd.randrange(-3, 3)
+                    c.switch(0xaa, default, [(low + k, cases[k]) for k in range(count)])
+                else:
+                    keys = sorted(rnd.sample(range(-1000, 1000), count))
+                    c.switch(0xab, default, list(zip(keys, cases)))
+                for k, lab in enumerate(cases):
+                    c.label(lab)
+                    frames[lab] = 'same'
+                    c.op(0x84, 'Bb', 1, k + 1)
+                    c.branch(0xa7, end)
+                c.label(default)
+                frames[default] = 'same'
+                c.label(end)
+                frames[end] = 'same'
+                continue
+            kind = rnd.randrange(14)
+            if kind == 0:
+                c.op(0x1b); c.op(0x1a); c.op(0x60); c.op(0x3c)
+            elif kind == 1:
+                c.op(0x84, 'Bb', 1, rnd.randrange(-128, 128))
+            elif kind == 2:
+                c.op(0xc4); c.op(0x84, 'Hh', 1, rnd.randrange(-30000, 30000))
+            elif kind == 3:
+                lab = new_label()
+                c.op(0x1b); c.op(0x10, 'b', rnd.randrange(-128, 128))
+                c.branch(0xa2, lab)
+                c.op(0x84, 'Bb', 1, 1)
+                c.label(lab)
+                frames[lab] = 'same'
+            elif kind == 4:
+                ref = cp.field(owner, 'f0', 'I')
+                c.op(0xb2, 'H', ref); c.op(0x1b); c.op(0x60); c.op(0xb3, 'H', ref)
+            elif kind == 5:
+                c.op(0x1b)
+                c.op(0xb8, 'H', cp.method(owner, 'm{}'.format(rnd.randrange(max(1, self.methods))), '(I)I'))
+                c.op(0x3c)
+            elif kind == 6:
+                idx = cp.string('s{}'.format(rnd.randrange(50)))
+                if idx < 256:
+                    c.op(0x12, 'B', idx)
+                else:
+                    c.op(0x13, 'H', idx)
+                c.op(0xb6, 'H', cp.method('java/lang/String', 'length', '()I'))
+                c.op(0x1b); c.op(0x60); c.op(0x3c)
+            elif kind == 7:
+                c.op(0xbb, 'H', cp.class_('java/lang/Object')); c.op(0x59)
+                c.op(0xb7, 'H', cp.method('java/lang/Object', '<init>', '()V')); c.op(0x57)
+            elif kind == 8:
+                c.op(0x11, 'h', rnd.randrange(-32768, 32768)); c.op(0x1b); c.op(0x68); c.op(0x3c)
+            elif kind == 9:
+                c.op(0x14, 'H', cp.long(rnd.randrange(1 << 40))); c.op(0x88); c.op(0x1b); c.op(0x82); c.op(0x3c)
+            elif kind == 10:
+                top = new_label()
+                out = new_label()
+                c.label(top)
+                frames[top] = 'same'
+                c.op(0x1b); c.op(0x11, 'h', 1000)
+                c.branch(0xa2, out)
+                c.op(0x84, 'Bb', 1, 1)
+                c.branch(0xa7, top)
+                c.label(out)
+                frames[out] = 'same'
+            elif kind == 11:
+                c.op(0x01); c.op(0xc0, 'H', cp.class_('java/lang/Runnable'))
+                c.op(0xb9, 'HBB', cp.interface_method('java/lang/Runnable', 'run', '()V'), 1, 0)
+            elif kind == 12:
+                start = c.pc()
+                c.op(0x1b); c.op(0x1a); c.op(0x6c); c.op(0x3c)
+                end_pc = c.pc()
+                after = new_label()
+                handler = new_label()
+                c.branch(0xa7, after)
+                c.label(handler)
+                frames[handler] = 'exc'
+                c.op(0x57)
+                c.label(after)
+                frames[after] = 'same'
+                exceptions.append((start, end_pc, handler, cp.class_('java/lang/ArithmeticException')))
+            else:
+                if self._bootstrap is None:
+                    bsm = cp.method_handle(6, cp.method('gen/Boot', 'bsm',
+                                                        '(Ljava/lang/invoke/MethodHandles$Lookup;Ljava/lang/String;'
+                                                        'Ljava/lang/invoke/MethodType;)Ljava/lang/invoke/CallSite;'))
+                    self._bootstrap = bsm
+                c.op(0xba, 'HH', cp.invoke_dynamic(0, 'run', '()Ljava/lang/Runnable;'), 0)
+                c.op(0x57)
+        c.op(0x1b)
+        c.op(0xac)
+        code = c.resolve()
+        exceptions = [(s, e, c.labels[h], t) for s, e, h, t in exceptions]
+        attrs = []
+        if self.debug:
+            attrs.append(attribute(cp, 'LineNumberTable', struct.pack('>H', len(lines)) +
+                                   b''.join(struct.pack('>HH', *l) for l in lines)))
+            attrs.append(attribute(cp, 'LocalVariableTable', struct.pack('>H', 2) +
+                                   struct.pack('>HHHHH', 0, len(code), cp.utf8('a'), cp.utf8('I'), 0) +
+                                   struct.pack('>HHHHH', 2, len(code) - 2, cp.utf8('b'), cp.utf8('I'), 1)))
+        if self.stack_map and frames:
+            attrs.append(attribute(cp, 'StackMapTable', self._frames(cp, c, frames)))
+        body = struct.pack('>HHI', 3, 2, len(code)) + code
+        body += struct.pack('>H', len(exceptions)) + b''.join(struct.pack('>HHHH', *e) for e in exceptions)
+        body += struct.pack('>H', len(attrs)) + b''.join(attrs)
+        mattrs = [attribute(cp, 'Code', body)]
+        if index % 3 == 0:
+            mattrs.append(attribute(cp, 'Exceptions', struct.pack('>HH', 1, cp.class_('java/io/IOException'))))
+        if self.annotations and index % 2 == 0:
+            mattrs.append(attribute(cp, 'RuntimeVisibleAnnotations', self._annotations(cp, rnd, 1)))
+            mattrs.append(attribute(cp, 'RuntimeVisibleParameterAnnotations',
+                                    struct.pack('>B', 1) + self._annotations(cp, rnd, 1)))
+        return struct.pack('>HHHH', 0x0009, cp.utf8('m{}'.format(index)), cp.utf8('(I)I'), len(mattrs)) + \
+            b''.join(mattrs)
+
+    def _frames(self, cp, c, frames):
+        pcs = sorted(set(c.labels[l] for l in frames))
+        kinds = {}
+        for l, k in frames.items():
+            kinds[c.labels[l]] = k if kinds.get(c.labels[l]) != 'exc' else 'exc'
+        out = []
+        last = -1
+        first = True
+        for pc in pcs:
+            delta = pc - last - 1
+            last = pc
+            if first:
+                out.append(struct.pack('>BHB', 252, delta, 1))
+                first = False
+                if kinds[pc] == 'exc':
+                    out[-1] = struct.pack('>BHHBBHBH', 255, delta, 2, 1, 1, 1, 7,
+                                          cp.class_('java/lang/ArithmeticException'))
+                continue
+            if kinds[pc] == 'exc':
+                info = struct.pack('>BH', 7, cp.class_('java/lang/ArithmeticException'))
+                if delta < 64:
+                    out.append(struct.pack('>B', 64 + delta) + info)
+                else:
+                    out.append(struct.pack('>BH', 247, delta) + info)
+            elif delta < 64:
+                out.append(struct.pack('>B', delta))
+            else:
+                out.append(struct.pack('>BH', 251, delta))
+        return struct.pack('>H', len(out)) + b''.join(out)
+
+
+def corpus(count, seed=0, **kwargs):
+    gen = ClassGenerator(seed=seed, **kwargs)
+    return [gen.generate(i) for i in range(count)]
+
+
+if __name__ == "__main__":
+    import argparse
+    import os
+
+    parser = argparse.ArgumentParser(description='Write a synthetic corpus of .class files to a directory.')
+    parser.add_argument('out')
+    parser.add_argument('-n', '--count', type=int, default=100)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    os.makedirs(args.out, exist_ok=True)
+    for i, data in enumerate(corpus(args.count, args.seed)):
+        with open(os.path.join(args.out, 'C{}.class'.format(i)), 'wb') as f:
+            f.write(data)
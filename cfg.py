@@ -0,0 +1,245 @@
+from array import array
+from bisect import bisect_right
+from itertools import accumulate, chain, compress
+from typing import List
+
+from base import Object
+from instruction import Ins, InstructionTable
+
+GOTOS = frozenset(cls.OPCODE for cls in (Ins.goto, Ins.goto_w))
+JSRS = frozenset(cls.OPCODE for cls in (Ins.jsr, Ins.jsr_w))
+CONDITIONALS = frozenset(cls.OPCODE for cls in (
+    Ins.ifeq, Ins.ifne, Ins.iflt, Ins.ifge, Ins.ifgt, Ins.ifle,
+    Ins.if_icmpeq, Ins.if_icmpne, Ins.if_icmplt, Ins.if_icmpge, Ins.if_icmpgt, Ins.if_icmple,
+    Ins.if_acmpeq, Ins.if_acmpne, Ins.ifnull, Ins.ifnonnull))
+SWITCHES = frozenset(cls.OPCODE for cls in (Ins.tableswitch, Ins.lookupswitch))
+# no successor within the method; ret goes back to a jsr call site, which is not tracked
+EXITS = frozenset(cls.OPCODE for cls in (
+    Ins.ireturn, Ins.lreturn, Ins.freturn, Ins.dreturn, Ins.areturn, Ins.return_, Ins.athrow, Ins.ret))
+BRANCHES = GOTOS | JSRS | CONDITIONALS | SWITCHES
+BLOCK_ENDS = BRANCHES | EXITS
+_BLOCK_END_MASK = bytes(1 if opcode in BLOCK_ENDS else 0 for opcode in range(256))
+
+
+def _switch_targets(opcode, operands) -> List[int]:
+    if opcode == Ins.tableswitch.OPCODE:
+        default, _, _, jump_offsets = operands
+        return [default] + jump_offsets
+    default, match_offsets = operands
+    return [default] + [target for _, target in match_offsets]
+
+
+class ControlFlowGraph(Object):
+    """Basic blocks of a method body with their edges and dominator tree.
+
+    Blocks are numbered in code order, block 0 being the entry. Block b covers
+    instruction rows `starts[b]:starts[b + 1]` of the method's InstructionTable.
+    Normal successors, exception-handler successors and predecessors (of either
+    kind) are CSR lists: the successors of b are
+    `succ_targets[succ_offsets[b]:succ_offsets[b + 1]]`. `idom[b]` is the
+    immediate dominator of b over both kinds of edges, -1 if b is unreachable;
+    the entry is its own immediate dominator. Dominators are computed on first use.
+    """
+    __slots__ = ('addrs', 'starts', 'succ_offsets', 'succ_targets', 'handler_offsets', 'handler_targets',
+                 'pred_offsets', 'pred_targets', '_idom')
+
+    @staticmethod
+    def build(table: InstructionTable, exception_table=()) -> 'ControlFlowGraph':
+        addrs = table.addrs
+        opcodes = table.opcodes
+        operands = table.operands
+        extras = table.extras
+        count = len(opcodes)
+
+        row_index = dict(zip(addrs, range(count)))
+
+        def row_of(addr):
+            row = row_index.get(addr)
+            if row is None:
+                # exception ranges end at the first pc past the range, possibly the end of the code
+                if count and addr > addrs[-1]:
+                    return count
+                raise ValueError('pc {} is not an instruction boundary'.format(addr))
+            return row
+
+        leaders = bytearray(count + 1)
+        leaders[0] = 1
+        leaders[count] = 1
+        # scan for block-ending opcodes in C: one byte per row, 1 where the block ends
+        ends = opcodes.tobytes().translate(_BLOCK_END_MASK)
+        row = ends.find(1)
+        while row >= 0:
+            leaders[row + 1] = 1
+            opcode = opcodes[row]
+            if opcode in SWITCHES:
+                for target in _switch_targets(opcode, extras[row]):
+                    leaders[row_of(target)] = 1
+            elif opcode not in EXITS:
+                leaders[row_of(operands[row])] = 1
+            row = ends.find(1, row + 1)
+        handlers = []
+        for entry in exception_table:
+            start, end, handler = row_of(entry.start_pc), row_of(entry.end_pc), row_of(entry.handler_pc)
+            leaders[start] = leaders[end] = leaders[handler] = 1
+            handlers.append((start, end, handler))
+
+        # block_ids[row] is the block the row belongs to; row 0 always starts block 0
+        block_ids = array('i', accumulate(leaders[1:], initial=0))
+        starts = array('I', compress(range(count + 1), leaders))
+        blocks = len(starts) - 1
+
+        successors = []
+        for b in range(blocks):
+            last = starts[b + 1] - 1
+            opcode = opcodes[last]
+            if opcode in SWITCHES:
+                targets = []
+                for target in _switch_targets(opcode, extras[last]):
+                    t = block_ids[row_of(target)]
+                    if t not in targets:
+                        targets.append(t)
+            elif opcode in GOTOS:
+                targets = [block_ids[row_of(operands[last])]]
+            elif opcode in EXITS:
+                targets = []
+            elif opcode in CONDITIONALS or opcode in JSRS:
+                # a jsr's fall-through is where the subroutine's ret comes back to
+                target = block_ids[row_of(operands[last])]
+                targets = [b + 1, target] if target != b + 1 and b + 1 < blocks else [target]
+            else:
+                targets = [b + 1] if b + 1 < blocks else []
+            successors.append(targets)
+
+        handler_successors = [[] for _ in range(blocks)]
+        for start, end, handler in handlers:
+            h = block_ids[handler]
+            for b in range(block_ids[start], block_ids[end] if end < count else blocks):
+                if h not in handler_successors[b]:
+                    handler_successors[b].append(h)
+
+        predecessors = [[] for _ in range(blocks)]
+        for b in range(blocks):
+            for s in successors[b]:
+                predecessors[s].append(b)
+            for s in handler_successors[b]:
+                if b not in predecessors[s]:
+                    predecessors[s].append(b)
+
+        cfg = ControlFlowGraph.__new__(ControlFlowGraph)
+        cfg.addrs = array('I', [addrs[row] for row in starts[:-1]])
+        cfg.starts = starts
+        cfg.succ_offsets, cfg.succ_targets = _csr(successors)
+        cfg.handler_offsets, cfg.handler_targets = _csr(handler_successors)
+        cfg.pred_offsets, cfg.pred_targets = _csr(predecessors)
+        cfg._idom = None
+        return cfg
+
+    @property
+    def idom(self) -> array:
+        # computed on first use; most callers only need the blocks and edges
+        if self._idom is None:
+            blocks = len(self)
+            self._idom = _dominators(blocks, [list(self.successors(b)) + list(self.handlers(b)) for b in range(blocks)],
+                                     [list(self.predecessors(b)) for b in range(blocks)])
+        return self._idom
+
+    def __len__(self):
+        return len(self.starts) - 1
+
+    def __repr__(self):
+        return 'ControlFlowGraph({} blocks, {} edges)'.format(len(self), len(self.succ_targets))
+
+    def rows(self, block) -> range:
+        return range(self.starts[block], self.starts[block + 1])
+
+    def block_at(self, addr) -> int:
+        """The block containing the instruction at `addr`."""
+        return bisect_right(self.addrs, addr) - 1
+
+    def successors(self, block) -> array:
+        return self.succ_targets[self.succ_offsets[block]:self.succ_offsets[block + 1]]
+
+    def handlers(self, block) -> array:
+        """Exception handler blocks reachable from `block`."""
+        return self.handler_targets[self.handler_offsets[block]:self.handler_offsets[block + 1]]
+
+    def predecessors(self, block) -> array:
+        return self.pred_targets[self.pred_offsets[block]:self.pred_offsets[block + 1]]
+
+    def reachable(self, block) -> bool:
+        return self.idom[block] >= 0
+
+    def dominates(self, a, b) -> bool:
+        if self.idom[b] < 0:
+            return False
+        while b != a:
+            parent = self.idom[b]
+            if parent == b:
+                return False
+            b = parent
+        return True
+
+    def dominators(self, block) -> List[int]:
+        """Every dominator of `block`, nearest first and ending with the entry."""
+        if self.idom[block] < 0:
+            return []
+        result = [block]
+        while self.idom[block] != block:
+            block = self.idom[block]
+            result.append(block)
+        return result
+
+
+def _csr(lists):
+    offsets = array('I', accumulate(map(len, lists), initial=0))
+    targets = array('I', chain.from_iterable(lists))
+    return offsets, targets
+
+
+def _dominators(blocks, successors, predecessors) -> array:
+    # Cooper, Harvey & Kennedy, "A Simple, Fast Dominance Algorithm", over reverse postorder
+    order = [-1] * blocks
+    postorder = []
+    if blocks:
+        visited = bytearray(blocks)
+        visited[0] = 1
+        stack = [(0, iter(successors[0]))]
+        while stack:
+            b, children = stack[-1]
+            for s in children:
+                if not visited[s]:
+                    visited[s] = 1
+                    stack.append((s, iter(successors[s])))
+                    break
+            else:
+                stack.pop()
+                order[b] = len(postorder)
+                postorder.append(b)
+    idom = array('i', [-1]) * blocks
+    if not blocks:
+        return idom
+    idom[0] = 0
+    rpo = postorder[::-1]
+    changed = True
+    while changed:
+        changed = False
+        for b in rpo[1:]:
+            new = -1
+            for p in predecessors[b]:
+                if idom[p] < 0:
+                    continue
+                if new < 0:
+                    new = p
+                    continue
+                # walk both fingers up the tree until they meet
+                x, y = p, new
+                while x != y:
+                    while order[x] < order[y]:
+                        x = idom[x]
+                    while order[y] < order[x]:
+                        y = idom[y]
+                new = x
+            if idom[b] != new:
+                idom[b] = new
+                changed = True
+    return idom
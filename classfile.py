@@ -1,27 +1,80 @@
+from time import perf_counter
 from typing import List
 
-from attribute import Attribute, AttributeMixin
+from attribute import Attribute, AttributeMixin, skip_attributes, write_attributes
 from base import Object
-from const import Constant, CONSTANTS, DoubleInfo, LongInfo
-from stream import Stream
+from const import Constant, ConstantPool, CONSTANTS, DoubleInfo, LongInfo, write_constants
+from stream import OutputStream, Stream
 
 
 class ClassFile(Object, AttributeMixin):
-    def __init__(self, stream: Stream):
+    __slots__ = ('lazy', 'header_only', 'hook', 'minor_version', 'major_version', 'constants', 'access_flags', 'this_class',
+                 'super_class', 'interfaces', 'fields', 'methods', 'attributes')
+
+    def __init__(self, stream: Stream, lazy=False, header_only=False, hook=None):
+        # lazy: keep attribute bodies undecoded until get_attribute() asks for them
+        # header_only: skip every attribute body, fields and methods keep only flags, name and descriptor
+        # hook: called as hook(event, key, value) while parsing, see instrument.py; None costs nothing
+        self.lazy = lazy
+        self.header_only = header_only
+        self.hook = hook
+        if hook is not None:
+            start = perf_counter()
+        stream = stream.to_buffer()
         magic = stream.read_u4()
         if magic != 0xCAFEBABE:
             raise Exception('Wrong magic')
-        self.minor_version = stream.read_u2()
-        self.major_version = stream.read_u2()
-        self.constants: List[Constant] = self.read_constants(stream)
-        self.access_flags = stream.read_u2()
-        self.this_class = stream.read_u2()
-        self.super_class = stream.read_u2()
+        self.minor_version, self.major_version = stream.read_fields('u2 u2')
+        if hook is not None:
+            constants_start = perf_counter()
+        if lazy or header_only:
+            self.constants: List[Constant] = ConstantPool(stream)
+        else:
+            self.constants: List[Constant] = self.read_constants(stream)
+        if hook is not None:
+            header_start = perf_counter()
+        self.access_flags, self.this_class, self.super_class = stream.read_fields('u2 u2 u2')
         self.interfaces = [stream.read_u2() for _ in range(stream.read_u2())]
+        if hook is not None:
+            fields_start = perf_counter()
+            hook('phase', 'header', constants_start - start + fields_start - header_start)
+            hook('phase', 'constants', header_start - constants_start)
         self.fields: List[FieldMethodInfo] = [FieldMethodInfo(self, stream) for _ in range(stream.read_u2())]
+        if hook is not None:
+            methods_start = perf_counter()
+            hook('phase', 'fields', methods_start - fields_start)
         self.methods: List[FieldMethodInfo] = [FieldMethodInfo(self, stream) for _ in range(stream.read_u2())]
-        self.attributes: List[Attribute] = [Attribute.read(self, stream) for _ in range(stream.read_u2())]
-        print(self.attributes)
+        if hook is not None:
+            attributes_start = perf_counter()
+            hook('phase', 'methods', attributes_start - methods_start)
+        if header_only:
+            skip_attributes(stream)
+            self.attributes: List[Attribute] = []
+        else:
+            self.attributes: List[Attribute] = [Attribute.read(self, stream) for _ in range(stream.read_u2())]
+        if hook is not None:
+            hook('phase', 'attributes', perf_counter() - attributes_start)
+            # only the parse is instrumented; attributes decoded later are not reported
+            self.hook = None
+
+    def get_utf8(self, index) -> str:
+        return self.constants[index].value
+
+    def get_class_name(self, index) -> str:
+        return self.get_utf8(self.constants[index].name_index)
+
+    @property
+    def name(self) -> str:
+        return self.get_class_name(self.this_class)
+
+    @property
+    def super_name(self) -> str:
+        # None for java/lang/Object and module-info
+        return self.get_class_name(self.super_class) if self.super_class else None
+
+    @property
+    def interface_names(self) -> List[str]:
+        return [self.get_class_name(i) for i in self.interfaces]
 
     # noinspection PyMethodMayBeStatic
     def read_constants(self, stream: Stream) -> List[Constant]:
@@ -38,18 +91,52 @@ class ClassFile(Object, AttributeMixin):
             i += 1
         return values
 
+    def write(self, out: OutputStream):
+        """Serializes the class; attributes that were never decoded are copied from the input bytes."""
+        if self.header_only:
+            raise ValueError('a header_only ClassFile has no attributes to write')
+        out.write_fields('u4 u2 u2', 0xCAFEBABE, self.minor_version, self.major_version)
+        if isinstance(self.constants, ConstantPool):
+            self.constants.write(out)
+        else:
+            write_constants(out, self.constants)
+        out.write_fields('u2 u2 u2', self.access_flags, self.this_class, self.super_class)
+        out.write_u2(len(self.interfaces))
+        for index in self.interfaces:
+            out.write_u2(index)
+        for members in (self.fields, self.methods):
+            out.write_u2(len(members))
+            for member in members:
+                member.write(out)
+        write_attributes(out, self.attributes)
+
+    def to_bytes(self) -> bytes:
+        out = OutputStream()
+        self.write(out)
+        return out.getvalue()
+
 
 class FieldMethodInfo(Object, AttributeMixin):
+    __slots__ = ('access_flags', 'name_index', 'descriptor_index', 'attributes')
+
     def __init__(self, class_file: ClassFile, stream: Stream):
-        self.access_flags = stream.read_u2()
-        self.name_index = stream.read_u2()
-        self.descriptor_index = stream.read_u2()
-        self.attributes: List[Attribute] = [Attribute.read(class_file, stream) for _ in range(stream.read_u2())]
-        print(class_file.constants[self.name_index], self.attributes)
+        self.access_flags, self.name_index, self.descriptor_index = stream.read_fields('u2 u2 u2')
+        if class_file.header_only:
+            skip_attributes(stream)
+            self.attributes: List[Attribute] = []
+        else:
+            self.attributes: List[Attribute] = [Attribute.read(class_file, stream) for _ in range(stream.read_u2())]
+
+    def write(self, out: OutputStream):
+        out.write_fields('u2 u2 u2', self.access_flags, self.name_index, self.descriptor_index)
+        write_attributes(out, self.attributes)
 
 
 class AccessFlag(object):
     ACC_PUBLIC = 0x0001
+    ACC_PRIVATE = 0x0002
+    ACC_PROTECTED = 0x0004
+    ACC_STATIC = 0x0008
     ACC_FINAL = 0x0010
     ACC_SUPER = 0x0020
     ACC_INTERFACE = 0x0200
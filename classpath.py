@@ -0,0 +1,215 @@
+import os
+import sys
+from collections import OrderedDict, deque
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from functools import partial
+from typing import Callable, Iterable, Iterator, List, Optional, Tuple
+
+from archive import Archive
+from base import Object
+from classfile import ClassFile
+from stream import BufferStream
+
+ARCHIVE_SUFFIXES = ('.jar', '.zip', '.war', '.ear', '.jmod')
+# archives each process keeps open between work units, so a jar's central directory
+# is indexed once per worker rather than once per chunk
+OPEN_ARCHIVES = 4
+
+_archives = OrderedDict()  # path -> ((mtime_ns, size, inode), Archive), least recently used first
+
+
+class ParseResult(Object):
+    __slots__ = ('source', 'name', 'value', 'error')
+
+    def __init__(self, source, name, value=None, error=None):
+        # source is the archive or directory the entry came from, name the entry within it
+        self.source = source
+        self.name = name
+        self.value = value
+        self.error = error
+
+    @property
+    def ok(self):
+        return self.error is None
+
+
+def split_classpath(paths) -> List[str]:
+    if isinstance(paths, str):
+        paths = [paths]
+    result = []
+    for path in paths:
+        result.extend(p for p in path.split(os.pathsep) if p)
+    return result
+
+
+def list_entries(path) -> Tuple[str, List[str]]:
+    """Returns (source, names) for a jar/jmod/zip, a directory tree or a single .class file."""
+    if os.path.isdir(path):
+        names = []
+        for root, dirs, files in os.walk(path):
+            dirs.sort()
+            for f in sorted(files):
+                if f.endswith('.class'):
+                    names.append(os.path.relpath(os.path.join(root, f), path).replace(os.sep, '/'))
+        return path, names
+    if path.endswith(ARCHIVE_SUFFIXES):
+        return path, open_archive(path).class_entry_names()
+    return os.path.dirname(path) or '.', [os.path.basename(path)]
+
+
+def iter_work(paths, chunk_size=64) -> Iterator:
+    # yields (source, names) work units, or a ParseResult for a path that cannot be listed
+    for path in split_classpath(paths):
+        try:
+            source, names = list_entries(path)
+        except Exception as e:
+            yield ParseResult(path, None, error='{}: {}'.format(type(e).__name__, e))
+            continue
+        for i in range(0, len(names), chunk_size):
+            yield source, names[i:i + chunk_size]
+
+
+def parse_bytes(data, project: Optional[Callable[[ClassFile], object]] = None, lazy=False, header_only=False):
+    cf = ClassFile(BufferStream(data), lazy=lazy, header_only=header_only)
+    return cf if project is None else project(cf)
+
+
+def open_archive(path) -> Archive:
+    """A shared open Archive for `path`, reopened if the file changed since it was indexed."""
+    st = os.stat(path)
+    signature = (st.st_mtime_ns, st.st_size, st.st_ino)
+    cached = _archives.get(path)
+    if cached is not None:
+        if cached[0] == signature:
+            _archives.move_to_end(path)
+            return cached[1]
+        del _archives[path]
+        cached[1].close()
+    archive = Archive(path)
+    _archives[path] = (signature, archive)
+    while len(_archives) > OPEN_ARCHIVES:
+        _archives.popitem(last=False)[1][1].close()
+    return archive
+
+
+def process_entries(source, names, process: Callable[[bytes], object]) -> List[ParseResult]:
+    """Runs `process` on the bytes of every entry of one work unit; runs inside the worker processes."""
+    results = []
+    archive = None
+    try:
+        if not os.path.isdir(source):
+            archive = open_archive(source)
+    except Exception as e:
+        error = '{}: {}'.format(type(e).__name__, e)
+        return [ParseResult(source, name, error=error) for name in names]
+    for name in names:
+        try:
+            if archive is None:
+                with open(os.path.join(source, name), 'rb') as f:
+                    data = f.read()
+            else:
+                data = archive.read(name)
+            results.append(ParseResult(source, name, process(data)))
+        except Exception as e:
+            results.append(ParseResult(source, name, error='{}: {}'.format(type(e).__name__, e)))
+    return results
+
+
+def parse_entries(source, names, project=None, lazy=False, header_only=False) -> List[ParseResult]:
+    return process_entries(source, names, partial(parse_bytes, project=project, lazy=lazy, header_only=header_only))
+
+
+def parse_classpath(paths, project: Optional[Callable[[ClassFile], object]] = None, workers=None, chunk_size=64,
+                    ordered=True, lazy=False, max_pending=None, header_only=False) -> Iterator[ParseResult]:
+    """Parses every class in `paths` across a process pool, yielding one ParseResult per entry.
+
+    `paths` is a path or list of paths to jars, jmods, directories or classpath strings.
+    `project`, if given, must be picklable; it runs in the worker and only its result
+    crosses the process boundary. With `ordered=False` results stream in completion
+    order. At most `max_pending` work units (default 2 * workers) are in flight.
+    Failures are reported on the result and never stop the run.
+    """
+    process = partial(parse_bytes, project=project, lazy=lazy, header_only=header_only)
+    return map_classpath(paths, process, workers, chunk_size, ordered, max_pending)
+
+
+def map_classpath(paths, process: Callable[[bytes], object], workers=None, chunk_size=64, ordered=True,
+                  max_pending=None) -> Iterator[ParseResult]:
+    """Like parse_classpath(), but runs `process` (picklable) on the raw bytes of every entry."""
+    return map_units(iter_work(paths, chunk_size), process, workers, ordered, max_pending)
+
+
+def map_units(units: Iterable, process: Callable[[bytes], object], workers=None, ordered=True,
+              max_pending=None) -> Iterator[ParseResult]:
+    """Like map_classpath(), over ready-made work units: (source, entry names) pairs as
+    iter_work() yields them, or ParseResults that are passed through in their place.
+    """
+    if workers is not None and workers <= 1:
+        for unit in units:
+            if isinstance(unit, ParseResult):
+                yield unit
+            else:
+                yield from process_entries(*unit, process)
+        return
+    workers = workers or os.cpu_count() or 1
+    with ProcessPoolExecutor(workers) as executor:
+        window = max_pending or 2 * workers
+        yield from _stream(executor, units, process, window, ordered)
+
+
+def _stream(executor, units: Iterable, process, window, ordered) -> Iterator[ParseResult]:
+    pending = deque() if ordered else set()
+    units = iter(units)
+    exhausted = False
+    while True:
+        while not exhausted and len(pending) < window:
+            unit = next(units, None)
+            if unit is None:
+                exhausted = True
+                break
+            if isinstance(unit, ParseResult):
+                future = Future()
+                future.set_result([unit])
+            else:
+                future = executor.submit(process_entries, *unit, process)
+            if ordered:
+                pending.append(future)
+            else:
+                pending.add(future)
+        if not pending:
+            return
+        if ordered:
+            yield from pending.popleft().result()
+        else:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                pending.remove(future)
+                yield from future.result()
+
+
+def class_summary(cf: ClassFile):
+    return cf.name, len(cf.fields), len(cf.methods)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Parse every class in jars, jmods, directories or classpaths.')
+    parser.add_argument('paths', nargs='+')
+    parser.add_argument('-j', '--workers', type=int, default=None)
+    parser.add_argument('--chunk-size', type=int, default=64)
+    parser.add_argument('--unordered', action='store_true')
+    args = parser.parse_args()
+
+    parsed = failed = 0
+    for result in parse_classpath(args.paths, class_summary, args.workers, args.chunk_size, not args.unordered,
+                                  header_only=True):
+        if result.ok:
+            parsed += 1
+            print('{}\t{} fields\t{} methods'.format(*result.value))
+        else:
+            failed += 1
+            print('{}{}\t{}'.format(result.source, '!' + result.name if result.name else '', result.error),
+                  file=sys.stderr)
+    print('{} parsed, {} failed'.format(parsed, failed), file=sys.stderr)
+    sys.exit(1 if failed else 0)
@@ -1,94 +1,179 @@
+from array import array
+from sys import intern
+from typing import List
+
 from base import Object
-from stream import Stream
+from stream import BufferStream, OutputStream, Stream
 
 
 class Constant(Object):
-    pass
+    __slots__ = ()
+    TAG = None  # set from CONSTANTS
+
+
+def decode_utf8(data: bytes) -> str:
+    """Decodes the modified UTF-8 of a CONSTANT_Utf8 and interns the result.
+
+    Nearly every constant is ASCII and takes the first branch. Otherwise strict UTF-8
+    is tried, and only bytes it rejects, i.e. NUL as C0 80 or supplementary characters
+    as surrogate pairs, go through the full modified UTF-8 decoding. Bytes that are not
+    even that decode with surrogateescape, so no constant fails to decode.
+    """
+    if data.isascii():
+        return intern(data.decode('ascii'))
+    try:
+        return intern(data.decode('utf-8'))
+    except UnicodeDecodeError:
+        return intern(_decode_modified_utf8(data))
+
+
+def _decode_modified_utf8(data: bytes) -> str:
+    try:
+        s = data.replace(b'\xc0\x80', b'\0').decode('utf-8', 'surrogatepass')
+    except UnicodeDecodeError:
+        return data.decode('utf-8', 'surrogateescape')
+    # joins surrogate pairs; unpaired surrogates are kept as they are
+    return s.encode('utf-16-le', 'surrogatepass').decode('utf-16-le', 'surrogatepass')
 
 
 class Utf8Info(Constant):
+    __slots__ = ('bytes', '_value')
+
     def __init__(self, stream: Stream):
         # self.length = 0
         length = stream.read_u2()
         self.bytes = stream.read_bytes(length)
 
+    @property
+    def value(self) -> str:
+        """The decoded string, see decode_utf8(); computed on first use."""
+        try:
+            return self._value
+        except AttributeError:
+            value = self._value = decode_utf8(self.bytes)
+            return value
+
+    def write(self, out: OutputStream):
+        out.write_u2(len(self.bytes))
+        out.write_bytes(self.bytes)
+
 
 class FourByteType(Constant):
+    __slots__ = ('bytes',)
+
     def __init__(self, stream: Stream):
         self.bytes = stream.read_u4()
 
+    def write(self, out: OutputStream):
+        out.write_u4(self.bytes)
+
 
 class IntegerInfo(FourByteType):
-    pass
+    __slots__ = ()
 
 
 class FloatInfo(FourByteType):
-    pass
+    __slots__ = ()
 
 
 class EightByteType(Constant):
+    __slots__ = ('high_bytes', 'low_bytes')
+
     def __init__(self, stream: Stream):
-        self.high_bytes = stream.read_u4()
-        self.low_bytes = stream.read_u4()
+        self.high_bytes, self.low_bytes = stream.read_fields('u4 u4')
+
+    def write(self, out: OutputStream):
+        out.write_fields('u4 u4', self.high_bytes, self.low_bytes)
 
 
 class LongInfo(EightByteType):
-    pass
+    __slots__ = ()
 
 
 class DoubleInfo(EightByteType):
-    pass
+    __slots__ = ()
 
 
 class ClassInfo(Constant):
+    __slots__ = ('name_index',)
+
     def __init__(self, stream: Stream):
         self.name_index = stream.read_u2()
 
+    def write(self, out: OutputStream):
+        out.write_u2(self.name_index)
+
 
 class StringInfo(Constant):
+    __slots__ = ('string_index',)
+
     def __init__(self, stream: Stream):
         self.string_index = stream.read_u2()
 
+    def write(self, out: OutputStream):
+        out.write_u2(self.string_index)
+
 
 class RefInfo(Constant):
+    __slots__ = ('class_index', 'name_and_type_index')
+
     def __init__(self, stream: Stream):
-        self.class_index = stream.read_u2()
-        self.name_and_type_index = stream.read_u2()
+        self.class_index, self.name_and_type_index = stream.read_fields('u2 u2')
+
+    def write(self, out: OutputStream):
+        out.write_fields('u2 u2', self.class_index, self.name_and_type_index)
 
 
 class FieldRef(RefInfo):
-    pass
+    __slots__ = ()
 
 
 class MethodRef(RefInfo):
-    pass
+    __slots__ = ()
 
 
 class InterfaceMethodRef(RefInfo):
-    pass
+    __slots__ = ()
 
 
 class NameAndType(Constant):
+    __slots__ = ('name_index', 'descriptor_index')
+
     def __init__(self, stream: Stream):
-        self.name_index = stream.read_u2()
-        self.descriptor_index = stream.read_u2()
+        self.name_index, self.descriptor_index = stream.read_fields('u2 u2')
+
+    def write(self, out: OutputStream):
+        out.write_fields('u2 u2', self.name_index, self.descriptor_index)
 
 
 class MethodHandle(Constant):
+    __slots__ = ('reference_kind', 'reference_index')
+
     def __init__(self, stream: Stream):
-        self.reference_kind = stream.read_u1()
-        self.reference_index = stream.read_u2()
+        self.reference_kind, self.reference_index = stream.read_fields('u1 u2')
+
+    def write(self, out: OutputStream):
+        out.write_fields('u1 u2', self.reference_kind, self.reference_index)
 
 
 class MethodType(Constant):
+    __slots__ = ('descriptor_index',)
+
     def __init__(self, stream: Stream):
         self.descriptor_index = stream.read_u2()
 
+    def write(self, out: OutputStream):
+        out.write_u2(self.descriptor_index)
+
 
 class InvokeDynamic(Constant):
+    __slots__ = ('bootstrap_method_attr_index', 'name_and_type_index')
+
     def __init__(self, stream: Stream):
-        self.bootstrap_method_attr_index = stream.read_u2()
-        self.name_and_type_index = stream.read_u2()
+        self.bootstrap_method_attr_index, self.name_and_type_index = stream.read_fields('u2 u2')
+
+    def write(self, out: OutputStream):
+        out.write_fields('u2 u2', self.bootstrap_method_attr_index, self.name_and_type_index)
 
 
 CONSTANTS = {
@@ -107,3 +192,157 @@ CONSTANTS = {
     16: MethodType,
     18: InvokeDynamic,
 }
+
+for _tag, _cls in CONSTANTS.items():
+    _cls.TAG = _tag
+
+
+def write_constants(out: OutputStream, constants):
+    # list form, as built by ClassFile.read_constants; None marks index 0 and the slot after a long or double
+    out.write_u2(len(constants))
+    for const in constants:
+        if const is not None:
+            out.write_u1(const.TAG)
+            const.write(out)
+
+
+# bytes following the tag for every fixed-size constant, including the ones that are
+# only skipped over (Dynamic, Module, Package)
+CONSTANT_WIDTHS = {3: 4, 4: 4, 5: 8, 6: 8, 7: 2, 8: 2, 9: 4, 10: 4, 11: 4, 12: 4, 15: 3, 16: 2, 17: 4, 18: 4, 19: 2, 20: 2}
+
+
+class ConstantPool(Object):
+    """Constant pool that decodes entries on first access.
+
+    Construction only walks the pool by tag width to record where each entry
+    starts; `pool[i]` decodes and memoizes entry i. Indexes that hold no constant
+    (0 and the slot after a long or double) read as None, as in the list form.
+    """
+    __slots__ = ('buffer', 'offsets', 'values', 'end')
+
+    def __init__(self, stream: BufferStream):
+        count = stream.read_u2()
+        buffer = stream.buffer
+        widths = CONSTANT_WIDTHS
+        offsets = array('I', [0]) * count
+        pos = stream.pos
+        i = 1
+        while i < count:
+            tag = buffer[pos]
+            offsets[i] = pos
+            if tag == 1:
+                pos += 3 + (buffer[pos + 1] << 8 | buffer[pos + 2])
+            else:
+                pos += 1 + widths[tag]
+                if tag == 5 or tag == 6:
+                    i += 1
+            i += 1
+        stream.skip(pos - stream.pos)
+        self.buffer = buffer
+        self.offsets = offsets
+        self.values = [None] * count
+        self.end = pos
+
+    @staticmethod
+    def from_offsets(buffer, offsets: array, end) -> 'ConstantPool':
+        """A pool over `buffer` whose entry offsets are already known, e.g. from a cache."""
+        pool = ConstantPool.__new__(ConstantPool)
+        pool.buffer = buffer
+        pool.offsets = offsets
+        pool.values = [None] * len(offsets)
+        pool.end = end
+        return pool
+
+    def __len__(self):
+        return len(self.values)
+
+    def __getitem__(self, index) -> Constant:
+        value = self.values[index]
+        if value is None:
+            offset = self.offsets[index]
+            if offset:
+                stream = BufferStream(self.buffer, offset)
+                value = self.values[index] = CONSTANTS[stream.read_u1()](stream)
+        return value
+
+    def __setitem__(self, index, value: Constant):
+        self.values[index] = value
+
+    def append(self, value: Constant):
+        self.offsets.append(0)
+        self.values.append(value)
+
+    def __iter__(self):
+        for i in range(len(self.values)):
+            yield self[i]
+
+    def write(self, out: OutputStream):
+        # undecoded entries still sit in the class buffer; runs of them are copied as is
+        values = self.values
+        offsets = self.offsets
+        out.write_u2(len(values))
+        run = 0
+        for i in range(1, len(values)):
+            const = values[i]
+            if const is None:
+                if offsets[i] and not run:
+                    run = offsets[i]
+                continue
+            if run:
+                out.write_bytes(self.buffer[run:offsets[i] or self.end])
+                run = 0
+            out.write_u1(const.TAG)
+            const.write(out)
+        if run:
+            out.write_bytes(self.buffer[run:self.end])
+
+    def utf8_entries(self) -> List[Utf8Info]:
+        """Every Utf8 constant, decoding only those."""
+        buffer = self.buffer
+        offsets = self.offsets
+        values = self.values
+        entries = []
+        for i in range(1, len(values)):
+            value = values[i]
+            if value is None and offsets[i] and buffer[offsets[i]] == 1:
+                value = self[i]
+            if value.__class__ is Utf8Info:
+                entries.append(value)
+        return entries
+
+    def __getstate__(self):
+        # a pickled pool is fully decoded and does not drag the class buffer along
+        values = list(self)
+        return None, {'buffer': None, 'offsets': array('I', [0]) * len(values), 'values': values, 'end': 0}
+
+    def __repr__(self):
+        return 'ConstantPool({} entries, {} decoded)'.format(
+            len(self.values), sum(1 for v in self.values if v is not None))
+
+
+def decode_pool(constants):
+    """Sets Utf8Info.value on every Utf8 constant of a ConstantPool or list form pool.
+
+    Undecoded strings are joined and decoded in a single call when the whole pool is
+    valid UTF-8, which modified UTF-8 is unless it encodes NUL or supplementary
+    characters; it cannot contain a 0 byte, so that is the separator.
+    """
+    if isinstance(constants, ConstantPool):
+        entries = constants.utf8_entries()
+    else:
+        entries = [c for c in constants if c.__class__ is Utf8Info]
+    entries = [c for c in entries if not hasattr(c, '_value')]
+    if not entries:
+        return
+    joined = b'\0'.join([c.bytes for c in entries])
+    if joined.count(0) == len(entries) - 1:
+        try:
+            strings = joined.decode('ascii' if joined.isascii() else 'utf-8').split('\0')
+        except UnicodeDecodeError:
+            pass
+        else:
+            for c, s in zip(entries, strings):
+                c._value = intern(s)
+            return
+    for c in entries:
+        c._value = decode_utf8(c.bytes)
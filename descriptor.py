@@ -0,0 +1,385 @@
+from functools import lru_cache
+from typing import Optional, Tuple, Union
+from weakref import WeakValueDictionary
+
+from base import Object
+from const import decode_utf8
+
+# Parsed types are immutable and interned: equal types are the same object, so they
+# compare and hash by identity. Each keeps the descriptor or signature text it was
+# parsed from, which is also how it pickles. The parse functions take the raw
+# Utf8Info.bytes (or a str) and sit behind a bounded LRU cache keyed by them.
+CACHE_SIZE = 1 << 14
+
+_interned = WeakValueDictionary()
+
+
+class JavaType(Object):
+    __slots__ = ('text', '__weakref__')
+
+    def __setattr__(self, name, value):
+        raise AttributeError('{} is immutable'.format(type(self).__name__))
+
+    def __reduce__(self):
+        return _reparse, (type(self), self.text)
+
+    def __repr__(self):
+        return '{}({!r})'.format(type(self).__name__, self.text)
+
+
+def _intern(cls, text, **fields):
+    key = (cls, text)
+    t = _interned.get(key)
+    if t is None:
+        t = object.__new__(cls)
+        object.__setattr__(t, 'text', text)
+        for name, value in fields.items():
+            object.__setattr__(t, name, value)
+        _interned[key] = t
+    return t
+
+
+class FieldType(JavaType):
+    """A field descriptor or field signature; `size` is its number of local variable slots."""
+    __slots__ = ()
+    size = 1
+
+
+class BaseType(FieldType):
+    __slots__ = ('name', 'size')
+
+    def __str__(self):
+        return self.name
+
+
+class ObjectType(FieldType):
+    """A class without type arguments, by internal name such as 'java/lang/String'."""
+    __slots__ = ('name',)
+
+    def __str__(self):
+        return self.name.replace('/', '.')
+
+
+class ArrayType(FieldType):
+    __slots__ = ('component',)
+
+    @property
+    def dimensions(self) -> int:
+        return len(self.text) - len(self.text.lstrip('['))
+
+    @property
+    def element(self) -> FieldType:
+        t = self.component
+        while isinstance(t, ArrayType):
+            t = t.component
+        return t
+
+    def __str__(self):
+        return '{}[]'.format(self.component)
+
+
+class ClassType(FieldType):
+    """A parameterized class, or a class nested in one: `outer` is the enclosing ClassType or ObjectType."""
+    __slots__ = ('name', 'arguments', 'outer')
+
+    @property
+    def erasure(self) -> ObjectType:
+        return field_type('L{};'.format(self.name))
+
+    def __str__(self):
+        if self.outer is None:
+            s = self.name.replace('/', '.')
+        else:
+            s = '{}.{}'.format(self.outer, self.name[len(self.outer.name) + 1:])
+        return s + '<{}>'.format(', '.join(map(str, self.arguments))) if self.arguments else s
+
+
+class TypeVariable(FieldType):
+    __slots__ = ('name',)
+
+    def __str__(self):
+        return self.name
+
+
+class Wildcard(JavaType):
+    """A wildcard type argument: `kind` is '*', '+' (extends) or '-' (super); `bound` is None for '*'."""
+    __slots__ = ('kind', 'bound')
+
+    def __str__(self):
+        if self.bound is None:
+            return '?'
+        return '? {} {}'.format('extends' if self.kind == '+' else 'super', self.bound)
+
+
+class TypeParameter(JavaType):
+    __slots__ = ('name', 'class_bound', 'interface_bounds')
+
+    @property
+    def bounds(self) -> Tuple[FieldType, ...]:
+        return ((self.class_bound,) if self.class_bound is not None else ()) + self.interface_bounds
+
+    def __str__(self):
+        bounds = self.bounds
+        return self.name + (' extends ' + ' & '.join(map(str, bounds)) if bounds else '')
+
+
+class MethodType(JavaType):
+    """A method descriptor or method signature.
+
+    `slots` holds the local variable slots of each parameter and `argument_size`
+    their sum, not counting `this`. Descriptors have no type parameters or exceptions.
+    """
+    __slots__ = ('type_parameters', 'parameters', 'return_type', 'exceptions', 'slots', 'argument_size')
+
+
+class ClassSignature(JavaType):
+    __slots__ = ('type_parameters', 'superclass', 'interfaces')
+
+
+_BASE_NAMES = {'B': 'byte', 'C': 'char', 'D': 'double', 'F': 'float', 'I': 'int', 'J': 'long', 'S': 'short',
+               'Z': 'boolean', 'V': 'void'}
+BASE_TYPES = {c: _intern(BaseType, c, name=name, size=0 if c == 'V' else 2 if c in 'JD' else 1)
+              for c, name in _BASE_NAMES.items()}
+VOID = BASE_TYPES['V']
+
+
+class _Parser(object):
+    def __init__(self, text):
+        self.text = text
+        self.pos = 0
+
+    def error(self, expected):
+        raise ValueError('bad descriptor {!r}: expected {} at {}'.format(self.text, expected, self.pos))
+
+    def peek(self):
+        return self.text[self.pos] if self.pos < len(self.text) else ''
+
+    def expect(self, c):
+        if self.peek() != c:
+            self.error(repr(c))
+        self.pos += 1
+
+    def identifier(self, stops) -> str:
+        text = self.text
+        start = pos = self.pos
+        while pos < len(text) and text[pos] not in stops:
+            pos += 1
+        if pos == start:
+            self.error('an identifier')
+        self.pos = pos
+        return text[start:pos]
+
+    def field_type(self) -> FieldType:
+        c = self.peek()
+        if c in BASE_TYPES and c != 'V':
+            self.pos += 1
+            return BASE_TYPES[c]
+        return self.reference_type()
+
+    def reference_type(self) -> FieldType:
+        start = self.pos
+        c = self.peek()
+        if c == 'L':
+            return self.class_type()
+        if c == '[':
+            self.pos += 1
+            component = self.field_type()
+            return _intern(ArrayType, self.text[start:self.pos], component=component)
+        if c == 'T':
+            self.pos += 1
+            name = self.identifier(';')
+            self.expect(';')
+            return _intern(TypeVariable, self.text[start:self.pos], name=name)
+        self.error('a field type')
+
+    def class_type(self) -> FieldType:
+        text = self.text
+        start = self.pos
+        self.pos += 1
+        name = self.identifier(';<.')
+        outer = None
+        while True:
+            arguments = self.type_arguments() if self.peek() == '<' else ()
+            c = self.peek()
+            if c != '.' and c != ';':
+                self.error("';'")
+            if arguments or outer is not None:
+                # the text of a nested type is that of the whole prefix, closed with ';'
+                key = text[start:self.pos] + ';'
+                t = _intern(ClassType, key, name=name, arguments=arguments, outer=outer)
+            else:
+                t = _intern(ObjectType, text[start:self.pos] + ';', name=name)
+            self.pos += 1
+            if c == ';':
+                return t
+            outer = t
+            name += '$' + self.identifier(';<.')
+
+    def type_arguments(self) -> tuple:
+        self.expect('<')
+        arguments = []
+        while self.peek() != '>':
+            start = self.pos
+            c = self.peek()
+            if c == '*':
+                self.pos += 1
+                arguments.append(_intern(Wildcard, '*', kind='*', bound=None))
+            elif c == '+' or c == '-':
+                self.pos += 1
+                bound = self.reference_type()
+                arguments.append(_intern(Wildcard, self.text[start:self.pos], kind=c, bound=bound))
+            else:
+                arguments.append(self.reference_type())
+        if not arguments:
+            self.error('a type argument')
+        self.pos += 1
+        return tuple(arguments)
+
+    def type_parameters(self) -> tuple:
+        if self.peek() != '<':
+            return ()
+        self.pos += 1
+        parameters = []
+        while self.peek() != '>':
+            start = self.pos
+            name = self.identifier(':')
+            self.expect(':')
+            class_bound = None if self.peek() == ':' else self.reference_type()
+            interface_bounds = []
+            while self.peek() == ':':
+                self.pos += 1
+                interface_bounds.append(self.reference_type())
+            parameters.append(_intern(TypeParameter, self.text[start:self.pos], name=name, class_bound=class_bound,
+                                      interface_bounds=tuple(interface_bounds)))
+        if not parameters:
+            self.error('a type parameter')
+        self.pos += 1
+        return tuple(parameters)
+
+    def method_type(self) -> MethodType:
+        type_parameters = self.type_parameters()
+        self.expect('(')
+        parameters = []
+        while self.peek() != ')':
+            parameters.append(self.field_type())
+        self.pos += 1
+        if self.peek() == 'V':
+            self.pos += 1
+            return_type = VOID
+        else:
+            return_type = self.field_type()
+        exceptions = []
+        while self.peek() == '^':
+            self.pos += 1
+            exceptions.append(self.reference_type())
+        self.end()
+        slots = tuple(p.size for p in parameters)
+        return _intern(MethodType, self.text, type_parameters=type_parameters, parameters=tuple(parameters),
+                       return_type=return_type, exceptions=tuple(exceptions), slots=slots,
+                       argument_size=sum(slots))
+
+    def class_signature(self) -> ClassSignature:
+        type_parameters = self.type_parameters()
+        superclass = self.class_type()
+        interfaces = []
+        while self.pos < len(self.text):
+            interfaces.append(self.class_type())
+        return _intern(ClassSignature, self.text, type_parameters=type_parameters, superclass=superclass,
+                       interfaces=tuple(interfaces))
+
+    def end(self):
+        if self.pos != len(self.text):
+            self.error('the end')
+
+
+Raw = Union[bytes, str]
+
+
+def _text(raw: Raw) -> str:
+    return raw if isinstance(raw, str) else decode_utf8(raw)
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def field_type(raw: Raw) -> FieldType:
+    """A field descriptor such as b'[Ljava/lang/String;', or a field signature such as 'Ljava/util/List<TE;>;'."""
+    parser = _Parser(_text(raw))
+    t = parser.field_type()
+    parser.end()
+    return t
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def method_type(raw: Raw) -> MethodType:
+    """A method descriptor such as b'(Ljava/lang/String;)V', or a method signature with type parameters and throws."""
+    return _Parser(_text(raw)).method_type()
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def class_signature(raw: Raw) -> ClassSignature:
+    """The Signature attribute of a class: type parameters, superclass and interfaces."""
+    parser = _Parser(_text(raw))
+    signature = parser.class_signature()
+    parser.end()
+    return signature
+
+
+def _type_parameter(text) -> TypeParameter:
+    parser = _Parser('<{}>'.format(text))
+    return parser.type_parameters()[0]
+
+
+def _wildcard(text) -> Wildcard:
+    return _Parser('<{}>'.format(text)).type_arguments()[0]
+
+
+_PARSERS = {MethodType: method_type, ClassSignature: class_signature, TypeParameter: _type_parameter,
+            Wildcard: _wildcard}
+
+
+def _reparse(cls, text) -> Optional[JavaType]:
+    return _PARSERS.get(cls, field_type)(text)
+
+
+if __name__ == "__main__":
+    import argparse
+    import sys
+    import time
+
+    from classpath import parse_classpath
+
+    parser = argparse.ArgumentParser(description='Parse every descriptor and signature of a classpath.')
+    parser.add_argument('paths', nargs='+')
+    args = parser.parse_args()
+
+    def raw_descriptors(cf):
+        from attribute import Signature
+        pool = cf.constants
+        items = []
+        for owners, parse in (([cf], class_signature), (cf.fields, field_type), (cf.methods, method_type)):
+            for owner in owners:
+                if owner is not cf:
+                    items.append((parse.__name__, pool[owner.descriptor_index].bytes))
+                signature = owner.get_attribute(Signature)
+                if signature is not None:
+                    items.append((parse.__name__, pool[signature.signature_index].bytes))
+        return items
+
+    work = []
+    for result in parse_classpath(args.paths, raw_descriptors):
+        if result.ok:
+            work.extend(result.value)
+        else:
+            print('{}!{}\t{}'.format(result.source, result.name, result.error), file=sys.stderr)
+    start = time.perf_counter()
+    failed = 0
+    parsers = {f.__name__: f for f in (field_type, method_type, class_signature)}
+    for kind, raw in work:
+        try:
+            parsers[kind](raw)
+        except ValueError as e:
+            failed += 1
+            print(e, file=sys.stderr)
+    elapsed = time.perf_counter() - start
+    info = [f.cache_info() for f in (field_type, method_type, class_signature)]
+    print('{} descriptors and signatures in {:.1f} ms, {} distinct, {} failed'.format(
+        len(work), elapsed * 1000, sum(i.misses for i in info), failed))
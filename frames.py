@@ -0,0 +1,215 @@
+import sys
+from array import array
+from bisect import bisect_right
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from attribute import Code, StackMapFrameType, StackMapTable, VerificationTypeInfo
+from attribute import VerificationTypeInfoTag as Tag
+from base import Object
+from classfile import AccessFlag, ClassFile, FieldMethodInfo
+from descriptor import ArrayType, BaseType, FieldType, method_type
+
+# A verification type is an interned tuple: (tag,) for the types without operands,
+# (OBJECT, class name or array descriptor) and (UNINITIALIZED, pc of the `new`).
+# Build them with object_type() and uninitialized() so equal types are the same object.
+VType = tuple
+TOP = (Tag.TOP,)
+INTEGER = (Tag.INTEGER,)
+FLOAT = (Tag.FLOAT,)
+DOUBLE = (Tag.DOUBLE,)
+LONG = (Tag.LONG,)
+NULL = (Tag.NULL,)
+UNINITIALIZED_THIS = (Tag.UNINITIALIZED_THIS,)
+SIMPLE_TYPES = (TOP, INTEGER, FLOAT, DOUBLE, LONG, NULL, UNINITIALIZED_THIS)
+# what jsr pushes; never in a StackMapTable, only seen when inferring types of old class files
+RETURN_ADDRESS = ('returnAddress',)
+
+
+class _InternTable(dict):
+    # tuples cannot be weakly referenced like descriptor.py's types, so the table is swept
+    # whenever it has doubled: types only the table still holds are dropped, and a type
+    # still in use is kept, so it is never replaced by an equal copy
+    __slots__ = ('sweep_at',)
+    MIN_SWEEP = 4096
+
+    def __init__(self):
+        super().__init__()
+        self.sweep_at = self.MIN_SWEEP
+
+    def add(self, key, t: VType) -> VType:
+        if len(self) >= self.sweep_at:
+            # getrefcount sees the table's reference and its own argument
+            for unused in [k for k in self if sys.getrefcount(self[k]) == 2]:
+                del self[unused]
+            self.sweep_at = max(self.MIN_SWEEP, 2 * len(self))
+        self[key] = t
+        return t
+
+
+_objects: Dict[str, VType] = _InternTable()
+_uninitialized: Dict[int, VType] = _InternTable()
+
+
+def object_type(name) -> VType:
+    t = _objects.get(name)
+    if t is None:
+        t = _objects.add(name, (Tag.OBJECT, name))
+    return t
+
+
+def uninitialized(offset) -> VType:
+    t = _uninitialized.get(offset)
+    if t is None:
+        t = _uninitialized.add(offset, (Tag.UNINITIALIZED, offset))
+    return t
+
+
+def type_name(t: VType) -> str:
+    """As javap prints it, e.g. 'int', 'class java/lang/String' or 'uninitialized 12'."""
+    if t[0] == Tag.OBJECT:
+        return 'class ' + t[1]
+    if t[0] == Tag.UNINITIALIZED:
+        return 'uninitialized {}'.format(t[1])
+    if t is RETURN_ADDRESS:
+        return 'returnAddress'
+    return _SIMPLE_NAMES[t[0]]
+
+
+_SIMPLE_NAMES = ('top', 'int', 'float', 'double', 'long', 'null', 'uninitializedThis')
+_BASE_TYPES = {'B': INTEGER, 'C': INTEGER, 'I': INTEGER, 'S': INTEGER, 'Z': INTEGER, 'F': FLOAT, 'J': LONG,
+               'D': DOUBLE}
+
+
+def vtype_of(t: FieldType) -> VType:
+    """The verification type of a value of field type `t`."""
+    if isinstance(t, BaseType):
+        return _BASE_TYPES[t.text]
+    if isinstance(t, ArrayType):
+        return object_type(t.text)
+    return object_type(t.name)
+
+
+def initial_locals(cf: ClassFile, method: FieldMethodInfo) -> List[VType]:
+    """The locals on entry to `method`, one entry per value as in a StackMapTable."""
+    types = []
+    if not method.access_flags & AccessFlag.ACC_STATIC:
+        if cf.get_utf8(method.name_index) == '<init>' and cf.name != 'java/lang/Object':
+            types.append(UNINITIALIZED_THIS)
+        else:
+            types.append(object_type(cf.name))
+    types.extend(vtype_of(t) for t in method_type(cf.constants[method.descriptor_index].bytes).parameters)
+    return types
+
+
+def to_slots(types) -> tuple:
+    """One entry per local variable or stack slot: a long or double is followed by TOP."""
+    slots = []
+    for t in types:
+        slots.append(t)
+        if t is LONG or t is DOUBLE:
+            slots.append(TOP)
+    return tuple(slots)
+
+
+class FrameTable(Object):
+    """The StackMapTable of one method expanded into full frames at absolute pcs.
+
+    Frame i holds from `pcs[i]` up to the next frame: `locals[i]` is indexed by local
+    variable slot and `stacks[i]` by operand stack slot, both as to_slots() tuples of
+    interned types. Frame 0 is the initial frame at pc 0, from the method descriptor,
+    unless the table has its own frame there. Frames are expanded on first use.
+    """
+    __slots__ = ('class_file', 'initial', 'entries', '_pcs', '_locals', '_stacks')
+
+    def __init__(self, cf: ClassFile, method: FieldMethodInfo):
+        self.class_file = cf
+        self.initial = initial_locals(cf, method)
+        code = method.get_attribute(Code)
+        table = code.get_attribute(StackMapTable) if code is not None else None
+        self.entries = table.entries if table is not None else []
+        self._pcs = None
+
+    def _expand(self):
+        vtype = self._vtype
+        interned = {}
+
+        def intern(types):
+            t = to_slots(types)
+            return interned.setdefault(t, t)
+
+        pcs = array('I', [0])
+        current = list(self.initial)
+        all_locals = [intern(current)]
+        stacks = [()]
+        pc = -1
+        for frame in self.entries:
+            pc += frame.offset_delta + 1
+            kind = frame.frame_type
+            if kind == StackMapFrameType.CHOP:
+                del current[len(current) - (251 - frame.tag):]
+            elif kind == StackMapFrameType.APPEND:
+                current.extend(vtype(info) for info in frame.locals)
+            elif kind == StackMapFrameType.FULL_FRAME:
+                current = [vtype(info) for info in frame.locals]
+            stack = intern([vtype(info) for info in frame.stack]) if frame.stack else ()
+            if pc == 0:
+                # replaces the implicit initial frame
+                all_locals[0] = intern(current)
+                stacks[0] = stack
+                continue
+            pcs.append(pc)
+            all_locals.append(intern(current))
+            stacks.append(stack)
+        self._locals = all_locals
+        self._stacks = stacks
+        self._pcs = pcs
+
+    def _vtype(self, info: VerificationTypeInfo) -> VType:
+        if info.tag == Tag.OBJECT:
+            return object_type(self.class_file.get_class_name(info.const_pool_index))
+        if info.tag == Tag.UNINITIALIZED:
+            return uninitialized(info.offset)
+        return SIMPLE_TYPES[info.tag]
+
+    @property
+    def pcs(self) -> array:
+        if self._pcs is None:
+            self._expand()
+        return self._pcs
+
+    @property
+    def locals(self) -> List[tuple]:
+        if self._pcs is None:
+            self._expand()
+        return self._locals
+
+    @property
+    def stacks(self) -> List[tuple]:
+        if self._pcs is None:
+            self._expand()
+        return self._stacks
+
+    def __len__(self):
+        return len(self.pcs)
+
+    def __iter__(self) -> Iterator[Tuple[int, tuple, tuple]]:
+        return zip(self.pcs, self.locals, self.stacks)
+
+    def __repr__(self):
+        return 'FrameTable({} frames)'.format(len(self.entries) + 1)
+
+    def index_at(self, pc) -> int:
+        """The frame in effect at `pc`, i.e. the last one at or before it."""
+        return bisect_right(self.pcs, pc) - 1
+
+    def at(self, pc) -> Tuple[tuple, tuple]:
+        """(locals, stack) of the frame in effect at `pc`."""
+        i = self.index_at(pc)
+        return self._locals[i], self._stacks[i]
+
+    def exact(self, pc) -> Optional[Tuple[tuple, tuple]]:
+        """(locals, stack) of the frame recorded at `pc`, None if there is none."""
+        i = self.index_at(pc)
+        if self._pcs[i] != pc:
+            return None
+        return self._locals[i], self._stacks[i]
@@ -0,0 +1,247 @@
+import sys
+from array import array
+from collections import deque
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import store
+from base import Object
+from classfile import AccessFlag, ClassFile
+from classpath import parse_classpath
+
+OBJECT = 'java/lang/Object'
+UNKNOWN = -1  # access flags of a class that is referenced but not on the classpath
+
+
+def hierarchy_entry(cf: ClassFile) -> Tuple[str, Optional[str], List[str], int]:
+    return cf.name, cf.super_name, cf.interface_names, cf.access_flags
+
+
+class ClassHierarchy(Object):
+    """Type hierarchy of a whole classpath, stored as integer-id adjacency arrays.
+
+    Every class name seen, defined or only referenced, gets an id. `supers[id]` is
+    the superclass id (-1 if none), interfaces and direct subtypes are CSR lists:
+    the targets of id are `targets[offsets[id]:offsets[id + 1]]`. Queries raise
+    KeyError for a name that is not in the hierarchy.
+    """
+    MAGIC = b'CFHIER\0\0'
+    VERSION = 1
+
+    def __init__(self):
+        self.names: List[str] = []
+        self.ids: Dict[str, int] = {}
+        self.flags = array('i')
+        self.supers = array('i')
+        self.interface_offsets = array('I', [0])
+        self.interface_targets = array('i')
+        self.subtype_offsets = array('I', [0])
+        self.subtype_targets = array('i')
+
+    @staticmethod
+    def build(entries: Iterable[Tuple[str, Optional[str], List[str], int]]) -> 'ClassHierarchy':
+        """Builds from (name, super_name, interface_names, access_flags) tuples, e.g. hierarchy_entry(cf)."""
+        h = ClassHierarchy()
+        defined = {}
+        for entry in entries:
+            # the first definition wins, as on a classpath
+            defined.setdefault(entry[0], entry)
+        for name, super_name, interfaces, flags in defined.values():
+            h._intern(name)
+            h.flags[h.ids[name]] = flags
+        edges = []
+        for name, super_name, interfaces, flags in defined.values():
+            edges.append((h.ids[name], h._intern(super_name) if super_name else -1,
+                          [h._intern(i) for i in interfaces]))
+        count = len(h.names)
+        h.supers = array('i', [-1]) * count
+        interfaces_of = [()] * count
+        subtypes_of = [[] for _ in range(count)]
+        for i, super_id, interfaces in edges:
+            h.supers[i] = super_id
+            interfaces_of[i] = interfaces
+            if super_id >= 0:
+                subtypes_of[super_id].append(i)
+            for j in interfaces:
+                subtypes_of[j].append(i)
+        h.interface_offsets, h.interface_targets = _csr(interfaces_of)
+        h.subtype_offsets, h.subtype_targets = _csr(subtypes_of)
+        return h
+
+    @staticmethod
+    def from_class_files(class_files: Iterable[ClassFile]) -> 'ClassHierarchy':
+        return ClassHierarchy.build(hierarchy_entry(cf) for cf in class_files)
+
+    @staticmethod
+    def from_classpath(paths, workers=None) -> 'ClassHierarchy':
+        results = parse_classpath(paths, hierarchy_entry, workers, header_only=True)
+        return ClassHierarchy.build(r.value for r in results if r.ok)
+
+    def _intern(self, name) -> int:
+        i = self.ids.get(name)
+        if i is None:
+            i = self.ids[name] = len(self.names)
+            self.names.append(name)
+            self.flags.append(UNKNOWN)
+        return i
+
+    def __len__(self):
+        return len(self.names)
+
+    def __contains__(self, name):
+        return name in self.ids
+
+    def __repr__(self):
+        return 'ClassHierarchy({} classes)'.format(len(self.names))
+
+    def _id(self, name) -> int:
+        i = self.ids.get(name)
+        if i is None:
+            raise KeyError('{} is not in the hierarchy'.format(name))
+        return i
+
+    def is_interface(self, name) -> bool:
+        flags = self.flags[self._id(name)]
+        return flags != UNKNOWN and bool(flags & AccessFlag.ACC_INTERFACE)
+
+    def _interfaces(self, i):
+        return self.interface_targets[self.interface_offsets[i]:self.interface_offsets[i + 1]]
+
+    def _subtypes(self, i):
+        return self.subtype_targets[self.subtype_offsets[i]:self.subtype_offsets[i + 1]]
+
+    def _superclass_ids(self, i) -> List[int]:
+        chain = []
+        i = self.supers[i]
+        while i >= 0 and len(chain) <= len(self.names):
+            chain.append(i)
+            i = self.supers[i]
+        return chain
+
+    def superclasses(self, name) -> List[str]:
+        """The superclass chain, nearest first."""
+        return [self.names[i] for i in self._superclass_ids(self._id(name))]
+
+    def supertypes(self, name) -> List[str]:
+        """All superclasses and transitively implemented or extended interfaces."""
+        start = self._id(name)
+        seen = {start}
+        queue = deque([start])
+        result = []
+        while queue:
+            i = queue.popleft()
+            s = self.supers[i]
+            for j in ([s] if s >= 0 else []) + list(self._interfaces(i)):
+                if j not in seen:
+                    seen.add(j)
+                    result.append(j)
+                    queue.append(j)
+        return [self.names[i] for i in result]
+
+    def _subtype_ids(self, start) -> List[int]:
+        seen = {start}
+        queue = deque([start])
+        result = []
+        while queue:
+            for j in self._subtypes(queue.popleft()):
+                if j not in seen:
+                    seen.add(j)
+                    result.append(j)
+                    queue.append(j)
+        return result
+
+    def subtypes(self, name) -> List[str]:
+        """All transitive subclasses and subinterfaces."""
+        return [self.names[i] for i in self._subtype_ids(self._id(name))]
+
+    def direct_subtypes(self, name) -> List[str]:
+        return [self.names[i] for i in self._subtypes(self._id(name))]
+
+    def implementors(self, name) -> List[str]:
+        """Classes (not interfaces) that implement the interface `name`, directly or through a supertype."""
+        flags = self.flags
+        return [self.names[i] for i in self._subtype_ids(self._id(name))
+                if flags[i] == UNKNOWN or not flags[i] & AccessFlag.ACC_INTERFACE]
+
+    def least_common_superclass(self, a, b) -> str:
+        """The nearest common superclass, java/lang/Object when either side is an interface."""
+        if a == b:
+            return a
+        ia, ib = self._id(a), self._id(b)
+        if self.is_interface(a) or self.is_interface(b):
+            return OBJECT
+        ancestors = {ia}
+        ancestors.update(self._superclass_ids(ia))
+        for i in [ib] + self._superclass_ids(ib):
+            if i in ancestors:
+                return self.names[i]
+        return OBJECT
+
+    def save(self, path):
+        def write(out):
+            store.write_header(out, self.MAGIC, self.VERSION)
+            store.write_strings(out, self.names)
+            for values in (self.flags, self.supers, self.interface_offsets, self.interface_targets,
+                           self.subtype_offsets, self.subtype_targets):
+                store.write_array(out, values)
+        store.save(path, write)
+
+    @staticmethod
+    def load(path) -> 'ClassHierarchy':
+        stream = store.load(path)
+        store.read_header(stream, ClassHierarchy.MAGIC, ClassHierarchy.VERSION)
+        h = ClassHierarchy()
+        h.names = store.read_strings(stream)
+        h.ids = dict(zip(h.names, range(len(h.names))))
+        h.flags = store.read_array(stream, 'i')
+        h.supers = store.read_array(stream, 'i')
+        h.interface_offsets = store.read_array(stream, 'I')
+        h.interface_targets = store.read_array(stream, 'i')
+        h.subtype_offsets = store.read_array(stream, 'I')
+        h.subtype_targets = store.read_array(stream, 'i')
+        return h
+
+
+def _csr(lists) -> Tuple[array, array]:
+    offsets = array('I', [0])
+    targets = array('i')
+    for items in lists:
+        targets.extend(items)
+        offsets.append(len(targets))
+    return offsets, targets
+
+
+if __name__ == "__main__":
+    import argparse
+    import time
+
+    parser = argparse.ArgumentParser(description='Build or query a classpath hierarchy index.')
+    sub = parser.add_subparsers(dest='command', required=True)
+    build = sub.add_parser('build')
+    build.add_argument('index')
+    build.add_argument('paths', nargs='+')
+    build.add_argument('-j', '--workers', type=int, default=None)
+    query = sub.add_parser('query')
+    query.add_argument('index')
+    query.add_argument('kind', choices=['supertypes', 'subtypes', 'implementors', 'lcs'])
+    query.add_argument('names', nargs='+')
+    args = parser.parse_args()
+
+    if args.command == 'build':
+        hierarchy = ClassHierarchy.from_classpath(args.paths, args.workers)
+        hierarchy.save(args.index)
+        print(hierarchy)
+    else:
+        start = time.perf_counter()
+        hierarchy = ClassHierarchy.load(args.index)
+        loaded = time.perf_counter()
+        unknown = [name for name in args.names if name not in hierarchy]
+        if unknown:
+            print('not in the hierarchy: {}'.format(', '.join(unknown)), file=sys.stderr)
+            sys.exit(1)
+        if args.kind == 'lcs':
+            print(hierarchy.least_common_superclass(*args.names[:2]))
+        else:
+            for name in args.names:
+                for found in getattr(hierarchy, args.kind)(name):
+                    print(found)
+        print('loaded in {:.1f} ms'.format((loaded - start) * 1000), file=sys.stderr)
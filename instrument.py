@@ -0,0 +1,98 @@
+import sys
+from typing import Dict, List
+
+from base import Object
+from classfile import ClassFile
+from instruction import INSTRUCTIONS
+
+# A hook passed to ClassFile(..., hook=) is called as hook(event, key, value) with
+#   ('phase', phase, seconds)   once per phase of every class, phase being one of PHASES
+#   ('attribute', name, bytes)  for every attribute read, at any depth, with its body length
+#   ('opcode', opcode, count)   per opcode of every method body decoded during the parse
+# 'bytecode' is the decoding of method bodies, which is also part of 'methods'; lazy
+# and header_only parses decode no bytecode. Without a hook nothing is timed or counted.
+PHASES = ('header', 'constants', 'fields', 'methods', 'attributes', 'bytecode')
+
+
+class ParseStats(Object):
+    """A hook that adds up the events of any number of parses.
+
+    `times[phase]` is total seconds, `attribute_counts` and `attribute_bytes` are keyed
+    by attribute name and `opcodes[opcode]` counts decoded instructions.
+    """
+    __slots__ = ('classes', 'times', 'attribute_counts', 'attribute_bytes', 'opcodes')
+
+    def __init__(self):
+        self.classes = 0
+        self.times: Dict[str, float] = dict.fromkeys(PHASES, 0.0)
+        self.attribute_counts: Dict[str, int] = {}
+        self.attribute_bytes: Dict[str, int] = {}
+        self.opcodes: List[int] = [0] * 256
+
+    def __call__(self, event, key, value):
+        if event == 'phase':
+            self.times[key] += value
+            if key == 'header':
+                self.classes += 1
+        elif event == 'attribute':
+            self.attribute_counts[key] = self.attribute_counts.get(key, 0) + 1
+            self.attribute_bytes[key] = self.attribute_bytes.get(key, 0) + value
+        elif event == 'opcode':
+            self.opcodes[key] += value
+
+    def merge(self, other: 'ParseStats'):
+        """Adds the counters of `other`, e.g. collected in another process."""
+        self.classes += other.classes
+        for phase, seconds in other.times.items():
+            self.times[phase] += seconds
+        for name, count in other.attribute_counts.items():
+            self.attribute_counts[name] = self.attribute_counts.get(name, 0) + count
+            self.attribute_bytes[name] = self.attribute_bytes.get(name, 0) + other.attribute_bytes[name]
+        for opcode, count in enumerate(other.opcodes):
+            self.opcodes[opcode] += count
+
+    def __repr__(self):
+        return 'ParseStats({} classes, {:.3f} s)'.format(self.classes, self.total)
+
+    @property
+    def total(self) -> float:
+        # bytecode time is already part of the methods phase
+        return sum(seconds for phase, seconds in self.times.items() if phase != 'bytecode')
+
+    def report(self, top=20) -> str:
+        total = self.total or 1
+        lines = ['{} classes in {:.3f} s'.format(self.classes, self.total),
+                 '{:36} {:>12} {:>7}'.format('phase', 'seconds', 'share')]
+        for phase in PHASES:
+            lines.append('{:36} {:12.4f} {:7.1%}'.format(phase, self.times[phase], self.times[phase] / total))
+        lines.append('{:36} {:>12} {:>12}'.format('attribute', 'count', 'bytes'))
+        for name in sorted(self.attribute_bytes, key=self.attribute_bytes.get, reverse=True):
+            lines.append('{:36} {:12} {:12}'.format(name, self.attribute_counts[name], self.attribute_bytes[name]))
+        used = sorted((opcode for opcode in range(256) if self.opcodes[opcode]), key=lambda op: -self.opcodes[op])
+        if used:
+            lines.append('{:36} {:>12}'.format('opcode', 'count'))
+            for opcode in used[:top or None]:
+                lines.append('{:36} {:12}'.format(INSTRUCTIONS[opcode].NAME, self.opcodes[opcode]))
+        return '\n'.join(lines)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    from classpath import map_classpath
+    from stream import BufferStream
+
+    parser = argparse.ArgumentParser(description='Show where parse time goes on jars, jmods, directories or classes.')
+    parser.add_argument('paths', nargs='+')
+    parser.add_argument('--lazy', action='store_true')
+    parser.add_argument('--top', type=int, default=20, help='opcodes to list, 0 for all')
+    args = parser.parse_args()
+
+    stats = ParseStats()
+    # in this process, so every parse reports to the same stats
+    for result in map_classpath(args.paths, lambda data: ClassFile(BufferStream(data), lazy=args.lazy, hook=stats),
+                                workers=1):
+        if not result.ok:
+            print('{}{}\t{}'.format(result.source, '!' + result.name if result.name else '', result.error),
+                  file=sys.stderr)
+    print(stats.report(args.top))
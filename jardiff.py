@@ -0,0 +1,208 @@
+import sys
+from array import array
+from typing import Dict, List, Optional, Tuple
+
+import store
+from archive import Archive
+from base import Object
+from classfile import ClassFile
+from classpath import parse_entries
+
+# (name, descriptor) of a field or method
+Member = Tuple[str, str]
+
+
+def class_members(cf: ClassFile) -> Tuple[str, List[Member], List[Member]]:
+    return (cf.name,
+            [(cf.get_utf8(f.name_index), cf.get_utf8(f.descriptor_index)) for f in cf.fields],
+            [(cf.get_utf8(m.name_index), cf.get_utf8(m.descriptor_index)) for m in cf.methods])
+
+
+class ManifestEntry(Object):
+    __slots__ = ('crc', 'size', 'class_name', 'fields', 'methods')
+
+    def __init__(self, crc, size, class_name, fields: List[Member], methods: List[Member]):
+        # crc and size are the CRC-32 and uncompressed size from the zip central directory;
+        # class_name is None for an entry that failed to parse and has no earlier version
+        self.crc = crc
+        self.size = size
+        self.class_name = class_name
+        self.fields = fields
+        self.methods = methods
+
+
+class ClassDiff(Object):
+    """A class whose entry changed; the member lists are empty if only bodies or flags did."""
+    __slots__ = ('entry', 'name', 'added_fields', 'removed_fields', 'added_methods', 'removed_methods')
+
+    def __init__(self, entry, old: ManifestEntry, new: ManifestEntry):
+        self.entry = entry
+        self.name = new.class_name
+        self.added_fields = _missing(new.fields, old.fields)
+        self.removed_fields = _missing(old.fields, new.fields)
+        self.added_methods = _missing(new.methods, old.methods)
+        self.removed_methods = _missing(old.methods, new.methods)
+
+
+def _missing(members: List[Member], other: List[Member]) -> List[Member]:
+    present = set(other)
+    return [m for m in members if m not in present]
+
+
+class JarDiff(Object):
+    def __init__(self):
+        self.added: List[str] = []
+        self.removed: List[str] = []
+        self.changed: List[ClassDiff] = []
+        self.unchanged = 0
+        # (entry, error) for added or changed entries that failed to parse
+        self.errors: List[Tuple[str, str]] = []
+
+    def __repr__(self):
+        return 'JarDiff({} added, {} removed, {} changed, {} unchanged)'.format(
+            len(self.added), len(self.removed), len(self.changed), self.unchanged)
+
+
+class JarManifest(Object):
+    """CRC-32, size and member signatures of every class entry of a jar, by entry name.
+
+    Entries that failed to parse stay in the manifest, so they are parsed again on the
+    next diff rather than dropped and later reported as added.
+    """
+    MAGIC = b'CFJARMF\0'
+    VERSION = 1
+
+    def __init__(self):
+        self.entries: Dict[str, ManifestEntry] = {}
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __repr__(self):
+        return 'JarManifest({} classes)'.format(len(self.entries))
+
+    @staticmethod
+    def from_jar(path) -> 'JarManifest':
+        return diff_jar(path)[1]
+
+    def save(self, path):
+        symbols = []
+        symbol_ids = {}
+
+        def intern(s):
+            i = symbol_ids.get(s)
+            if i is None:
+                i = symbol_ids[s] = len(symbols)
+                symbols.append(s)
+            return i
+
+        names = list(self.entries)
+        entries = [self.entries[name] for name in names]
+        crcs = array('I', [e.crc for e in entries])
+        sizes = array('Q', [e.size for e in entries])
+        class_names = array('i', [-1 if e.class_name is None else intern(e.class_name) for e in entries])
+        tables = []
+        for kind in ('fields', 'methods'):
+            offsets = array('I', [0])
+            members = array('i')
+            for e in entries:
+                for name, descriptor in getattr(e, kind):
+                    members.extend((intern(name), intern(descriptor)))
+                offsets.append(len(members))
+            tables.extend((offsets, members))
+
+        def write(out):
+            store.write_header(out, self.MAGIC, self.VERSION)
+            store.write_strings(out, names)
+            store.write_strings(out, symbols)
+            for values in [crcs, sizes, class_names] + tables:
+                store.write_array(out, values)
+        store.save(path, write)
+
+    @staticmethod
+    def load(path) -> 'JarManifest':
+        stream = store.load(path)
+        store.read_header(stream, JarManifest.MAGIC, JarManifest.VERSION)
+        names = store.read_strings(stream)
+        symbols = store.read_strings(stream)
+        crcs = store.read_array(stream, 'I')
+        sizes = store.read_array(stream, 'Q')
+        class_names = store.read_array(stream, 'i')
+        members = []
+        for _ in ('fields', 'methods'):
+            offsets = store.read_array(stream, 'I')
+            flat = store.read_array(stream, 'i')
+            members.append([[(symbols[flat[j]], symbols[flat[j + 1]]) for j in range(offsets[i], offsets[i + 1], 2)]
+                            for i in range(len(names))])
+        manifest = JarManifest()
+        for i, name in enumerate(names):
+            class_name = symbols[class_names[i]] if class_names[i] >= 0 else None
+            manifest.entries[name] = ManifestEntry(crcs[i], sizes[i], class_name, members[0][i], members[1][i])
+        return manifest
+
+
+def diff_jar(path, manifest: Optional[JarManifest] = None) -> Tuple[JarDiff, JarManifest]:
+    """Compares a jar or jmod against `manifest` (None: an empty one), returning the diff and the new manifest.
+
+    Only the zip central directory is read for entries whose CRC-32 and size match
+    the manifest; just the added and changed entries are parsed, header only.
+    """
+    old = manifest.entries if manifest is not None else {}
+    result = JarDiff()
+    new = JarManifest()
+    with Archive(path) as archive:
+        infos = list(archive.classes.values())
+    stale = {}
+    for info in infos:
+        entry = old.get(info.name)
+        if entry is not None and entry.class_name is not None and entry.crc == info.crc and entry.size == info.size:
+            new.entries[info.name] = entry
+            result.unchanged += 1
+        else:
+            stale[info.name] = info
+    for parsed in parse_entries(path, list(stale), class_members, header_only=True):
+        info = stale[parsed.name]
+        previous = old.get(parsed.name)
+        if not parsed.ok:
+            result.errors.append((parsed.name, parsed.error))
+            # keep the previous version, or a marker, so the entry is parsed again next time
+            new.entries[parsed.name] = previous or ManifestEntry(info.crc, info.size, None, [], [])
+            continue
+        entry = new.entries[parsed.name] = ManifestEntry(info.crc, info.size, *parsed.value)
+        if previous is None or previous.class_name is None:
+            result.added.append(entry.class_name)
+        else:
+            result.changed.append(ClassDiff(parsed.name, previous, entry))
+    present = {info.name for info in infos}
+    result.removed = [entry.class_name for name, entry in old.items()
+                      if name not in present and entry.class_name is not None]
+    return result, new
+
+
+if __name__ == "__main__":
+    import argparse
+    import os
+
+    parser = argparse.ArgumentParser(description='Diff a jar against the manifest of an earlier build, then update it.')
+    parser.add_argument('manifest', help='created on the first run')
+    parser.add_argument('jar')
+    parser.add_argument('--dry-run', action='store_true', help='do not update the manifest')
+    args = parser.parse_args()
+
+    previous = JarManifest.load(args.manifest) if os.path.exists(args.manifest) else None
+    diff, current = diff_jar(args.jar, previous)
+    for name in diff.added:
+        print('+ {}'.format(name))
+    for name in diff.removed:
+        print('- {}'.format(name))
+    for changed in diff.changed:
+        print('~ {}'.format(changed.name))
+        for sign, kind, members in (('+', 'field', changed.added_fields), ('-', 'field', changed.removed_fields),
+                                    ('+', 'method', changed.added_methods), ('-', 'method', changed.removed_methods)):
+            for name, descriptor in members:
+                print('    {} {} {} {}'.format(sign, kind, name, descriptor))
+    for entry, error in diff.errors:
+        print('{}!{}\t{}'.format(args.jar, entry, error), file=sys.stderr)
+    if not args.dry_run:
+        current.save(args.manifest)
+    print(diff, file=sys.stderr)
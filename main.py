@@ -1,16 +1,655 @@
-from attribute import Code
-from classfile import ClassFile
-from const import Utf8Info
-from stream import Stream
+import os
+import sys
+from decimal import Decimal
+from functools import partial
+from struct import Struct
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from annotations import element_value
+from archive import Archive
+from attribute import (AnnotationDefault, BootstrapMethods, Code, ConstantValue, Deprecated, EnclosingMethod, Exceptions,
+                       InnerClasses, LineNumberTable, LocalVariableTable, LocalVariableTypeTable, RuntimeInvisibleAnnotations,
+                       RuntimeInvisibleParameterAnnotations, RuntimeVisibleAnnotations, RuntimeVisibleParameterAnnotations,
+                       Signature, SourceFile, StackMapFrameType, StackMapTable, Synthetic, UnknownAttribute,
+                       VerificationTypeInfo)
+from attribute import VerificationTypeInfoTag as Tag
+from base import Object
+from cfg import CONDITIONALS, GOTOS, JSRS
+from classfile import AccessFlag, ClassFile, FieldMethodInfo
+from classpath import ARCHIVE_SUFFIXES, ParseResult, iter_work, map_units, split_classpath
+from const import (ClassInfo, DoubleInfo, FieldRef, FloatInfo, IntegerInfo, InterfaceMethodRef, InvokeDynamic, LongInfo,
+                   MethodHandle, MethodRef, NameAndType, StringInfo, Utf8Info, decode_pool)
+from const import MethodType as MethodTypeInfo
+from descriptor import class_signature, field_type, method_type
+from frames import SIMPLE_TYPES, type_name, uninitialized
+from instruction import INSTRUCTIONS, Ins
+from stream import BufferStream
+
+_FLOAT = Struct('>f')
+_DOUBLE = Struct('>d')
+
+# (flag, ACC_ name, modifier keyword or None) in the order javap lists them
+_CLASS_FLAGS = ((0x0001, 'ACC_PUBLIC', 'public'), (0x0010, 'ACC_FINAL', 'final'), (0x0020, 'ACC_SUPER', None),
+                (0x0200, 'ACC_INTERFACE', None), (0x0400, 'ACC_ABSTRACT', 'abstract'),
+                (0x1000, 'ACC_SYNTHETIC', None), (0x2000, 'ACC_ANNOTATION', None), (0x4000, 'ACC_ENUM', None),
+                (0x8000, 'ACC_MODULE', None))
+_FIELD_FLAGS = ((0x0001, 'ACC_PUBLIC', 'public'), (0x0002, 'ACC_PRIVATE', 'private'),
+                (0x0004, 'ACC_PROTECTED', 'protected'), (0x0008, 'ACC_STATIC', 'static'),
+                (0x0010, 'ACC_FINAL', 'final'), (0x0040, 'ACC_VOLATILE', 'volatile'),
+                (0x0080, 'ACC_TRANSIENT', 'transient'), (0x1000, 'ACC_SYNTHETIC', None), (0x4000, 'ACC_ENUM', None))
+_METHOD_FLAGS = ((0x0001, 'ACC_PUBLIC', 'public'), (0x0002, 'ACC_PRIVATE', 'private'),
+                 (0x0004, 'ACC_PROTECTED', 'protected'), (0x0008, 'ACC_STATIC', 'static'),
+                 (0x0010, 'ACC_FINAL', 'final'), (0x0020, 'ACC_SYNCHRONIZED', 'synchronized'),
+                 (0x0040, 'ACC_BRIDGE', None), (0x0080, 'ACC_VARARGS', None), (0x0100, 'ACC_NATIVE', 'native'),
+                 (0x0400, 'ACC_ABSTRACT', 'abstract'), (0x0800, 'ACC_STRICT', 'strictfp'),
+                 (0x1000, 'ACC_SYNTHETIC', None))
+_INNER_CLASS_FLAGS = _FIELD_FLAGS[:5] + ((0x0200, 'ACC_INTERFACE', None), (0x0400, 'ACC_ABSTRACT', 'abstract'),
+                                         (0x1000, 'ACC_SYNTHETIC', None), (0x2000, 'ACC_ANNOTATION', None),
+                                         (0x4000, 'ACC_ENUM', None))
+
+_CONSTANT_KINDS = {Utf8Info: 'Utf8', IntegerInfo: 'Integer', FloatInfo: 'Float', LongInfo: 'Long',
+                   DoubleInfo: 'Double', ClassInfo: 'Class', StringInfo: 'String', FieldRef: 'Fieldref',
+                   MethodRef: 'Methodref', InterfaceMethodRef: 'InterfaceMethodref', NameAndType: 'NameAndType',
+                   MethodHandle: 'MethodHandle', MethodTypeInfo: 'MethodType', InvokeDynamic: 'InvokeDynamic'}
+# how a constant is named in the comment after an instruction
+_COMMENT_KINDS = {FieldRef: 'Field', MethodRef: 'Method', InterfaceMethodRef: 'InterfaceMethod', ClassInfo: 'class',
+                  StringInfo: 'String', IntegerInfo: 'int', FloatInfo: 'float', LongInfo: 'long', DoubleInfo: 'double',
+                  MethodHandle: 'MethodHandle', MethodTypeInfo: 'MethodType', InvokeDynamic: 'InvokeDynamic'}
+_REFERENCE_KINDS = ('', 'REF_getField', 'REF_getStatic', 'REF_putField', 'REF_putStatic', 'REF_invokeVirtual',
+                    'REF_invokeStatic', 'REF_invokeSpecial', 'REF_newInvokeSpecial', 'REF_invokeInterface')
+_NEWARRAY_TYPES = {4: 'boolean', 5: 'char', 6: 'float', 7: 'double', 8: 'byte', 9: 'short', 10: 'int', 11: 'long'}
+_FRAME_NAMES = {StackMapFrameType.SAME: 'same', StackMapFrameType.SAME_LOCALS_1_STACK_ITEM: 'same_locals_1_stack_item',
+                StackMapFrameType.SAME_LOCALS_1_STACK_ITEM_EXTENDED: 'same_locals_1_stack_item_frame_extended',
+                StackMapFrameType.CHOP: 'chop', StackMapFrameType.SAME_FRAME_EXTENDED: 'same_frame_extended',
+                StackMapFrameType.APPEND: 'append', StackMapFrameType.FULL_FRAME: 'full_frame'}
+_ESCAPES = {'\n': '\\n', '\t': '\\t', '\r': '\\r', '\b': '\\b', '\f': '\\f'}
+
+_POOL_OPERANDS = frozenset(cls.OPCODE for cls in (
+    Ins.ldc, Ins.ldc_w, Ins.ldc2_w, Ins.getstatic, Ins.putstatic, Ins.getfield, Ins.putfield, Ins.invokevirtual,
+    Ins.invokespecial, Ins.invokestatic, Ins.invokeinterface, Ins.invokedynamic, Ins.new, Ins.checkcast,
+    Ins.instanceof, Ins.anewarray, Ins.multianewarray))
+_BRANCHES = GOTOS | JSRS | CONDITIONALS
+
+
+def _escape(s) -> str:
+    return ''.join(_ESCAPES.get(c) or ('\\u{:04x}'.format(ord(c)) if c < ' ' else c) for c in s)
+
+
+def java_number(digits: str) -> str:
+    """A float or double, given as its shortest round-tripping digits, as Java's toString() prints it."""
+    value = float(digits)
+    if value != value:
+        return 'NaN'
+    if value in (float('inf'), float('-inf')):
+        return '-Infinity' if value < 0 else 'Infinity'
+    if value == 0:
+        return '-0.0' if digits.startswith('-') else '0.0'
+    sign, numerals, exponent = Decimal(digits).normalize().as_tuple()
+    numerals = ''.join(map(str, numerals))
+    point = len(numerals) + exponent
+    scientific = point - 1
+    if -3 <= scientific < 7:
+        if point <= 0:
+            s = '0.' + '0' * -point + numerals
+        elif point >= len(numerals):
+            s = numerals + '0' * (point - len(numerals)) + '.0'
+        else:
+            s = numerals[:point] + '.' + numerals[point:]
+    else:
+        s = '{}.{}E{}'.format(numerals[0], numerals[1:] or '0', scientific)
+    return '-' + s if sign else s
+
+
+def _float_digits(bits) -> str:
+    # the fewest significant digits that read back as the same float32
+    value = _FLOAT.unpack(bits.to_bytes(4, 'big'))[0]
+    if value != value or value in (float('inf'), float('-inf')):
+        return repr(value)
+    for precision in range(1, 10):
+        digits = '{:.{}g}'.format(value, precision)
+        if _FLOAT.pack(float(digits)) == bits.to_bytes(4, 'big'):
+            return digits
+    return repr(value)
+
+
+def _modifiers(flags, table) -> List[str]:
+    return [keyword for flag, _, keyword in table if keyword and flags & flag]
+
+
+def _flag_names(flags, table) -> str:
+    return '({:#06x}) {}'.format(flags, ', '.join(name for flag, name, _ in table if flags & flag))
+
+
+class Disassembler(Object):
+    """Renders one class the way `javap` does: declarations only by default, bytecode
+    with `code`, and everything, constant pool included, with `verbose`. Members
+    that are private are left out unless `private` is set.
+    """
+    __slots__ = ('cf', 'pool', 'code', 'verbose', 'private', 'lines')
+
+    def __init__(self, cf: ClassFile, code=False, verbose=False, private=False):
+        self.cf = cf
+        self.pool = cf.constants
+        self.verbose = verbose
+        self.code = code or verbose
+        self.private = private
+        self.lines = []
+
+    def render(self, title=None) -> str:
+        cf = self.cf
+        decode_pool(self.pool)
+        out = self.lines
+        if self.verbose and title:
+            out.append('Classfile {}'.format(title))
+        source = cf.get_attribute(SourceFile)
+        if source is not None:
+            out.append('{}Compiled from "{}"'.format('  ' if self.verbose else '',
+                                                     cf.get_utf8(source.sourcefile_index)))
+        declaration = self.class_declaration()
+        if self.verbose:
+            out.append(declaration)
+            out.append('  minor version: {}'.format(cf.minor_version))
+            out.append('  major version: {}'.format(cf.major_version))
+            out.append('  flags: {}'.format(_flag_names(cf.access_flags, _CLASS_FLAGS)))
+            out.append(self.comment('  this_class: #{}'.format(cf.this_class), cf.name, 42))
+            out.append(self.comment('  super_class: #{}'.format(cf.super_class), cf.super_name or '', 42)
+                       if cf.super_class else '  super_class: #0')
+            out.append('  interfaces: {}, fields: {}, methods: {}, attributes: {}'.format(
+                len(cf.interfaces), len(cf.fields), len(cf.methods), len(cf.attributes)))
+            self.constant_pool()
+            out.append('{')
+        else:
+            out.append(declaration + ' {')
+        first = True
+        for member, is_method in [(f, False) for f in cf.fields] + [(m, True) for m in cf.methods]:
+            if member.access_flags & AccessFlag.ACC_PRIVATE and not self.private:
+                continue
+            if self.code and not first:
+                out.append('')
+            first = False
+            self.member(member, is_method)
+        out.append('}')
+        if self.verbose:
+            self.attributes(cf, '')
+        return '\n'.join(out)
+
+    # constants
+
+    def utf8(self, index) -> str:
+        return self.pool[index].value
+
+    def class_name(self, index) -> str:
+        return self.utf8(self.pool[index].name_index)
+
+    def name_and_type(self, index) -> str:
+        nat = self.pool[index]
+        name = self.utf8(nat.name_index)
+        if name == '<init>' or name == '<clinit>':
+            name = '"{}"'.format(name)
+        return '{}:{}'.format(name, self.utf8(nat.descriptor_index))
+
+    def resolve(self, index, owner=True) -> str:
+        """The symbolic form of constant `index`; with `owner` False members of this class omit it."""
+        const = self.pool[index]
+        kind = type(const)
+        if kind is Utf8Info:
+            return _escape(const.value)
+        if kind is ClassInfo:
+            name = self.utf8(const.name_index)
+            return '"{}"'.format(name) if name.startswith('[') else name
+        if kind is StringInfo:
+            return _escape(self.utf8(const.string_index))
+        if kind is IntegerInfo:
+            return str(const.bytes - (1 << 32) if const.bytes >> 31 else const.bytes)
+        if kind is FloatInfo:
+            return java_number(_float_digits(const.bytes)) + 'f'
+        if kind is LongInfo:
+            value = (const.high_bytes << 32) | const.low_bytes
+            return '{}l'.format(value - (1 << 64) if value >> 63 else value)
+        if kind is DoubleInfo:
+            value = _DOUBLE.unpack(((const.high_bytes << 32) | const.low_bytes).to_bytes(8, 'big'))[0]
+            return java_number(repr(value)) + 'd'
+        if kind is NameAndType:
+            return self.name_and_type(index)
+        if kind is FieldRef or kind is MethodRef or kind is InterfaceMethodRef:
+            member = self.name_and_type(const.name_and_type_index)
+            owner_name = self.class_name(const.class_index)
+            if not owner and owner_name == self.cf.name:
+                return member
+            return '{}.{}'.format(self.resolve(const.class_index), member)
+        if kind is MethodHandle:
+            return '{} {}'.format(_REFERENCE_KINDS[const.reference_kind], self.resolve(const.reference_index))
+        if kind is MethodTypeInfo:
+            return self.utf8(const.descriptor_index)
+        if kind is InvokeDynamic:
+            return '#{}:{}'.format(const.bootstrap_method_attr_index, self.name_and_type(const.name_and_type_index))
+        return '?'
+
+    def raw(self, const) -> str:
+        # the operand column of the constant pool listing
+        kind = type(const)
+        if kind is Utf8Info:
+            return _escape(const.value)
+        if kind is ClassInfo:
+            return '#{}'.format(const.name_index)
+        if kind is StringInfo:
+            return '#{}'.format(const.string_index)
+        if kind is FieldRef or kind is MethodRef or kind is InterfaceMethodRef:
+            return '#{}.#{}'.format(const.class_index, const.name_and_type_index)
+        if kind is NameAndType:
+            return '#{}:#{}'.format(const.name_index, const.descriptor_index)
+        if kind is MethodHandle:
+            return '{}:#{}'.format(const.reference_kind, const.reference_index)
+        if kind is MethodTypeInfo:
+            return '#{}'.format(const.descriptor_index)
+        if kind is InvokeDynamic:
+            return '#{}:#{}'.format(const.bootstrap_method_attr_index, const.name_and_type_index)
+        return None
+
+    @staticmethod
+    def comment(text, comment, width) -> str:
+        return '{:<{}}// {}'.format(text, width - 1, comment) if len(text) < width - 1 else '{} // {}'.format(
+            text, comment)
+
+    def constant_pool(self):
+        out = self.lines
+        out.append('Constant pool:')
+        pool = self.pool
+        width = len(str(len(pool) - 1)) + 1
+        for i in range(1, len(pool)):
+            const = pool[i]
+            if const is None:
+                continue
+            prefix = '{:>{}} = {:<18} '.format('#{}'.format(i), width + 2, _CONSTANT_KINDS.get(type(const), '?'))
+            raw = self.raw(const)
+            if raw is None:
+                out.append(prefix + self.resolve(i))
+            elif type(const) is Utf8Info:
+                out.append(prefix + raw)
+            else:
+                out.append(self.comment(prefix + raw, self.resolve(i), width + 40))
+
+    # declarations
+
+    def class_declaration(self) -> str:
+        cf = self.cf
+        flags = cf.access_flags
+        words = _modifiers(flags & ~(AccessFlag.ACC_ABSTRACT if flags & AccessFlag.ACC_INTERFACE else 0),
+                           _CLASS_FLAGS)
+        signature = cf.get_attribute(Signature)
+        generic = class_signature(self.pool[signature.signature_index].bytes) if signature is not None else None
+        name = cf.name.replace('/', '.')
+        if generic is not None and generic.type_parameters:
+            name += '<{}>'.format(', '.join(map(str, generic.type_parameters)))
+        if flags & AccessFlag.ACC_INTERFACE:
+            words.append('interface')
+            words.append(name)
+            interfaces = [str(t) for t in generic.interfaces] if generic else [
+                n.replace('/', '.') for n in cf.interface_names]
+            if interfaces:
+                words.append('extends ' + ','.join(interfaces))
+            return ' '.join(words)
+        words.append('class')
+        words.append(name)
+        superclass = str(generic.superclass) if generic else (cf.super_name or '').replace('/', '.')
+        if superclass and superclass != 'java.lang.Object':
+            words.append('extends ' + superclass)
+        interfaces = [str(t) for t in generic.interfaces] if generic else [
+            n.replace('/', '.') for n in cf.interface_names]
+        if interfaces:
+            words.append('implements ' + ','.join(interfaces))
+        return ' '.join(words)
+
+    def member_declaration(self, member: FieldMethodInfo, is_method) -> str:
+        cf = self.cf
+        flags = member.access_flags
+        name = self.utf8(member.name_index)
+        signature = member.get_attribute(Signature)
+        raw = self.pool[signature.signature_index if signature is not None else member.descriptor_index].bytes
+        if not is_method:
+            words = _modifiers(flags, _FIELD_FLAGS)
+            try:
+                t = field_type(raw)
+            except ValueError:
+                t = field_type(self.pool[member.descriptor_index].bytes)
+            return '{} {} {};'.format(' '.join(words), t, name).lstrip()
+        if name == '<clinit>':
+            return 'static {};'
+        try:
+            t = method_type(raw)
+        except ValueError:
+            t = method_type(self.pool[member.descriptor_index].bytes)
+        words = _modifiers(flags, _METHOD_FLAGS)
+        if t.type_parameters:
+            words.append('<{}>'.format(', '.join(map(str, t.type_parameters))))
+        parameters = [str(p) for p in t.parameters]
+        if flags & 0x0080 and parameters and parameters[-1].endswith('[]'):
+            parameters[-1] = parameters[-1][:-2] + '...'
+        if name == '<init>':
+            words.append('{}({})'.format(cf.name.replace('/', '.'), ', '.join(parameters)))
+        else:
+            words.append('{} {}({})'.format(t.return_type, name, ', '.join(parameters)))
+        exceptions = member.get_attribute(Exceptions)
+        if t.exceptions:
+            words.append('throws ' + ', '.join(map(str, t.exceptions)))
+        elif exceptions is not None and exceptions.exception_index_table:
+            words.append('throws ' + ', '.join(self.class_name(i).replace('/', '.')
+                                                for i in exceptions.exception_index_table))
+        return ' '.join(words) + ';'
+
+    def member(self, member: FieldMethodInfo, is_method):
+        out = self.lines
+        out.append('  ' + self.member_declaration(member, is_method))
+        if self.verbose:
+            out.append('    descriptor: {}'.format(self.utf8(member.descriptor_index)))
+            out.append('    flags: {}'.format(_flag_names(member.access_flags,
+                                                          _METHOD_FLAGS if is_method else _FIELD_FLAGS)))
+        if self.code:
+            code = member.get_attribute(Code)
+            if code is not None:
+                self.code_attribute(member, code)
+        if self.verbose:
+            self.attributes(member, '    ')
+
+    # code
+
+    def code_attribute(self, method: FieldMethodInfo, code: Code):
+        out = self.lines
+        out.append('    Code:')
+        if self.verbose:
+            arguments = method_type(self.pool[method.descriptor_index].bytes).argument_size
+            out.append('      stack={}, locals={}, args_size={}'.format(
+                code.max_stack, code.max_locals, arguments + (0 if method.access_flags & AccessFlag.ACC_STATIC else 1)))
+        self.instructions(code, 10 if self.verbose else 8)
+        if code.exception_table:
+            out.append('      Exception table:')
+            out.append('         from    to  target type')
+            for entry in code.exception_table:
+                out.append('         {:>5} {:>5} {:>5}   {}'.format(
+                    entry.start_pc, entry.end_pc, entry.handler_pc,
+                    'Class ' + self.class_name(entry.catch_type) if entry.catch_type else 'any'))
+        if self.verbose:
+            self.attributes(code, '      ')
+
+    def instructions(self, code: Code, width):
+        out = self.lines
+        table = code.table
+        addrs = table.addrs
+        opcodes = table.opcodes
+        operands = table.operands
+        extras = table.extras
+        for row in range(len(table)):
+            opcode = opcodes[row]
+            name = INSTRUCTIONS[opcode].NAME
+            operand = operands[row]
+            head = '{:>{}}: '.format(addrs[row], width)
+            if opcode in _POOL_OPERANDS:
+                if opcode == Ins.invokeinterface.OPCODE:
+                    text = '#{},  {}'.format(operand, extras[row][1])
+                elif opcode == Ins.invokedynamic.OPCODE:
+                    text = '#{},  0'.format(operand)
+                elif opcode == Ins.multianewarray.OPCODE:
+                    text = '#{},  {}'.format(operand, extras[row][1])
+                else:
+                    text = '#{}'.format(operand)
+                kind = _COMMENT_KINDS.get(type(self.pool[operand]), '')
+                out.append('{}{:<13} {:<18} // {} {}'.format(head, name, text, kind, self.resolve(operand, False)))
+            elif opcode in _BRANCHES:
+                out.append('{}{:<13} {}'.format(head, name, operand))
+            elif opcode == Ins.tableswitch.OPCODE:
+                default, low, high, targets = extras[row]
+                out.append('{}{:<13} {{ // {} to {}'.format(head, name, low, high))
+                for i, target in enumerate(targets):
+                    out.append('{:>{}}: {}'.format(low + i, width + 14, target))
+                out.append('{:>{}}: {}'.format('default', width + 14, default))
+                out.append(' ' * (width + 1) + '}')
+            elif opcode == Ins.lookupswitch.OPCODE:
+                default, pairs = extras[row]
+                out.append('{}{:<13} {{ // {}'.format(head, name, len(pairs)))
+                for match, target in pairs:
+                    out.append('{:>{}}: {}'.format(match, width + 14, target))
+                out.append('{:>{}}: {}'.format('default', width + 14, default))
+                out.append(' ' * (width + 1) + '}')
+            elif opcode == Ins.iinc.OPCODE:
+                out.append('{}{:<13} {}, {}'.format(head, name, *extras[row]))
+            elif opcode == Ins.wide.OPCODE:
+                extra = extras[row]
+                inner = INSTRUCTIONS[extra[0]].NAME
+                out.append('{}{:<13} {}'.format(head, inner + '_w', ', '.join(map(str, extra[1:]))))
+            elif opcode == Ins.newarray.OPCODE:
+                out.append('{}{:<13} {}'.format(head, name, _NEWARRAY_TYPES.get(operand, operand)))
+            elif INSTRUCTIONS[opcode].FIELDS:
+                out.append('{}{:<13} {}'.format(head, name, operand))
+            else:
+                out.append(head + name)
+
+    # attributes
+
+    def attributes(self, owner, indent):
+        out = self.lines
+        for attr in owner.attributes:
+            kind = type(attr)
+            if kind is Code or kind is SourceFile and owner is not self.cf:
+                continue
+            if kind is SourceFile:
+                out.append('{}SourceFile: "{}"'.format(indent, self.utf8(attr.sourcefile_index)))
+            elif kind is ConstantValue:
+                const = self.pool[attr.constant_index]
+                value = self.resolve(attr.constant_index)
+                if type(const) is StringInfo:
+                    value = 'String ' + value
+                else:
+                    value = '{} {}'.format(_COMMENT_KINDS.get(type(const), ''), value)
+                out.append('{}ConstantValue: {}'.format(indent, value))
+            elif kind is Signature:
+                out.append(self.comment('{}Signature: #{}'.format(indent, attr.signature_index),
+                                        self.utf8(attr.signature_index), 42))
+            elif kind is Exceptions:
+                out.append('{}Exceptions:'.format(indent))
+                out.append('{}  throws {}'.format(indent, ', '.join(
+                    self.class_name(i).replace('/', '.') for i in attr.exception_index_table)))
+            elif kind is Deprecated or kind is Synthetic:
+                out.append('{}{}: true'.format(indent, kind.__name__))
+            elif kind is LineNumberTable:
+                out.append('{}LineNumberTable:'.format(indent))
+                for entry in attr.line_number_table:
+                    out.append('{}  line {}: {}'.format(indent, entry.line_number, entry.start_pc))
+            elif kind is LocalVariableTable or kind is LocalVariableTypeTable:
+                out.append('{}{}:'.format(indent, kind.__name__))
+                out.append('{}  Start  Length  Slot  Name   Signature'.format(indent))
+                entries = attr.local_variable_table if kind is LocalVariableTable else attr.local_variable_type_table
+                for entry in entries:
+                    descriptor = entry.descriptor_index if kind is LocalVariableTable else entry.signature_index
+                    out.append('{}  {:>5}  {:>6}  {:>4}  {:>4}   {}'.format(
+                        indent, entry.start_pc, entry.length, entry.index, self.utf8(entry.name_index),
+                        self.utf8(descriptor)))
+            elif kind is StackMapTable:
+                self.stack_map_table(attr, indent)
+            elif kind in (RuntimeVisibleAnnotations, RuntimeInvisibleAnnotations):
+                out.append('{}{}:'.format(indent, kind.__name__))
+                for i, annotation in enumerate(attr.annotations):
+                    out.append('{}  {}: {}'.format(indent, i, self.annotation(annotation)))
+            elif kind in (RuntimeVisibleParameterAnnotations, RuntimeInvisibleParameterAnnotations):
+                out.append('{}{}:'.format(indent, kind.__name__))
+                for p, parameter in enumerate(attr.parameter_annotations):
+                    out.append('{}  parameter {}:'.format(indent, p))
+                    for i, annotation in enumerate(parameter.annotations):
+                        out.append('{}    {}: {}'.format(indent, i, self.annotation(annotation)))
+            elif kind is AnnotationDefault:
+                out.append('{}AnnotationDefault:'.format(indent))
+                out.append('{}  default_value: {}'.format(
+                    indent, _element_str(element_value(self.pool, attr.default_value))))
+            elif kind is InnerClasses:
+                out.append('{}InnerClasses:'.format(indent))
+                for entry in attr.classes:
+                    self.inner_class(entry, indent + '  ')
+            elif kind is EnclosingMethod:
+                method = self.name_and_type(attr.method_index).split(':')[0] if attr.method_index else ''
+                out.append(self.comment('{}EnclosingMethod: #{}.#{}'.format(indent, attr.class_index,
+                                                                           attr.method_index),
+                                        self.class_name(attr.class_index) + ('.' + method if method else ''), 42))
+            elif kind is BootstrapMethods:
+                out.append('{}BootstrapMethods:'.format(indent))
+                for i, entry in enumerate(attr.bootstrap_methods):
+                    out.append('{}  {}: #{} {}'.format(indent, i, entry.bootstrap_method_ref,
+                                                       self.resolve(entry.bootstrap_method_ref)))
+                    out.append('{}    Method arguments:'.format(indent))
+                    for argument in entry.bootstrap_arguments:
+                        out.append('{}      #{} {}'.format(indent, argument, self.resolve(argument)))
+            else:
+                name = self.utf8(attr.name_index)
+                length = len(attr.info) if kind is UnknownAttribute else '?'
+                out.append('{}{}: length = {}'.format(indent, name, length))
+
+    def inner_class(self, entry, indent):
+        words = _modifiers(entry.inner_class_access_flags, _INNER_CLASS_FLAGS)
+        if entry.inner_class_access_flags & AccessFlag.ACC_INTERFACE:
+            words = [w for w in words if w != 'abstract'] + ['interface']
+        text = ' '.join(words)
+        ref = '#{}'.format(entry.inner_class_info_index)
+        comment = 'class ' + self.class_name(entry.inner_class_info_index)
+        if entry.inner_name_index:
+            ref = '#{}= {}'.format(entry.inner_name_index, ref)
+            comment = '{}={}'.format(self.utf8(entry.inner_name_index), comment)
+        if entry.outer_class_info_index:
+            ref += ' of #{}'.format(entry.outer_class_info_index)
+            comment += ' of class ' + self.class_name(entry.outer_class_info_index)
+        self.lines.append(self.comment('{}{}{};'.format(indent, text + ' ' if text else '', ref), comment, 42))
+
+    def annotation(self, annotation) -> str:
+        pairs = ('{}={}'.format(self.utf8(pair.element_name_index), _element_str(element_value(self.pool, pair.value)))
+                 for pair in annotation.element_value_pairs)
+        return '{}({})'.format(self.utf8(annotation.type_index), ', '.join(pairs))
+
+    def vtype(self, info: VerificationTypeInfo) -> str:
+        if info.tag == Tag.OBJECT:
+            name = self.class_name(info.const_pool_index)
+            return 'class "{}"'.format(name) if name.startswith('[') else 'class ' + name
+        if info.tag == Tag.UNINITIALIZED:
+            return type_name(uninitialized(info.offset))
+        return type_name(SIMPLE_TYPES[info.tag])
+
+    def stack_map_table(self, table: StackMapTable, indent):
+        out = self.lines
+        out.append('{}StackMapTable: number_of_entries = {}'.format(indent, len(table.entries)))
+        for frame in table.entries:
+            out.append('{}  frame_type = {} /* {} */'.format(indent, frame.tag, _FRAME_NAMES[frame.frame_type]))
+            if frame.frame_type not in (StackMapFrameType.SAME, StackMapFrameType.SAME_LOCALS_1_STACK_ITEM):
+                out.append('{}    offset_delta = {}'.format(indent, frame.offset_delta))
+            if frame.locals:
+                out.append('{}    locals = [ {} ]'.format(indent, ', '.join(map(self.vtype, frame.locals))))
+            if frame.stack:
+                out.append('{}    stack = [ {} ]'.format(indent, ', '.join(map(self.vtype, frame.stack))))
+
+
+def _element_str(value) -> str:
+    if isinstance(value, str):
+        return '"{}"'.format(_escape(value))
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    if isinstance(value, float):
+        return java_number(repr(value))
+    if isinstance(value, list):
+        return '[{}]'.format(','.join(map(_element_str, value)))
+    if isinstance(value, tuple):
+        if value[0] == 'enum':
+            return '{}.{}'.format(value[1], value[2])
+        if value[0] == 'class':
+            return 'class {}'.format(value[1])
+        return '@{}({})'.format(value[1], ', '.join('{}={}'.format(k, _element_str(v)) for k, v in value[2].items()))
+    return str(value)
+
+
+def disassemble(data, title=None, code=False, verbose=False, private=False) -> str:
+    """javap-like text of one class file's bytes; picklable through functools.partial."""
+    return Disassembler(ClassFile(BufferStream(data)), code, verbose, private).render(title)
+
+
+def _title(source, name) -> str:
+    if source.endswith(ARCHIVE_SUFFIXES):
+        return 'jar:file:{}!/{}'.format(os.path.abspath(source), name)
+    return os.path.abspath(os.path.join(source, name))
+
+
+class ClassFinder(Object):
+    """Looks class names up on a classpath; each jar or jmod is indexed once, on first use."""
+
+    def __init__(self, classpath):
+        self.paths = split_classpath(classpath)
+        self.archives: Dict[str, Dict[str, str]] = {}  # path -> class name -> entry name
+
+    def find(self, name) -> Optional[Tuple[str, str]]:
+        """(source, entry) of the class named like 'java.lang.String' or 'java/lang/String', None if not found."""
+        internal = name.replace('.', '/')
+        for path in self.paths:
+            if os.path.isdir(path):
+                entry = internal + '.class'
+                if os.path.isfile(os.path.join(path, *entry.split('/'))):
+                    return path, entry
+            elif path.endswith(ARCHIVE_SUFFIXES) and os.path.isfile(path):
+                entries = self.archives.get(path)
+                if entries is None:
+                    with Archive(path) as archive:
+                        entries = self.archives[path] = {n: e.name for n, e in archive.classes.items()}
+                if internal in entries:
+                    return path, entries[internal]
+        return None
+
+
+def work_units(arguments, classpath=None, chunk_size=16) -> Iterator:
+    """Work units for map_units() in argument order: with a classpath, an argument that is
+    not a path is looked up as a class name; everything else is listed like a classpath.
+    """
+    finder = ClassFinder(classpath) if classpath else None
+    for argument in arguments:
+        if finder is not None and not os.path.exists(argument):
+            found = finder.find(argument)
+            if found is None:
+                yield ParseResult(argument, None, error='class not found')
+            else:
+                yield found[0], [found[1]]
+        else:
+            yield from iter_work(argument, chunk_size)
+
+
+def _print(text):
+    sys.stdout.write(text)
+    sys.stdout.write('\n')
+
 
 if __name__ == "__main__":
-    with open('/Users/fxxing/Desktop/rt/java/lang/Byte.class', 'rb') as f:
-        stream = Stream(f)
-        cf = ClassFile(stream)
-        # print(cf)
-        for method in cf.methods:
-            name: Utf8Info = cf.constants[method.name_index]
-            print(name.bytes)
-            code = method.get_attribute(Code)
-            for ins in code.instructions:
-                print('\t', ins)
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Disassemble class files, jars, jmods and directories like javap.')
+    parser.add_argument('classes', nargs='+', help='.class files, jars, jmods, directories, or class names with -cp')
+    parser.add_argument('-c', dest='code', action='store_true', help='disassemble the code')
+    parser.add_argument('-v', '--verbose', action='store_true', help='print everything, the constant pool included')
+    parser.add_argument('-p', '--private', action='store_true', help='show private members too')
+    parser.add_argument('-cp', '--classpath', help='where to look up class names')
+    parser.add_argument('-j', '--workers', type=int, default=None, help='worker processes; 1 disassembles in process')
+    parser.add_argument('--chunk-size', type=int, default=16, help='classes per unit of work')
+    parser.add_argument('--max-pending', type=int, default=None,
+                        help='units of work buffered ahead of the output (default 2 per worker)')
+    args = parser.parse_args()
+
+    failed = 0
+    try:
+        # rendering runs in the workers; results come back in argument order, at most
+        # max_pending units ahead of what has been written
+        render = partial(disassemble, code=args.code, verbose=args.verbose, private=args.private)
+        units = work_units(args.classes, args.classpath, args.chunk_size)
+        for result in map_units(units, render, args.workers, True, args.max_pending):
+            if not result.ok:
+                failed += 1
+                print('Error: {}{}: {}'.format(result.source, '!' + result.name if result.name else '',
+                                              result.error), file=sys.stderr)
+                continue
+            if args.verbose:
+                _print('Classfile {}'.format(_title(result.source, result.name)))
+            _print(result.value)
+        sys.stdout.flush()
+    except BrokenPipeError:
+        # the reader went away, e.g. `| head`; nothing left to report
+        sys.stderr.close()
+        os._exit(0)
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,230 @@
+import sys
+from typing import Iterable, List, Tuple
+
+from attribute import Code
+from base import Object
+from classfile import ClassFile
+from classpath import parse_classpath
+from instruction import INSTRUCTIONS, SIGNED_OPERANDS, Ins
+
+try:
+    import numpy as np
+except ImportError:  # only this module needs it
+    np = None
+
+_VARIABLE = frozenset(cls.OPCODE for cls in (Ins.tableswitch, Ins.lookupswitch, Ins.wide))
+
+
+def _length(opcode) -> int:
+    cls = INSTRUCTIONS.get(opcode)
+    if cls is None or opcode in _VARIABLE:
+        return 0
+    if not cls.OPERANDS:
+        return 1
+    return 1 + sum(int(f.split(':')[0]) for f in cls.OPERANDS.split(', '))
+
+
+# bytes taken by an instruction, opcode included; 0 for wide, the switches and unassigned opcodes
+LENGTHS = bytes(_length(opcode) for opcode in range(256))
+
+
+def _require_numpy():
+    if np is None:
+        raise ImportError('opstats needs numpy: pip install numpy')
+
+
+def _s4(padded, at):
+    # big-endian signed ints starting at each offset in `at`
+    b = padded[at[:, None] + np.arange(4)].astype(np.uint32)
+    return ((b[:, 0] << 24) | (b[:, 1] << 16) | (b[:, 2] << 8) | b[:, 3]).view(np.int32).astype(np.int64)
+
+
+def scan(code, starts) -> Tuple['np.ndarray', 'np.ndarray']:
+    """(position, length) of every instruction in `code`, a uint8 array holding
+    method bodies back to back, method m being `code[starts[m]:starts[m + 1]]`.
+
+    Every byte is first treated as a possible opcode and given the offset of the
+    instruction that would follow it. Starting from the first byte of each method,
+    those links are then followed by pointer doubling, so the real boundaries of
+    all methods are found in O(log(instructions per method)) array passes.
+    Lengths are as encoded and are not checked against the method ends.
+    """
+    _require_numpy()
+    n = len(code)
+    # reads past the end of the buffer see zeros
+    padded = np.concatenate((code, np.zeros(16, np.uint8)))
+    lengths = np.frombuffer(LENGTHS, np.uint8)[code].astype(np.int64)
+
+    variable = np.flatnonzero(lengths == 0)
+    ops = code[variable]
+    wide = variable[ops == Ins.wide.OPCODE]
+    lengths[wide] = np.where(padded[wide + 1] == Ins.iinc.OPCODE, 6, 4)
+    switches = variable[(ops == Ins.tableswitch.OPCODE) | (ops == Ins.lookupswitch.OPCODE)]
+    if switches.size:
+        # 0-3 pad bytes align the operands to a multiple of 4 from the start of the method
+        base = starts[np.searchsorted(starts, switches, 'right') - 1]
+        pad = -(switches + 1 - base) % 4
+        operands = np.minimum(switches + 1 + pad, n)
+        table = code[switches] == Ins.tableswitch.OPCODE
+        # after the default: low and high of a tableswitch, npairs of a lookupswitch
+        second, third = _s4(padded, operands + 4), _s4(padded, operands + 8)
+        lengths[switches] = np.where(table, 1 + pad + 12 + 4 * (third - second + 1), 1 + pad + 8 + 8 * second)
+
+    # a byte that is not an opcode, or not a real one, still links one byte on, and
+    # no link leaves its method, whose end is where the next method starts
+    sizes = np.diff(starts)
+    follow = np.empty(n + 1, np.int64)
+    np.minimum(np.arange(n) + np.maximum(lengths, 1), np.repeat(starts[1:], sizes), out=follow[:n])
+    follow[n] = n
+
+    # after round k, `found` holds the first 2 ** k instructions of every method
+    found = np.zeros(n + 1, np.bool_)
+    found[starts] = True
+    jump = follow
+    while True:
+        targets = jump[np.flatnonzero(found)]
+        fresh = targets[~found[targets]]
+        if not fresh.size:
+            break
+        found[fresh] = True
+        jump = jump[jump]
+    positions = np.flatnonzero(found[:n])
+    return positions, lengths[positions]
+
+
+def code_bodies(cf: ClassFile) -> List[Tuple[Tuple[str, str], bytes]]:
+    """((class name, method name + descriptor), code) for every method with a body."""
+    bodies = []
+    for m in cf.methods:
+        code = m.get_attribute(Code)
+        if code is not None:
+            bodies.append(((cf.name, cf.get_utf8(m.name_index) + cf.get_utf8(m.descriptor_index)), bytes(code.code)))
+    return bodies
+
+
+class CodeBatch(Object):
+    """The bytecode of many methods in one buffer, with every instruction located by `scan()`.
+
+    `keys[m]` names method m, whose code is `code[starts[m]:starts[m + 1]]`. Instruction
+    i of the batch starts at byte `positions[i]` of the buffer, has opcode `opcodes[i]`
+    and belongs to method `methods[i]`. Queries are NumPy array operations over these
+    columns; no Instruction is ever decoded.
+    """
+    __slots__ = ('keys', 'code', 'starts', 'positions', 'opcodes', 'methods')
+
+    def __init__(self, bodies: Iterable[Tuple[object, bytes]]):
+        _require_numpy()
+        self.keys = []
+        codes = []
+        for key, code in bodies:
+            self.keys.append(key)
+            codes.append(code)
+        self.code = np.frombuffer(b''.join(codes), np.uint8)
+        self.starts = np.zeros(len(codes) + 1, np.int64)
+        np.cumsum(np.fromiter(map(len, codes), np.int64, len(codes)), out=self.starts[1:])
+        self.positions, lengths = scan(self.code, self.starts)
+        self.opcodes = self.code[self.positions]
+        self.methods = np.searchsorted(self.starts, self.positions, 'right') - 1
+        ends = self.positions + lengths
+        bad = (lengths <= 0) | (ends > self.starts[self.methods + 1])
+        if bad.any():
+            i = np.flatnonzero(bad)[0]
+            raise ValueError('{}: bad instruction 0x{:02x} at pc {}'.format(
+                self.keys[self.methods[i]], self.opcodes[i], self.positions[i] - self.starts[self.methods[i]]))
+
+    @staticmethod
+    def from_class_files(class_files: Iterable[ClassFile]) -> 'CodeBatch':
+        return CodeBatch(body for cf in class_files for body in code_bodies(cf))
+
+    @staticmethod
+    def from_classpath(paths, workers=None) -> 'CodeBatch':
+        results = parse_classpath(paths, code_bodies, workers, lazy=True)
+        return CodeBatch(body for r in results if r.ok for body in r.value)
+
+    def __len__(self):
+        return len(self.positions)
+
+    def __repr__(self):
+        return 'CodeBatch({} methods, {} instructions)'.format(len(self.keys), len(self.positions))
+
+    def histogram(self) -> 'np.ndarray':
+        """Instruction count per opcode, indexed by opcode."""
+        return np.bincount(self.opcodes, minlength=256)
+
+    def counts(self) -> List[Tuple[str, int]]:
+        """(name, count) of every opcode used, most frequent first."""
+        histogram = self.histogram()
+        return [(INSTRUCTIONS[opcode].NAME, int(histogram[opcode])) for opcode in np.argsort(-histogram, kind='stable')
+                if histogram[opcode]]
+
+    def per_method(self, opcode) -> 'np.ndarray':
+        """How often each method uses `opcode`, indexed like `keys`."""
+        return np.bincount(self.methods[self.opcodes == opcode], minlength=len(self.keys))
+
+    def methods_using(self, opcode) -> List:
+        return [self.keys[m] for m in np.unique(self.methods[self.opcodes == opcode])]
+
+    def addrs(self) -> 'np.ndarray':
+        """The pc of every instruction within its method."""
+        return self.positions - self.starts[self.methods]
+
+    def find(self, opcode) -> List[Tuple[object, int]]:
+        """(method key, pc) of every use of `opcode`."""
+        rows = np.flatnonzero(self.opcodes == opcode)
+        methods = self.methods[rows]
+        pcs = self.positions[rows] - self.starts[methods]
+        return [(self.keys[m], int(pc)) for m, pc in zip(methods, pcs)]
+
+    def operand(self, opcode, field) -> Tuple['np.ndarray', 'np.ndarray']:
+        """(methods, values) of operand `field` of every instruction with `opcode`, e.g.
+        the constant pool index of every `new`. Branch targets are made absolute, as
+        when decoding; wide and the switches have no fixed layout and are not supported.
+        """
+        cls = INSTRUCTIONS[opcode]
+        if opcode in _VARIABLE or field not in cls.FIELDS:
+            raise ValueError('{} has no fixed operand {!r}'.format(cls.NAME, field))
+        offset = 1
+        for f in cls.OPERANDS.split(', '):
+            size, name = f.split(':')
+            if name == field:
+                break
+            offset += int(size)
+        size = int(size)
+        rows = np.flatnonzero(self.opcodes == opcode)
+        at = self.positions[rows] + offset
+        values = np.zeros(len(rows), np.int64)
+        for i in range(size):
+            values = (values << 8) | self.code[at + i]
+        if field == 'branch' or (cls.NAME, field) in SIGNED_OPERANDS:
+            sign = 1 << (8 * size - 1)
+            values = (values ^ sign) - sign
+        methods = self.methods[rows]
+        if field == 'branch':
+            values += self.positions[rows] - self.starts[methods]
+        return methods, values
+
+
+if __name__ == "__main__":
+    import argparse
+    import time
+
+    parser = argparse.ArgumentParser(description='Opcode statistics over every method body on a classpath.')
+    parser.add_argument('paths', nargs='+')
+    parser.add_argument('-j', '--workers', type=int, default=None)
+    parser.add_argument('--top', type=int, default=20, help='opcodes to list, 0 for all')
+    parser.add_argument('--find', action='append', default=[], help='list the methods using this opcode (repeatable)')
+    args = parser.parse_args()
+
+    names = {cls.NAME: opcode for opcode, cls in INSTRUCTIONS.items()}
+    start = time.perf_counter()
+    batch = CodeBatch.from_classpath(args.paths, args.workers)
+    loaded = time.perf_counter()
+    total = len(batch)
+    for name, count in batch.counts()[:args.top or None]:
+        print('{:16} {:12} {:7.2%}'.format(name, count, count / total))
+    for name in args.find:
+        print()
+        for (cls, method), count in zip(batch.methods_using(names[name]),
+                                        filter(None, batch.per_method(names[name]))):
+            print('{}.{}\t{}'.format(cls, method, count))
+    print('{} in {:.1f} s, {} code bytes'.format(batch, loaded - start, len(batch.code)), file=sys.stderr)
@@ -0,0 +1,91 @@
+import os
+import sys
+from array import array
+from typing import List
+
+from stream import BufferStream
+
+# Helpers for the versioned binary index files. Every file starts with an 8-byte magic
+# and a u2 version; integers in headers are big-endian and arrays are stored
+# little-endian so they load with a single frombytes() on common hardware.
+
+
+def write_header(out, magic: bytes, version: int):
+    out.write(magic)
+    out.write(version.to_bytes(2, 'big'))
+
+
+def read_header(stream: BufferStream, magic: bytes, version: int):
+    if stream.read_bytes(len(magic)) != magic:
+        raise ValueError('not a {!r} file'.format(magic.rstrip(b'\0').decode()))
+    found = stream.read_u2()
+    if found != version:
+        raise ValueError('unsupported {!r} version {}'.format(magic.rstrip(b'\0').decode(), found))
+
+
+def write_array(out, values: array):
+    out.write(values.typecode.encode())
+    out.write(len(values).to_bytes(4, 'big'))
+    if sys.byteorder == 'big':
+        values = array(values.typecode, values)
+        values.byteswap()
+    out.write(values.tobytes())
+
+
+def read_array(stream: BufferStream, typecode: str) -> array:
+    found = chr(stream.read_u1())
+    if found != typecode:
+        raise ValueError('expected an {!r} array, found {!r}'.format(typecode, found))
+    values = array(typecode)
+    values.frombytes(stream.read_view(stream.read_u4() * values.itemsize))
+    if sys.byteorder == 'big':
+        values.byteswap()
+    return values
+
+
+def write_strings(out, strings: List[str]):
+    # NUL-joined so loading is a single split; strings containing NUL fall back to an offsets table
+    if not any('\0' in s for s in strings):
+        blob = '\0'.join(strings).encode('utf-8', 'surrogatepass')
+        out.write(b'\0')
+        out.write(len(strings).to_bytes(4, 'big'))
+        out.write(len(blob).to_bytes(4, 'big'))
+        out.write(blob)
+        return
+    encoded = [s.encode('utf-8', 'surrogatepass') for s in strings]
+    ends = array('I')
+    end = 0
+    for b in encoded:
+        end += len(b)
+        ends.append(end)
+    out.write(b'\1')
+    write_array(out, ends)
+    out.write(b''.join(encoded))
+
+
+def read_strings(stream: BufferStream) -> List[str]:
+    if stream.read_u1() == 0:
+        count = stream.read_u4()
+        blob = stream.read_bytes(stream.read_u4()).decode('utf-8', 'surrogatepass')
+        return blob.split('\0') if count else []
+    ends = read_array(stream, 'I')
+    blob = stream.read_bytes(ends[-1] if ends else 0)
+    strings = []
+    start = 0
+    for end in ends:
+        strings.append(blob[start:end].decode('utf-8', 'surrogatepass'))
+        start = end
+    return strings
+
+
+def save(path, write):
+    # write(out) fills the file; readers never see a partially written index
+    tmp = path + '.tmp'
+    with open(tmp, 'wb') as out:
+        write(out)
+    os.replace(tmp, path)
+
+
+def load(path) -> BufferStream:
+    with open(path, 'rb') as f:
+        return BufferStream(f.read())
@@ -1,9 +1,26 @@
 #!/usr/bin/env python
 # coding: utf-8
-from typing import BinaryIO
+from functools import lru_cache
+from struct import Struct
+from typing import BinaryIO, Tuple
 
 u1 = u2 = u4 = int
 
+_S1 = Struct('>b')
+_S2 = Struct('>h')
+_S4 = Struct('>i')
+_U1 = Struct('>B')
+_U2 = Struct('>H')
+_U4 = Struct('>I')
+
+_FIELD_FORMATS = {'u1': 'B', 'u2': 'H', 'u4': 'I', 's1': 'b', 's2': 'h', 's4': 'i'}
+
+
+@lru_cache(maxsize=None)
+def compile_fields(fields: str) -> Struct:
+    # 'u2 u2 u4' -> Struct('>HHI')
+    return Struct('>' + ''.join(_FIELD_FORMATS[f] for f in fields.split()))
+
 
 class Stream(object):
     def __init__(self, file: BinaryIO):
@@ -12,16 +29,153 @@ class Stream(object):
     def tell(self):
         return self.file.tell()
 
-    def read_s4(self) ->int:
-        return int.from_bytes(self.file.read(4), byteorder="big", signed=True)
+    def read_s1(self) -> int:
+        return _S1.unpack(self.file.read(1))[0]
+
+    def read_s2(self) -> int:
+        return _S2.unpack(self.file.read(2))[0]
+
+    def read_s4(self) -> int:
+        return _S4.unpack(self.file.read(4))[0]
+
     def read_u1(self) -> u1:
-        return int.from_bytes(self.file.read(1), byteorder='big', signed=False)
+        return _U1.unpack(self.file.read(1))[0]
 
     def read_u2(self) -> u2:
-        return int.from_bytes(self.file.read(2), byteorder='big', signed=False)
+        return _U2.unpack(self.file.read(2))[0]
 
     def read_u4(self) -> u4:
-        return int.from_bytes(self.file.read(4), byteorder='big', signed=False)
+        return _U4.unpack(self.file.read(4))[0]
 
     def read_bytes(self, n) -> bytes:
         return self.file.read(n)
+
+    def read_view(self, n) -> memoryview:
+        return memoryview(self.read_bytes(n))
+
+    def unpack(self, struct: Struct) -> Tuple:
+        return struct.unpack(self.file.read(struct.size))
+
+    def read_fields(self, fields: str) -> Tuple:
+        return self.unpack(compile_fields(fields))
+
+    def skip(self, n):
+        self.file.seek(n, 1)
+
+    def sub_stream(self, n) -> 'BufferStream':
+        return BufferStream(self.read_bytes(n))
+
+    def to_buffer(self) -> 'BufferStream':
+        return BufferStream(self.file.read())
+
+
+class BufferStream(Stream):
+    """Stream over an in-memory buffer (bytes, memoryview or mmap).
+
+    Reads decode straight out of the buffer with precompiled structs and
+    sub-streams are windows over the same memory, so nothing is copied until
+    `read_bytes` is asked for an actual `bytes` object. `tell()` is relative to
+    the start of the window, which is what bytecode alignment expects.
+    """
+
+    def __init__(self, buffer, offset=0, length=None):
+        # noinspection PyMissingConstructor
+        self.buffer = buffer if isinstance(buffer, memoryview) else memoryview(buffer)
+        self.start = offset
+        self.pos = offset
+        self.end = len(self.buffer) if length is None else offset + length
+
+    def tell(self):
+        return self.pos - self.start
+
+    def remaining(self):
+        return self.end - self.pos
+
+    def _advance(self, n):
+        pos = self.pos
+        if pos + n > self.end:
+            raise EOFError('read past end of stream')
+        self.pos = pos + n
+        return pos
+
+    def read_s1(self) -> int:
+        return _S1.unpack_from(self.buffer, self._advance(1))[0]
+
+    def read_s2(self) -> int:
+        return _S2.unpack_from(self.buffer, self._advance(2))[0]
+
+    def read_s4(self) -> int:
+        return _S4.unpack_from(self.buffer, self._advance(4))[0]
+
+    def read_u1(self) -> u1:
+        return _U1.unpack_from(self.buffer, self._advance(1))[0]
+
+    def read_u2(self) -> u2:
+        return _U2.unpack_from(self.buffer, self._advance(2))[0]
+
+    def read_u4(self) -> u4:
+        return _U4.unpack_from(self.buffer, self._advance(4))[0]
+
+    def read_bytes(self, n) -> bytes:
+        pos = self._advance(n)
+        return self.buffer[pos:pos + n].tobytes()
+
+    def read_view(self, n) -> memoryview:
+        pos = self._advance(n)
+        return self.buffer[pos:pos + n]
+
+    def unpack(self, struct: Struct) -> Tuple:
+        return struct.unpack_from(self.buffer, self._advance(struct.size))
+
+    def skip(self, n):
+        self._advance(n)
+
+    def sub_stream(self, n) -> 'BufferStream':
+        return BufferStream(self.buffer, self._advance(n), n)
+
+    def to_buffer(self) -> 'BufferStream':
+        return self
+
+
+class OutputStream(object):
+    """Growable big-endian output buffer, the writing counterpart of BufferStream."""
+
+    def __init__(self):
+        self.buffer = bytearray()
+
+    def tell(self):
+        return len(self.buffer)
+
+    def write_s1(self, value):
+        self.buffer += _S1.pack(value)
+
+    def write_s2(self, value):
+        self.buffer += _S2.pack(value)
+
+    def write_s4(self, value):
+        self.buffer += _S4.pack(value)
+
+    def write_u1(self, value: u1):
+        self.buffer.append(value)
+
+    def write_u2(self, value: u2):
+        self.buffer += _U2.pack(value)
+
+    def write_u4(self, value: u4):
+        self.buffer += _U4.pack(value)
+
+    def write_bytes(self, data):
+        # bytes, bytearray or memoryview; slices of the input buffer are copied without decoding
+        self.buffer += data
+
+    def pack(self, struct: Struct, *values):
+        self.buffer += struct.pack(*values)
+
+    def write_fields(self, fields: str, *values):
+        self.pack(compile_fields(fields), *values)
+
+    def patch_u4(self, pos, value: u4):
+        _U4.pack_into(self.buffer, pos, value)
+
+    def getvalue(self) -> bytes:
+        return bytes(self.buffer)
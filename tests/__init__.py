@@ -0,0 +1,48 @@
+import os
+import struct
+import sys
+import zipfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+for path in (ROOT, os.path.join(ROOT, 'benchmarks')):
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+from classgen import ClassGenerator  # noqa: E402
+
+
+def make_class(name, methods=3):
+    """A small well-formed class: one int field and static methods returning constants."""
+    pool = []
+
+    def utf8(s):
+        b = s.encode('utf-8')
+        pool.append(struct.pack('>BH', 1, len(b)) + b)
+        return len(pool)
+
+    def class_(s):
+        pool.append(struct.pack('>BH', 7, utf8(s)))
+        return len(pool)
+
+    this, sup = class_(name), class_('java/lang/Object')
+    code, desc = utf8('Code'), utf8('()I')
+    body = struct.pack('>HHHHHHHHHH', 0x0021, this, sup, 0, 1, 0x0001, utf8('value'), utf8('I'), 0, methods)
+    for i in range(methods):
+        bytecode = bytes([0x10, i, 0xac])  # bipush i; ireturn
+        body += struct.pack('>HHHHHIHHI', 0x0009, utf8('m{}'.format(i)), desc, 1, code, 12 + len(bytecode), 1, 0,
+                            len(bytecode))
+        body += bytecode + struct.pack('>HH', 0, 0)
+    return struct.pack('>IHHH', 0xCAFEBABE, 0, 52, len(pool) + 1) + b''.join(pool) + body + struct.pack('>H', 0)
+
+
+def corpus(count=24, **kwargs):
+    """Class files from benchmarks/classgen.py, switches and all."""
+    generator = ClassGenerator(switch_density=0.2, **kwargs)
+    return [generator.generate(i) for i in range(count)]
+
+
+def write_jar(path, classes):
+    with zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED) as jar:
+        for i, data in enumerate(classes):
+            jar.writestr('gen/C{}.class'.format(i), data)
+    return path
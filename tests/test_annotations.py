@@ -0,0 +1,132 @@
+import math
+import os
+import shutil
+import struct
+import tempfile
+import unittest
+from unittest import mock
+
+from tests import corpus, write_jar
+
+import annotations
+from annotations import AnnotationIndex, scan_class
+from classgen import ConstantPoolBuilder, attribute
+
+
+def _class_with_floats(name):
+    # one class annotated @Limits(x=NaN, y=Infinity, z=-Infinity as a double)
+    cp = ConstantPoolBuilder()
+    this = cp.class_(name)
+    sup = cp.class_('java/lang/Object')
+    pairs = [(cp.utf8('x'), b'F', cp.float_(float('nan'))), (cp.utf8('y'), b'F', cp.float_(float('inf'))),
+             (cp.utf8('z'), b'D', cp.double(float('-inf')))]
+    body = struct.pack('>HHH', 1, cp.utf8('Lgen/Limits;'), len(pairs))
+    body += b''.join(struct.pack('>H', n) + tag + struct.pack('>H', v) for n, tag, v in pairs)
+    attrs = attribute(cp, 'RuntimeVisibleAnnotations', body)
+    return (struct.pack('>IHH', 0xCAFEBABE, 0, 52) + cp.to_bytes() + struct.pack('>HHHHHHH', 0x21, this, sup, 0, 0, 0, 1)
+            + attrs)
+
+
+class AnnotationIndexTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.classes = corpus(8)
+        self.classes_dir = os.path.join(self.dir, 'classes')
+        os.mkdir(self.classes_dir)
+        for i, data in enumerate(self.classes[:4]):
+            self._write(os.path.join(self.classes_dir, 'C{}.class'.format(i)), data)
+        self.jar = write_jar(os.path.join(self.dir, 'lib.jar'), self.classes[4:])
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    @staticmethod
+    def _write(path, data, mtime_ns=None):
+        with open(path, 'wb') as f:
+            f.write(data)
+        if mtime_ns is not None:
+            os.utime(path, ns=(mtime_ns, mtime_ns))
+
+    def _counts(self, index):
+        return {source: len(records) for source, records in index.records.items()}
+
+    def test_build_and_query(self):
+        index = AnnotationIndex.from_classpath([self.classes_dir, self.jar], workers=1)
+        expected = sum(len(scan_class(data)) for data in self.classes)
+        self.assertEqual(sum(self._counts(index).values()), expected)
+        for annotation in index.types():
+            elements = index.annotated(annotation)
+            self.assertTrue(elements)
+            self.assertEqual(index.classes_with(annotation),
+                             sorted({e.class_name for e in elements if e.kind == 'class'}))
+            for element in elements:
+                self.assertIsInstance(element.values, dict)
+
+    def test_update_rescans_only_changed_sources(self):
+        index = AnnotationIndex.from_classpath([self.classes_dir, self.jar], workers=1)
+        before = self._counts(index)
+        with mock.patch.object(annotations, 'scan_class', wraps=scan_class) as scan:
+            self.assertEqual(index.update_classpath([self.classes_dir, self.jar], workers=1), [])
+            self.assertEqual(scan.call_count, 0)
+            path = os.path.join(self.classes_dir, 'C0.class')
+            self._write(path, self.classes[7], os.stat(path).st_mtime_ns + 10 ** 9)
+            self.assertEqual(index.update_classpath([self.classes_dir, self.jar], workers=1), [])
+            self.assertEqual(scan.call_count, 4)
+        self.assertEqual(self._counts(index), before)
+        self.assertIn('gen/p0/C7', {r[1] for r in index.records[self.classes_dir]})
+        self.assertNotIn('gen/p0/C0', {r[1] for r in index.records[self.classes_dir]})
+
+    def test_dropped_sources(self):
+        index = AnnotationIndex.from_classpath([self.classes_dir, self.jar], workers=1)
+        index.update_classpath([self.jar], workers=1)
+        self.assertEqual(list(index.records), [self.jar])
+        index.update_classpath([self.classes_dir], workers=1, drop_missing=False)
+        self.assertEqual(sorted(index.records), sorted([self.classes_dir, self.jar]))
+
+    def test_lone_files_keep_their_records(self):
+        first = os.path.join(self.classes_dir, 'C0.class')
+        second = os.path.join(self.classes_dir, 'C1.class')
+        paths = [first, second, self.classes_dir]
+        index = AnnotationIndex.from_classpath(paths, workers=1)
+        expected = {first: len(scan_class(self.classes[0])), second: len(scan_class(self.classes[1])),
+                    self.classes_dir: sum(len(scan_class(data)) for data in self.classes[:4])}
+        self.assertEqual(self._counts(index), expected)
+        self._write(second, self.classes[1], os.stat(second).st_mtime_ns + 10 ** 9)
+        index.update_classpath(paths, workers=1)
+        self.assertEqual(self._counts(index), expected)
+
+    def test_save_and_load(self):
+        index = AnnotationIndex.from_classpath([self.classes_dir, self.jar], workers=1)
+        path = os.path.join(self.dir, 'annotations.idx')
+        index.save(path)
+        loaded = AnnotationIndex.load(path)
+        self.assertEqual(loaded.sources, index.sources)
+        self.assertEqual(loaded.records, index.records)
+        for annotation in index.types():
+            self.assertEqual([e.values for e in loaded.annotated(annotation)],
+                             [e.values for e in index.annotated(annotation)])
+
+    def test_non_finite_values(self):
+        lone = os.path.join(self.dir, 'floats')
+        os.mkdir(lone)
+        self._write(os.path.join(lone, 'Limits.class'), _class_with_floats('gen/Limits'))
+        index = AnnotationIndex.from_classpath([lone], workers=1)
+        path = os.path.join(self.dir, 'annotations.idx')
+        index.save(path)
+        element, = AnnotationIndex.load(path).annotated('gen/Limits')
+        values = element.values
+        self.assertTrue(math.isnan(values['x']))
+        self.assertEqual(values['y'], float('inf'))
+        self.assertEqual(values['z'], float('-inf'))
+
+    def test_values_round_trip(self):
+        values = {'s': 'caf\xe9\udc80', 'b': True, 'i': -3, 'f': -0.0, 'a': [1.5, 'x'],
+                  'e': ('enum', 'Lgen/Color;', 'RED'), 'c': ('class', 'Ljava/lang/String;'),
+                  'n': ('@', 'Lgen/Nested;', {'v': [('class', 'I')]})}
+        decoded = annotations.decode_values(annotations.encode_values(values))
+        self.assertEqual(decoded, values)
+        self.assertEqual(math.copysign(1, decoded['f']), -1)
+
+
+if __name__ == '__main__':
+    unittest.main()
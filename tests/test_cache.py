@@ -0,0 +1,107 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from tests import corpus
+
+import cache
+from attribute import Code
+from cache import ParseCache
+from classfile import ClassFile
+from stream import BufferStream
+
+
+class ParseCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, 'classes.pack')
+        self.classes = corpus(12)
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_hits_and_misses(self):
+        with ParseCache(self.path) as c:
+            for data in self.classes:
+                c.parse(data)
+            c.parse(self.classes[0])
+            self.assertEqual((c.misses, c.hits, len(c)), (12, 1, 12))
+        with ParseCache(self.path) as c:
+            self.assertEqual(len(c), 12)
+            self.assertIsNone(c.get(b'not cached'))
+            for data in self.classes:
+                self.assertIsNotNone(c.get(data))
+            self.assertEqual((c.misses, c.hits), (1, 12))
+
+    def test_loaded_class_matches_parse(self):
+        with ParseCache(self.path) as c:
+            for data in self.classes:
+                c.put(data)
+        with ParseCache(self.path) as c:
+            for data in self.classes:
+                cached = c.get(data)
+                self.assertTrue(cached.lazy)
+                self.assertEqual(cached.to_bytes(), data)
+                parsed = ClassFile(BufferStream(data))
+                self.assertEqual(cached.name, parsed.name)
+                for a, b in zip(cached.methods, parsed.methods):
+                    self.assertEqual(cached.get_utf8(a.name_index), parsed.get_utf8(b.name_index))
+                    code = a.get_attribute(Code)
+                    if code is not None:
+                        self.assertEqual([i.get_state() for i in code.instructions],
+                                         [i.get_state() for i in b.get_attribute(Code).instructions])
+
+    def test_put_rejects_an_edited_class_file(self):
+        with ParseCache(self.path) as c:
+            c.put(self.classes[0], ClassFile(BufferStream(self.classes[0])))
+            self.assertIn(self.classes[0], c)
+            cf = ClassFile(BufferStream(self.classes[1]))
+            cf.access_flags |= 0x0010
+            with self.assertRaises(ValueError):
+                c.put(self.classes[1], cf)
+            self.assertNotIn(self.classes[1], c)
+            edited = cf.to_bytes()
+            c.put(edited, cf)
+            self.assertEqual(c.get(edited).access_flags, cf.access_flags)
+
+    def test_lru_eviction(self):
+        size = len(cache.encode(self.classes[0]))
+        with ParseCache(self.path, max_bytes=int(size * 3.5)) as c:
+            for data in self.classes[:3]:
+                c.put(data)
+            # touch the oldest so the second is the least recently used
+            self.assertIsNotNone(c.get(self.classes[0]))
+            c.put(self.classes[3])
+            self.assertEqual(c.evictions, 1)
+            self.assertNotIn(self.classes[1], c)
+            for data in (self.classes[0], self.classes[2], self.classes[3]):
+                self.assertIn(data, c)
+            self.assertLessEqual(c.live_bytes, c.max_bytes)
+        with ParseCache(self.path, max_bytes=int(size * 3.5)) as c:
+            self.assertNotIn(self.classes[1], c)
+            self.assertEqual(len(c), 3)
+
+    def test_rescan_without_index(self):
+        with ParseCache(self.path) as c:
+            for data in self.classes:
+                c.put(data)
+        os.remove(self.path + '.idx')
+        with open(self.path, 'ab') as f:
+            f.write(b'torn record')
+        with ParseCache(self.path) as c:
+            self.assertEqual(len(c), 12)
+            self.assertEqual(c.get(self.classes[-1]).to_bytes(), self.classes[-1])
+
+    def test_other_versions_are_discarded(self):
+        with open(self.path, 'wb') as f:
+            f.write(cache.MAGIC + (cache.VERSION - 1).to_bytes(2, 'big') + b'\0' * 64)
+        with ParseCache(self.path) as c:
+            self.assertEqual(len(c), 0)
+            c.put(self.classes[0])
+        with ParseCache(self.path) as c:
+            self.assertIn(self.classes[0], c)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,62 @@
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from tests import make_class, write_jar
+
+import classpath
+from classpath import class_summary, map_classpath, open_archive, parse_classpath
+
+
+class ClasspathTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.classes = [make_class('gen/C{}'.format(i)) for i in range(40)]
+        self.jar = write_jar(os.path.join(self.dir, 'lib.jar'), self.classes[:30])
+        self.classes_dir = os.path.join(self.dir, 'classes')
+        os.mkdir(self.classes_dir)
+        for i, data in enumerate(self.classes[30:]):
+            with open(os.path.join(self.classes_dir, 'C{}.class'.format(i)), 'wb') as f:
+                f.write(data)
+        with open(os.path.join(self.classes_dir, 'Broken.class'), 'wb') as f:
+            f.write(b'not a class')
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def _run(self, **kwargs):
+        return [(r.source, r.name, r.value, r.error is None)
+                for r in parse_classpath([self.jar, self.classes_dir], class_summary, chunk_size=4, **kwargs)]
+
+    def test_pool_output_matches_one_worker(self):
+        serial = self._run(workers=1)
+        self.assertEqual(len(serial), 41)
+        self.assertEqual(serial[0][2], ('gen/C0', 1, 3))
+        self.assertEqual(sum(not ok for *_, ok in serial), 1)
+        self.assertEqual(self._run(workers=3, max_pending=2), serial)
+        self.assertEqual(sorted(map(repr, self._run(workers=3, ordered=False))), sorted(map(repr, serial)))
+
+    def test_missing_path_is_reported(self):
+        results = list(parse_classpath([os.path.join(self.dir, 'missing.jar'), self.jar], class_summary, workers=1))
+        self.assertFalse(results[0].ok)
+        self.assertEqual(sum(r.ok for r in results), 30)
+
+    def test_archive_is_indexed_once(self):
+        classpath._archives.clear()
+        with mock.patch.object(classpath, 'Archive', wraps=classpath.Archive) as archive:
+            results = list(map_classpath(self.jar, len, workers=1, chunk_size=2))
+        self.assertEqual(len(results), 30)
+        self.assertEqual(archive.call_count, 1)
+
+    def test_rewritten_archive_is_reopened(self):
+        first = open_archive(self.jar)
+        self.assertIs(open_archive(self.jar), first)
+        os.remove(self.jar)
+        write_jar(self.jar, self.classes[:5])
+        self.assertEqual(len(open_archive(self.jar).class_entry_names()), 5)
+
+
+if __name__ == '__main__':
+    unittest.main()
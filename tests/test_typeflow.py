@@ -0,0 +1,65 @@
+import unittest
+
+from tests import ClassGenerator
+
+from attribute import Code, StackMapFrameType, StackMapTable, VerificationTypeInfo, VerificationTypeInfoTag
+from classfile import ClassFile
+from frames import type_name
+from stream import BufferStream
+from typeflow import TypeFlow, check_class, class_types
+
+
+def _states(flow):
+    return [(pc, [type_name(t) for t in locals_], [type_name(t) for t in stack]) for pc, locals_, stack in flow]
+
+
+class TypeFlowTest(unittest.TestCase):
+    def test_corpus_has_no_errors(self):
+        generator = ClassGenerator(switch_density=0.2)
+        for i in range(24):
+            name, instructions, errors = check_class(ClassFile(BufferStream(generator.generate(i))))
+            self.assertGreater(instructions, 0)
+            self.assertEqual(errors, [], name)
+
+    def test_linear_matches_worklist(self):
+        # the same classes with and without a StackMapTable take the two paths
+        with_frames = ClassGenerator(switch_density=0.2)
+        without_frames = ClassGenerator(switch_density=0.2, stack_map=False)
+        methods = 0
+        for i in range(24):
+            linear = class_types(ClassFile(BufferStream(with_frames.generate(i))))
+            worklist = class_types(ClassFile(BufferStream(without_frames.generate(i))))
+            self.assertEqual(sorted(linear), sorted(worklist))
+            for method, flow in linear.items():
+                self.assertEqual(_states(flow), _states(worklist[method]), method)
+                self.assertEqual(flow.errors, [])
+                self.assertEqual(worklist[method].errors, [])
+                methods += 1
+        self.assertGreater(methods, 100)
+
+    def test_limits_of_adopted_frames(self):
+        cf = ClassFile(BufferStream(ClassGenerator().generate(3)))
+        method = next(m for m in cf.methods if m.get_attribute(Code) is not None and
+                      m.get_attribute(Code).get_attribute(StackMapTable) is not None)
+        code = method.get_attribute(Code)
+        self.assertEqual(TypeFlow(cf, method).errors, [])
+        # turn the first frame into a full frame wider and deeper than the declared limits
+        frame = code.get_attribute(StackMapTable).entries[0]
+        frame.tag = frame.frame_type = StackMapFrameType.FULL_FRAME
+        frame.locals = [_top() for _ in range(code.max_locals + 1)]
+        frame.stack = [_top() for _ in range(code.max_stack + 1)]
+        written = ClassFile(BufferStream(cf.to_bytes()))
+        flow = TypeFlow(written, written.methods[cf.methods.index(method)])
+        messages = [message for _, message in flow.errors]
+        self.assertIn('stack map frame has {} locals, max_locals is {}'.format(
+            code.max_locals + 1, code.max_locals), messages)
+        self.assertIn('stack map frame has stack depth {}, max_stack is {}'.format(
+            code.max_stack + 1, code.max_stack), messages)
+
+
+def _top() -> VerificationTypeInfo:
+    return VerificationTypeInfo(BufferStream(bytes([VerificationTypeInfoTag.TOP])))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,66 @@
+import struct
+import unittest
+
+from tests import corpus, make_class
+
+from attribute import Code, LazyAttribute, StackMapTable, UnknownAttribute
+from classfile import ClassFile
+from const import IntegerInfo
+from stream import BufferStream
+
+
+class RoundTripTest(unittest.TestCase):
+    def setUp(self):
+        self.classes = corpus()
+
+    def test_eager(self):
+        for data in self.classes:
+            self.assertEqual(ClassFile(BufferStream(data)).to_bytes(), data)
+
+    def test_lazy_undecoded(self):
+        for data in self.classes:
+            cf = ClassFile(BufferStream(data), lazy=True)
+            self.assertEqual(cf.to_bytes(), data)
+
+    def test_lazy_after_decoding(self):
+        for data in self.classes:
+            cf = ClassFile(BufferStream(data), lazy=True)
+            for i in range(len(cf.constants)):
+                cf.constants[i]
+            for method in cf.methods:
+                code = method.get_attribute(Code)
+                if code is not None:
+                    code.get_attribute(StackMapTable)
+            self.assertEqual(cf.to_bytes(), data)
+
+    def test_header_only_cannot_write(self):
+        cf = ClassFile(BufferStream(self.classes[0]), header_only=True)
+        with self.assertRaises(ValueError):
+            cf.to_bytes()
+
+    def test_edit_is_written(self):
+        cf = ClassFile(BufferStream(self.classes[0]), lazy=True)
+        index = next(i for i in range(1, len(cf.constants)) if isinstance(cf.constants[i], IntegerInfo))
+        cf.constants[index].bytes = 7
+        cf.methods[0].access_flags |= 0x0010
+        written = ClassFile(BufferStream(cf.to_bytes()))
+        self.assertEqual(written.constants[index].bytes, 7)
+        self.assertEqual(written.methods[0].access_flags & 0x0010, 0x0010)
+        self.assertEqual(len(written.to_bytes()), len(self.classes[0]))
+
+    def test_attributes_stay_lazy(self):
+        cf = ClassFile(BufferStream(self.classes[0]), lazy=True)
+        self.assertTrue(all(isinstance(a, LazyAttribute) for a in cf.attributes))
+
+    def test_unknown_attribute_found_lazily(self):
+        data = make_class('gen/Extra')
+        cf = ClassFile(BufferStream(data))
+        name = next(i for i in range(1, len(cf.constants)) if getattr(cf.constants[i], 'bytes', None) == b'value')
+        data = data[:-2] + struct.pack('>HHI', 1, name, 3) + b'abc'
+        cf = ClassFile(BufferStream(data), lazy=True)
+        self.assertEqual(cf.get_attribute(UnknownAttribute).info, b'abc')
+        self.assertEqual(cf.to_bytes(), data)
+
+
+if __name__ == '__main__':
+    unittest.main()
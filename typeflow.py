@@ -0,0 +1,630 @@
+from array import array
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from attribute import Code
+from attribute import VerificationTypeInfoTag as Tag
+from base import Object
+from cfg import BRANCHES, EXITS, GOTOS, JSRS, SWITCHES
+from classfile import ClassFile, FieldMethodInfo
+from const import ClassInfo, DoubleInfo, FloatInfo, IntegerInfo, LongInfo, MethodHandle, StringInfo
+from const import MethodType as MethodTypeInfo
+from descriptor import VOID, field_type, method_type
+from frames import (DOUBLE, FLOAT, INTEGER, LONG, NULL, RETURN_ADDRESS, TOP, UNINITIALIZED_THIS, FrameTable, object_type,
+                    to_slots, uninitialized, vtype_of)
+from instruction import Ins
+
+_I = (INTEGER,)
+_L = (LONG, TOP)
+_F = (FLOAT,)
+_D = (DOUBLE, TOP)
+
+# opcode -> (slots popped, slots pushed) for every instruction whose effect does not
+# depend on its operands or on the types it pops
+_SIMPLE = {}
+
+
+def _simple(pops, pushes, *classes):
+    for cls in classes:
+        _SIMPLE[cls.OPCODE] = (pops, pushes)
+
+
+_simple(0, (), Ins.nop, Ins.goto, Ins.goto_w, Ins.return_, Ins.breakpoint, Ins.impdep1, Ins.impdep2)
+_simple(0, (NULL,), Ins.aconst_null)
+_simple(0, _I, Ins.iconst_m1, Ins.iconst_0, Ins.iconst_1, Ins.iconst_2, Ins.iconst_3, Ins.iconst_4, Ins.iconst_5,
+        Ins.bipush, Ins.sipush)
+_simple(0, _L, Ins.lconst_0, Ins.lconst_1)
+_simple(0, _F, Ins.fconst_0, Ins.fconst_1, Ins.fconst_2)
+_simple(0, _D, Ins.dconst_0, Ins.dconst_1)
+_simple(2, _I, Ins.iaload, Ins.baload, Ins.caload, Ins.saload, Ins.iadd, Ins.isub, Ins.imul, Ins.idiv, Ins.irem,
+        Ins.ishl, Ins.ishr, Ins.iushr, Ins.iand, Ins.ior, Ins.ixor, Ins.fcmpl, Ins.fcmpg)
+_simple(2, _L, Ins.laload)
+_simple(2, _F, Ins.faload, Ins.fadd, Ins.fsub, Ins.fmul, Ins.fdiv, Ins.frem)
+_simple(2, _D, Ins.daload)
+_simple(3, (), Ins.iastore, Ins.bastore, Ins.castore, Ins.sastore, Ins.fastore, Ins.aastore)
+_simple(4, (), Ins.lastore, Ins.dastore)
+_simple(1, (), Ins.pop, Ins.ifeq, Ins.ifne, Ins.iflt, Ins.ifge, Ins.ifgt, Ins.ifle, Ins.ifnull, Ins.ifnonnull,
+        Ins.tableswitch, Ins.lookupswitch, Ins.ireturn, Ins.freturn, Ins.areturn, Ins.athrow, Ins.monitorenter,
+        Ins.monitorexit)
+_simple(2, (), Ins.pop2, Ins.if_icmpeq, Ins.if_icmpne, Ins.if_icmplt, Ins.if_icmpge, Ins.if_icmpgt, Ins.if_icmple,
+        Ins.if_acmpeq, Ins.if_acmpne, Ins.lreturn, Ins.dreturn)
+_simple(4, _L, Ins.ladd, Ins.lsub, Ins.lmul, Ins.ldiv, Ins.lrem, Ins.land, Ins.lor, Ins.lxor)
+_simple(3, _L, Ins.lshl, Ins.lshr, Ins.lushr)
+_simple(4, _D, Ins.dadd, Ins.dsub, Ins.dmul, Ins.ddiv, Ins.drem)
+_simple(4, _I, Ins.lcmp, Ins.dcmpl, Ins.dcmpg)
+_simple(1, _I, Ins.ineg, Ins.f2i, Ins.i2b, Ins.i2c, Ins.i2s, Ins.arraylength, Ins.instanceof)
+_simple(2, _L, Ins.lneg, Ins.d2l)
+_simple(1, _F, Ins.fneg, Ins.i2f)
+_simple(2, _D, Ins.dneg, Ins.l2d)
+_simple(1, _L, Ins.i2l, Ins.f2l)
+_simple(1, _D, Ins.i2d, Ins.f2d)
+_simple(2, _I, Ins.l2i, Ins.d2i)
+_simple(2, _F, Ins.l2f, Ins.d2f)
+
+# opcode -> (local, slots pushed) for loads and (local, slots popped) for stores; local -1
+# means it is the operand. aload pushes whatever the local holds, marked by None.
+_LOADS = {}
+_STORES = {}
+for _k, _pushed in enumerate((_I, _L, _F, _D, None)):
+    _LOADS[Ins.iload.OPCODE + _k] = (-1, _pushed)
+    _STORES[Ins.istore.OPCODE + _k] = (-1, len(_pushed or _I))
+    for _n in range(4):
+        _LOADS[Ins.iload_0.OPCODE + 4 * _k + _n] = (_n, _pushed)
+        _STORES[Ins.istore_0.OPCODE + 4 * _k + _n] = (_n, len(_pushed or _I))
+
+
+def _dup2_x1(stack):
+    stack[len(stack) - 3:len(stack) - 3] = stack[-2:]
+
+
+def _dup2_x2(stack):
+    stack[len(stack) - 4:len(stack) - 4] = stack[-2:]
+
+
+def _swap(stack):
+    stack[-1], stack[-2] = stack[-2], stack[-1]
+
+
+# opcode -> (slots needed, rearrangement) for the stack shuffles, which work on slots
+# whatever the categories of the values, as the JVMS describes them
+_SHUFFLES = {
+    Ins.dup.OPCODE: (1, lambda stack: stack.append(stack[-1])),
+    Ins.dup_x1.OPCODE: (2, lambda stack: stack.insert(-2, stack[-1])),
+    Ins.dup_x2.OPCODE: (3, lambda stack: stack.insert(-3, stack[-1])),
+    Ins.dup2.OPCODE: (2, lambda stack: stack.extend(stack[-2:])),
+    Ins.dup2_x1.OPCODE: (3, _dup2_x1),
+    Ins.dup2_x2.OPCODE: (4, _dup2_x2),
+    Ins.swap.OPCODE: (2, _swap),
+}
+
+_NEWARRAY_TYPES = {4: '[Z', 5: '[C', 6: '[F', 7: '[D', 8: '[B', 9: '[S', 10: '[I', 11: '[J'}
+_LDC_TYPES = {IntegerInfo: _I, FloatInfo: _F, LongInfo: _L, DoubleInfo: _D,
+              StringInfo: (object_type('java/lang/String'),), ClassInfo: (object_type('java/lang/Class'),),
+              MethodTypeInfo: (object_type('java/lang/invoke/MethodType'),),
+              MethodHandle: (object_type('java/lang/invoke/MethodHandle'),)}
+_JAVA_LANG_OBJECT = object_type('java/lang/Object')
+_THROWABLE = object_type('java/lang/Throwable')
+_INVOKES = frozenset(cls.OPCODE for cls in (Ins.invokevirtual, Ins.invokespecial, Ins.invokestatic,
+                                            Ins.invokeinterface, Ins.invokedynamic))
+_FIELDS = frozenset(cls.OPCODE for cls in (Ins.getstatic, Ins.putstatic, Ins.getfield, Ins.putfield))
+
+
+class _Invalid(Exception):
+    pass
+
+
+def _message(e) -> str:
+    # a LookupError comes from a bad constant pool index or tag
+    return str(e) if isinstance(e, _Invalid) else 'bad constant: {}: {}'.format(type(e).__name__, e)
+
+
+class TypeFlow(Object):
+    """Operand stack and local variable types before every instruction of a method.
+
+    Types are the interned verification types of frames.py, laid out in slots as
+    to_slots() does. When the method has a StackMapTable the code is walked once
+    in order, taking the recorded frame at every pc that has one, which covers all
+    merge points. Methods without one (old class files, or no branches at all) are
+    solved with a worklist over the control flow graph, where references merge to
+    their least common superclass from `hierarchy`, or to java/lang/Object without
+    one; locals changed inside a jsr subroutine are not carried to its return point.
+
+    Nothing is computed until first use. States are interned and kept as one pair
+    of ids per instruction row of `code.table`, -1 for unreachable code. Stack
+    underflows, mismatched merges and stack or local use beyond the declared
+    max_stack and max_locals are collected in `errors` as (pc, message).
+    """
+    __slots__ = ('class_file', 'method', 'code', 'hierarchy', '_local_ids', '_stack_ids', '_locals', '_stacks',
+                 '_errors', 'used_stack', 'used_locals', '_refs', '_intern_index', '_before_jsr')
+
+    def __init__(self, cf: ClassFile, method: FieldMethodInfo, hierarchy=None):
+        self.class_file = cf
+        self.method = method
+        self.code: Code = method.get_attribute(Code)
+        if self.code is None:
+            raise ValueError('{}.{} has no code'.format(cf.name, cf.get_utf8(method.name_index)))
+        self.hierarchy = hierarchy
+        self._local_ids = None
+
+    def __repr__(self):
+        return 'TypeFlow({}.{}{})'.format(self.class_file.name, self.class_file.get_utf8(self.method.name_index),
+                                          self.class_file.get_utf8(self.method.descriptor_index))
+
+    def _run(self):
+        code = self.code
+        table = code.table
+        rows = len(table)
+        self._local_ids = array('i', [-1]) * rows
+        self._stack_ids = array('i', [-1]) * rows
+        self._locals = []
+        self._stacks = []
+        self._errors = {}
+        self._refs = {}
+        self.used_stack = 0
+        frames = FrameTable(self.class_file, self.method)
+        initial = frames.locals[0]
+        self.used_locals = len(initial)
+        if len(initial) > code.max_locals:
+            self._error(0, 'the parameters need {} locals, max_locals is {}'.format(len(initial), code.max_locals))
+        opcodes = table.opcodes
+        linear = frames.entries or not (code.exception_table or any(op in BRANCHES for op in set(opcodes)))
+        if linear and not any(op in JSRS for op in set(opcodes)):
+            self._run_linear(table, frames)
+        else:
+            self._run_worklist(table, initial)
+        self._refs = None
+
+    def _record(self, row, locals_, stack):
+        # interns the state before `row`
+        local_index, stack_index = self._intern_index
+        key = tuple(locals_)
+        i = local_index.get(key)
+        if i is None:
+            i = local_index[key] = len(self._locals)
+            self._locals.append(key)
+        self._local_ids[row] = i
+        key = tuple(stack)
+        i = stack_index.get(key)
+        if i is None:
+            i = stack_index[key] = len(self._stacks)
+            self._stacks.append(key)
+        self._stack_ids[row] = i
+
+    def _run_linear(self, table, frames: FrameTable):
+        addrs = table.addrs
+        frame_rows = {}
+        for i, pc in enumerate(frames.pcs):
+            try:
+                frame_rows[table.row_at(pc)] = i
+            except KeyError:
+                self._error(pc, 'stack map frame at pc {} is not at an instruction'.format(pc))
+        self._intern_index = ({}, {})
+        frame_locals = frames.locals
+        frame_stacks = frames.stacks
+        opcodes = table.opcodes
+        state = None
+        for row in range(len(table)):
+            i = frame_rows.get(row)
+            if i is not None:
+                state = list(frame_locals[i]), list(frame_stacks[i])
+                self._check_frame(addrs[row], *state)
+            if state is None:
+                continue
+            locals_, stack = state
+            self._record(row, locals_, stack)
+            opcode = opcodes[row]
+            try:
+                self._step(table, row, opcode, locals_, stack)
+            except (_Invalid, LookupError) as e:
+                self._error(addrs[row], _message(e))
+                state = None
+                continue
+            if opcode in EXITS or opcode in GOTOS or opcode in SWITCHES:
+                state = None
+
+    def _check_frame(self, pc, locals_, stack):
+        # a state adopted from the StackMapTable never went through _local() or _push()
+        if len(locals_) > self.used_locals:
+            self.used_locals = len(locals_)
+        if len(locals_) > self.code.max_locals:
+            self._error(pc, 'stack map frame has {} locals, max_locals is {}'.format(len(locals_),
+                                                                                    self.code.max_locals))
+        if len(stack) > self.used_stack:
+            self.used_stack = len(stack)
+        if len(stack) > self.code.max_stack:
+            self._error(pc, 'stack map frame has stack depth {}, max_stack is {}'.format(len(stack),
+                                                                                        self.code.max_stack))
+
+    def _run_worklist(self, table, initial):
+        code = self.code
+        cfg = code.cfg
+        blocks = len(cfg)
+        if not blocks:
+            return
+        catch_types = {}
+        for entry in code.exception_table:
+            h = cfg.block_at(entry.handler_pc)
+            t = _THROWABLE if entry.catch_type == 0 else object_type(self.class_file.get_class_name(entry.catch_type))
+            catch_types[h] = t if h not in catch_types else self._merge_type(catch_types[h], t)
+        entry_states: List[Optional[Tuple[list, list]]] = [None] * blocks
+        entry_states[0] = list(initial), []
+        work = [0]
+        queued = bytearray(blocks)
+        queued[0] = 1
+
+        def merge(target, locals_, stack):
+            if self._merge(entry_states, target, locals_, stack) and not queued[target]:
+                queued[target] = 1
+                work.append(target)
+
+        while work:
+            b = work.pop()
+            queued[b] = 0
+            out = self._run_block(table, cfg, b, entry_states[b], catch_types, merge)
+            if out is None:
+                continue
+            last = cfg.starts[b + 1] - 1
+            opcode = table.opcodes[last]
+            for s in cfg.successors(b):
+                if opcode in JSRS and cfg.starts[s] == last + 1:
+                    # the return point: the caller's state from before the jsr
+                    merge(s, *self._before_jsr)
+                else:
+                    merge(s, *out)
+        # a last pass over the solved entry states records every row
+        self._intern_index = ({}, {})
+        for b in range(blocks):
+            if entry_states[b] is not None:
+                self._run_block(table, cfg, b, entry_states[b], catch_types, None)
+
+    def _run_block(self, table, cfg, b, state, catch_types, merge):
+        locals_ = list(state[0])
+        stack = list(state[1])
+        handlers = cfg.handlers(b)
+        opcodes = table.opcodes
+        for row in cfg.rows(b):
+            if merge is None:
+                self._record(row, locals_, stack)
+            else:
+                for h in handlers:
+                    merge(h, locals_, [catch_types[h]])
+            opcode = opcodes[row]
+            if opcode in JSRS:
+                self._before_jsr = list(locals_), list(stack)
+            try:
+                self._step(table, row, opcode, locals_, stack)
+            except (_Invalid, LookupError) as e:
+                self._error(table.addrs[row], _message(e))
+                return None
+        return locals_, stack
+
+    def _merge(self, entry_states, target, locals_, stack) -> bool:
+        # merges into the entry state of block `target`; True if it changed
+        old = entry_states[target]
+        if old is None:
+            entry_states[target] = list(locals_), list(stack)
+            return True
+        old_locals, old_stack = old
+        changed = False
+        if len(old_stack) != len(stack):
+            self._error(self.code.cfg.addrs[target], 'stack heights {} and {} meet'.format(len(old_stack), len(stack)))
+            return False
+        for i, t in enumerate(stack):
+            merged = self._merge_type(old_stack[i], t)
+            if merged is not old_stack[i]:
+                old_stack[i] = merged
+                changed = True
+        for i in range(len(old_locals)):
+            merged = self._merge_type(old_locals[i], locals_[i]) if i < len(locals_) else TOP
+            if merged is not old_locals[i]:
+                old_locals[i] = merged
+                changed = True
+        return changed
+
+    def _merge_type(self, a, b):
+        if a is b:
+            return a
+        if a is NULL and b[0] == Tag.OBJECT:
+            return b
+        if b is NULL and a[0] == Tag.OBJECT:
+            return a
+        if a[0] == Tag.OBJECT and b[0] == Tag.OBJECT:
+            hierarchy = self.hierarchy
+            if hierarchy is None or a[1][0] == '[' or b[1][0] == '[':
+                return _JAVA_LANG_OBJECT
+            try:
+                return object_type(hierarchy.least_common_superclass(a[1], b[1]))
+            except KeyError:
+                return _JAVA_LANG_OBJECT
+        return TOP
+
+    def _error(self, pc, message):
+        self._errors.setdefault((pc, message), None)
+
+    def _local(self, pc, index, size):
+        end = index + size
+        if end > self.used_locals:
+            self.used_locals = end
+            if end > self.code.max_locals:
+                self._error(pc, 'local {} is past max_locals {}'.format(end - 1, self.code.max_locals))
+
+    def _step(self, table, row, opcode, locals_, stack, operand=None):
+        if operand is None:
+            operand = table.operands[row]
+        effect = _SIMPLE.get(opcode)
+        if effect is not None:
+            pops, pushes = effect
+            if pops:
+                if len(stack) < pops:
+                    raise _Invalid('stack underflow')
+                del stack[-pops:]
+            if pushes:
+                stack.extend(pushes)
+                self._push(table, row, stack)
+            return
+        load = _LOADS.get(opcode)
+        if load is not None:
+            index, pushed = load
+            if index < 0:
+                index = operand
+            self._local(table.addrs[row], index, len(pushed or _I))
+            if pushed is None:
+                stack.append(locals_[index] if index < len(locals_) else TOP)
+            else:
+                stack.extend(pushed)
+            self._push(table, row, stack)
+            return
+        store = _STORES.get(opcode)
+        if store is not None:
+            index, size = store
+            if index < 0:
+                index = operand
+            if len(stack) < size:
+                raise _Invalid('stack underflow')
+            self._local(table.addrs[row], index, size)
+            if len(locals_) < index + size:
+                locals_.extend([TOP] * (index + size - len(locals_)))
+            if index and (locals_[index - 1] is LONG or locals_[index - 1] is DOUBLE):
+                # the first half of a long or double is no longer usable
+                locals_[index - 1] = TOP
+            locals_[index:index + size] = stack[-size:]
+            del stack[-size:]
+            return
+        shuffle = _SHUFFLES.get(opcode)
+        if shuffle is not None:
+            needed, rearrange = shuffle
+            if len(stack) < needed:
+                raise _Invalid('stack underflow')
+            rearrange(stack)
+            self._push(table, row, stack)
+            return
+        if opcode in _INVOKES:
+            self._invoke(table, row, opcode, operand, locals_, stack)
+        elif opcode in _FIELDS:
+            slots = self._ref(operand, False)
+            pops = 1 if opcode == Ins.getfield.OPCODE or opcode == Ins.putfield.OPCODE else 0
+            if opcode == Ins.putstatic.OPCODE or opcode == Ins.putfield.OPCODE:
+                pops += len(slots)
+                slots = ()
+            if len(stack) < pops:
+                raise _Invalid('stack underflow')
+            if pops:
+                del stack[-pops:]
+            stack.extend(slots)
+            self._push(table, row, stack)
+        elif opcode == Ins.ldc.OPCODE or opcode == Ins.ldc_w.OPCODE or opcode == Ins.ldc2_w.OPCODE:
+            const = self.class_file.constants[operand]
+            pushed = _LDC_TYPES.get(type(const))
+            if pushed is None:
+                raise _Invalid('ldc of unsupported constant {}'.format(type(const).__name__))
+            stack.extend(pushed)
+            self._push(table, row, stack)
+        elif opcode == Ins.new.OPCODE:
+            stack.append(uninitialized(table.addrs[row]))
+            self._push(table, row, stack)
+        elif opcode == Ins.checkcast.OPCODE or opcode == Ins.anewarray.OPCODE or opcode == Ins.newarray.OPCODE:
+            if not stack:
+                raise _Invalid('stack underflow')
+            if opcode == Ins.newarray.OPCODE:
+                name = _NEWARRAY_TYPES[operand]
+            else:
+                name = self.class_file.get_class_name(operand)
+                if opcode == Ins.anewarray.OPCODE:
+                    name = '[' + (name if name[0] == '[' else 'L{};'.format(name))
+            stack[-1] = object_type(name)
+        elif opcode == Ins.multianewarray.OPCODE:
+            dimensions = table.extras[row][1]
+            if len(stack) < dimensions:
+                raise _Invalid('stack underflow')
+            del stack[len(stack) - dimensions:]
+            stack.append(object_type(self.class_file.get_class_name(operand)))
+            self._push(table, row, stack)
+        elif opcode == Ins.aaload.OPCODE:
+            if len(stack) < 2:
+                raise _Invalid('stack underflow')
+            array_type = stack[-2]
+            del stack[-2:]
+            if array_type is NULL:
+                stack.append(NULL)
+            elif array_type[0] == Tag.OBJECT and array_type[1][:2] == '[L':
+                stack.append(object_type(array_type[1][2:-1]))
+            elif array_type[0] == Tag.OBJECT and array_type[1][:2] == '[[':
+                stack.append(object_type(array_type[1][1:]))
+            else:
+                raise _Invalid('aaload from {}'.format(array_type))
+        elif opcode == Ins.iinc.OPCODE:
+            self._local(table.addrs[row], operand, 1)
+        elif opcode in JSRS:
+            stack.append(RETURN_ADDRESS)
+            self._push(table, row, stack)
+        elif opcode == Ins.ret.OPCODE:
+            self._local(table.addrs[row], operand, 1)
+        elif opcode == Ins.wide.OPCODE:
+            extra = table.extras[row]
+            self._step(table, row, extra[0], locals_, stack, extra[1])
+        else:
+            raise _Invalid('unknown opcode {}'.format(opcode))
+
+    def _push(self, table, row, stack):
+        depth = len(stack)
+        if depth > self.used_stack:
+            self.used_stack = depth
+            if depth > self.code.max_stack:
+                self._error(table.addrs[row], 'stack depth {} is past max_stack {}'.format(depth,
+                                                                                          self.code.max_stack))
+
+    def _ref(self, index, method) -> tuple:
+        # the pushed slots of a field, or (argument slots, pushed slots, name) of a method ref
+        result = self._refs.get(index)
+        if result is None:
+            pool = self.class_file.constants
+            nat = pool[pool[index].name_and_type_index]
+            raw = pool[nat.descriptor_index].bytes
+            if method:
+                t = method_type(raw)
+                returned = () if t.return_type is VOID else to_slots([vtype_of(t.return_type)])
+                result = (t.argument_size, returned, pool[nat.name_index].value)
+            else:
+                result = to_slots([vtype_of(field_type(raw))])
+            self._refs[index] = result
+        return result
+
+    def _invoke(self, table, row, opcode, operand, locals_, stack):
+        arguments, returned, name = self._ref(operand, True)
+        receiver = opcode != Ins.invokestatic.OPCODE and opcode != Ins.invokedynamic.OPCODE
+        pops = arguments + receiver
+        if len(stack) < pops:
+            raise _Invalid('stack underflow')
+        if opcode == Ins.invokespecial.OPCODE and name == '<init>':
+            target = stack[-pops]
+            if target is UNINITIALIZED_THIS:
+                initialized = object_type(self.class_file.name)
+            elif target[0] == Tag.UNINITIALIZED:
+                try:
+                    new_row = table.row_at(target[1])
+                except KeyError:
+                    raise _Invalid('uninitialized type of a new at pc {}'.format(target[1])) from None
+                initialized = object_type(self.class_file.get_class_name(table.operands[new_row]))
+            else:
+                raise _Invalid('<init> called on {}'.format(target))
+            del stack[-pops:]
+            stack[:] = [initialized if t is target else t for t in stack]
+            locals_[:] = [initialized if t is target else t for t in locals_]
+        elif pops:
+            del stack[-pops:]
+        if returned:
+            stack.extend(returned)
+            self._push(table, row, stack)
+
+    # queries
+
+    def _solved(self):
+        if self._local_ids is None:
+            self._run()
+
+    def __len__(self):
+        return len(self.code.table)
+
+    def __iter__(self) -> Iterator[Tuple[int, tuple, tuple]]:
+        """(pc, locals, stack) before every reachable instruction, in code order."""
+        self._solved()
+        addrs = self.code.table.addrs
+        all_locals = self._locals
+        stacks = self._stacks
+        for row, (l, s) in enumerate(zip(self._local_ids, self._stack_ids)):
+            if l >= 0:
+                yield addrs[row], all_locals[l], stacks[s]
+
+    @property
+    def errors(self) -> List[Tuple[int, str]]:
+        self._solved()
+        return sorted(self._errors)
+
+    def check(self):
+        """Raises ValueError for the first error, if any."""
+        errors = self.errors
+        if errors:
+            pc, message = errors[0]
+            raise ValueError('{} at pc {}: {}'.format(self, pc, message))
+
+    def at(self, pc) -> Optional[Tuple[tuple, tuple]]:
+        """(locals, stack) before the instruction at `pc`, None if it is unreachable."""
+        self._solved()
+        row = self.code.table.row_at(pc)
+        i = self._local_ids[row]
+        if i < 0:
+            return None
+        return self._locals[i], self._stacks[self._stack_ids[row]]
+
+    def locals_at(self, pc) -> Optional[tuple]:
+        state = self.at(pc)
+        return None if state is None else state[0]
+
+    def stack_at(self, pc) -> Optional[tuple]:
+        state = self.at(pc)
+        return None if state is None else state[1]
+
+    @property
+    def depths(self) -> array:
+        """Stack depth in slots before every instruction row, -1 where unreachable."""
+        self._solved()
+        sizes = [len(s) for s in self._stacks]
+        return array('i', [sizes[i] if i >= 0 else -1 for i in self._stack_ids])
+
+
+def class_types(cf: ClassFile, hierarchy=None) -> Dict[str, TypeFlow]:
+    """A TypeFlow for every method with code, by name + descriptor; nothing is solved yet."""
+    return {cf.get_utf8(m.name_index) + cf.get_utf8(m.descriptor_index): TypeFlow(cf, m, hierarchy)
+            for m in cf.methods if m.get_attribute(Code) is not None}
+
+
+def check_class(cf: ClassFile) -> Tuple[str, int, List[Tuple[str, int, str]]]:
+    """(class name, instructions, [(method, pc, error), ...]); picklable for parse_classpath()."""
+    instructions = 0
+    errors = []
+    for method, flow in class_types(cf).items():
+        instructions += len(flow)
+        errors.extend((method, pc, message) for pc, message in flow.errors)
+    return cf.name, instructions, errors
+
+
+if __name__ == "__main__":
+    import argparse
+    import sys
+    import time
+
+    from classpath import parse_classpath
+    from frames import type_name
+
+    parser = argparse.ArgumentParser(description='Infer stack and local types of every method, reporting errors.')
+    parser.add_argument('paths', nargs='+')
+    parser.add_argument('-j', '--workers', type=int, default=None)
+    parser.add_argument('--dump', metavar='CLASS', help='print the types before every instruction of one class')
+    args = parser.parse_args()
+
+    if args.dump:
+        for result in parse_classpath(args.paths, workers=1):
+            if result.ok and result.value.name == args.dump:
+                for method, flow in class_types(result.value).items():
+                    print(method)
+                    for pc, locals_, stack in flow:
+                        print('  {:>5}  [{}]  [{}]'.format(pc, ', '.join(map(type_name, locals_)),
+                                                           ', '.join(map(type_name, stack))))
+                    for pc, message in flow.errors:
+                        print('  error at {}: {}'.format(pc, message))
+        sys.exit(0)
+    start = time.perf_counter()
+    classes = instructions = failures = 0
+    for result in parse_classpath(args.paths, check_class, args.workers):
+        if not result.ok:
+            print('{}!{}\t{}'.format(result.source, result.name, result.error), file=sys.stderr)
+            continue
+        name, count, errors = result.value
+        classes += 1
+        instructions += count
+        for method, pc, message in errors:
+            failures += 1
+            print('{}.{} pc {}: {}'.format(name, method, pc, message))
+    print('{} classes, {} instructions in {:.2f}s, {} errors'.format(classes, instructions,
+                                                                    time.perf_counter() - start, failures),
+          file=sys.stderr)
+    sys.exit(1 if failures else 0)
@@ -0,0 +1,221 @@
+from typing import List, Optional, Tuple
+
+from attribute import skip_attributes
+from const import Constant, ConstantPool
+from instruction import READERS
+from stream import BufferStream, Stream
+
+
+class _Skip(object):
+    __slots__ = ()
+
+    def __repr__(self):
+        return 'SKIP'
+
+
+# returned from a hook to skip what it announces
+SKIP = _Skip()
+
+
+class ClassVisitor(object):
+    """Callbacks for `visit()`, which drives them straight from the class bytes.
+
+    Every hook is a no-op; override the ones you need. Hooks that are not
+    overridden are not called, and nothing is decoded just for them: not the
+    class, member or attribute names, the constants or the instructions.
+    visit_constant_pool, visit_field_end, visit_method_end and visit_end cost
+    nothing and are always called. Returning SKIP from
+      visit_class      skips every member and attribute of the class,
+      visit_field      skips the field's attributes,
+      visit_method     skips the method's attributes, including its Code,
+      visit_attribute  skips the attribute; for Code that is the method body,
+      visit_code       skips the instructions, exception handlers and Code attributes.
+    Names and descriptors are passed as str. Nothing is kept once a hook returns.
+    """
+
+    def visit_constant_pool(self, pool: ConstantPool):
+        # the lazily decoded pool, usable until the class is done
+        pass
+
+    def visit_constant(self, index, constant: Constant):
+        pass
+
+    def visit_class(self, version: Tuple[int, int], access_flags, name, super_name: Optional[str],
+                    interfaces: List[str]):
+        pass
+
+    def visit_field(self, access_flags, name, descriptor):
+        pass
+
+    def visit_field_end(self):
+        pass
+
+    def visit_method(self, access_flags, name, descriptor):
+        pass
+
+    def visit_attribute(self, name, body: BufferStream):
+        # body is a window over the attribute's bytes, e.g. for ATTRIBUTES[name](None, body)
+        pass
+
+    def visit_code(self, max_stack, max_locals, code_length):
+        pass
+
+    def visit_insn(self, addr, opcode, operands: Tuple):
+        # operands as decoded by the opcode's Instruction class, in FIELDS order
+        pass
+
+    def visit_try_catch(self, start_pc, end_pc, handler_pc, catch_type):
+        pass
+
+    def visit_code_end(self):
+        pass
+
+    def visit_method_end(self):
+        pass
+
+    def visit_end(self):
+        pass
+
+
+def _overrides(visitor, hook) -> bool:
+    return getattr(type(visitor), hook) is not getattr(ClassVisitor, hook)
+
+
+def visit(stream: Stream, visitor: ClassVisitor):
+    """Reads one class from `stream`, reporting it to `visitor` as it goes."""
+    _Reader(stream, visitor).read()
+
+
+class _Reader(object):
+    def __init__(self, stream: Stream, visitor: ClassVisitor):
+        self.stream = stream.to_buffer()
+        self.visitor = visitor
+        self.pool = None
+        self.classes = _overrides(visitor, 'visit_class')
+        self.fields = _overrides(visitor, 'visit_field')
+        self.methods = _overrides(visitor, 'visit_method')
+        self.attributes = _overrides(visitor, 'visit_attribute')
+        self.insns = _overrides(visitor, 'visit_insn')
+        self.handlers = _overrides(visitor, 'visit_try_catch')
+        # Code bodies are only worth finding when something looks inside them
+        self.code = self.insns or self.handlers or any(
+            _overrides(visitor, hook) for hook in ('visit_code', 'visit_code_end'))
+
+    def utf8(self, index) -> str:
+        return self.pool[index].value
+
+    def class_name(self, index) -> str:
+        return self.utf8(self.pool[index].name_index)
+
+    def read(self):
+        stream = self.stream
+        visitor = self.visitor
+        if stream.read_u4() != 0xCAFEBABE:
+            raise Exception('Wrong magic')
+        minor_version, major_version = stream.read_fields('u2 u2')
+        pool = self.pool = ConstantPool(stream)
+        visitor.visit_constant_pool(pool)
+        if _overrides(visitor, 'visit_constant'):
+            for i in range(1, len(pool)):
+                const = pool[i]
+                if const is not None:
+                    visitor.visit_constant(i, const)
+        access_flags, this_class, super_class = stream.read_fields('u2 u2 u2')
+        interfaces = [stream.read_u2() for _ in range(stream.read_u2())]
+        if self.classes and visitor.visit_class(
+                (major_version, minor_version), access_flags, self.class_name(this_class),
+                self.class_name(super_class) if super_class else None, list(map(self.class_name, interfaces))) is SKIP:
+            return
+        for _ in range(stream.read_u2()):
+            access_flags, name_index, descriptor_index = stream.read_fields('u2 u2 u2')
+            if self.fields and visitor.visit_field(
+                    access_flags, self.utf8(name_index), self.utf8(descriptor_index)) is SKIP:
+                skip_attributes(stream)
+            else:
+                self.read_attributes(stream)
+            visitor.visit_field_end()
+        for _ in range(stream.read_u2()):
+            access_flags, name_index, descriptor_index = stream.read_fields('u2 u2 u2')
+            if self.methods and visitor.visit_method(
+                    access_flags, self.utf8(name_index), self.utf8(descriptor_index)) is SKIP:
+                skip_attributes(stream)
+            else:
+                self.read_attributes(stream)
+            visitor.visit_method_end()
+        self.read_attributes(stream)
+        visitor.visit_end()
+
+    def read_attributes(self, stream: BufferStream):
+        if not self.attributes and not self.code:
+            skip_attributes(stream)
+            return
+        visitor = self.visitor
+        pool = self.pool
+        for _ in range(stream.read_u2()):
+            name_index, length = stream.read_fields('u2 u4')
+            start = stream.pos
+            stream.skip(length)
+            if self.attributes:
+                name = self.utf8(name_index)
+                if visitor.visit_attribute(name, BufferStream(stream.buffer, start, length)) is SKIP:
+                    continue
+                is_code = name == 'Code'
+            else:
+                is_code = pool[name_index].bytes == b'Code'
+            if is_code and self.code:
+                self.read_code(BufferStream(stream.buffer, start, length))
+
+    def read_code(self, stream: BufferStream):
+        visitor = self.visitor
+        max_stack, max_locals, code_length = stream.read_fields('u2 u2 u4')
+        if visitor.visit_code(max_stack, max_locals, code_length) is SKIP:
+            return
+        if self.insns:
+            # a window of its own, so tell() is the pc that switch padding is aligned to
+            code = BufferStream(stream.buffer, stream.pos, code_length)
+            visit_insn = visitor.visit_insn
+            readers = READERS
+            read_u1 = code.read_u1
+            tell = code.tell
+            addr = 0
+            while addr < code_length:
+                opcode = read_u1()
+                visit_insn(addr, opcode, readers[opcode](addr, code))
+                addr = tell()
+        stream.skip(code_length)
+        count = stream.read_u2()
+        if self.handlers:
+            for _ in range(count):
+                visitor.visit_try_catch(*stream.read_fields('u2 u2 u2 u2'))
+        else:
+            stream.skip(8 * count)
+        self.read_attributes(stream)
+        visitor.visit_code_end()
+
+
+if __name__ == "__main__":
+    import sys
+    from instruction import INSTRUCTIONS
+
+    class Printer(ClassVisitor):
+        def visit_class(self, version, access_flags, name, super_name, interfaces):
+            print('class {} extends {}{}'.format(
+                name, super_name, ' implements ' + ', '.join(interfaces) if interfaces else ''))
+
+        def visit_field(self, access_flags, name, descriptor):
+            print('  {} {}'.format(name, descriptor))
+            return SKIP
+
+        def visit_method(self, access_flags, name, descriptor):
+            print('  {}{}'.format(name, descriptor))
+
+        def visit_attribute(self, name, body):
+            if name != 'Code':
+                return SKIP
+
+        def visit_insn(self, addr, opcode, operands):
+            print('    {:>4}: {:15} {}'.format(addr, INSTRUCTIONS[opcode].NAME, ' '.join(map(str, operands))))
+
+    for path in sys.argv[1:]:
+        with open(path, 'rb') as f:
+            visit(BufferStream(f.read()), Printer())
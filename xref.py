@@ -0,0 +1,247 @@
+import sys
+from array import array
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+import store
+from attribute import Code
+from base import Object
+from classfile import ClassFile
+from classpath import parse_classpath
+from const import ClassInfo, InvokeDynamic, RefInfo
+from instruction import Ins
+
+XREF_OPCODES = frozenset(cls.OPCODE for cls in (
+    Ins.invokevirtual, Ins.invokestatic, Ins.invokespecial, Ins.invokeinterface, Ins.invokedynamic,
+    Ins.getfield, Ins.putfield, Ins.getstatic, Ins.putstatic, Ins.new, Ins.checkcast, Ins.instanceof))
+
+# (owner, name, descriptor); class references have an empty name and descriptor and
+# invokedynamic call sites an empty owner
+Key = Tuple[str, str, str]
+
+
+def resolve_key(cf: ClassFile, index) -> Key:
+    const = cf.constants[index]
+    if isinstance(const, ClassInfo):
+        return cf.get_utf8(const.name_index), '', ''
+    nat = cf.constants[const.name_and_type_index]
+    name, descriptor = cf.get_utf8(nat.name_index), cf.get_utf8(nat.descriptor_index)
+    if isinstance(const, RefInfo):
+        return cf.get_class_name(const.class_index), name, descriptor
+    if isinstance(const, InvokeDynamic):
+        return '', name, descriptor
+    raise ValueError('constant #{} is not a reference: {!r}'.format(index, const))
+
+
+def class_refs(cf: ClassFile) -> Tuple[str, List[Tuple[Key, str, int]]]:
+    """(class name, [(key, method name + descriptor, pc), ...]) for every reference made by the bytecode."""
+    keys = {}
+    refs = []
+    opcodes_of_interest = XREF_OPCODES
+    for m in cf.methods:
+        code = m.get_attribute(Code)
+        if code is None:
+            continue
+        method = cf.get_utf8(m.name_index) + cf.get_utf8(m.descriptor_index)
+        table = code.table
+        operands = table.operands
+        addrs = table.addrs
+        for row, opcode in enumerate(table.opcodes):
+            if opcode in opcodes_of_interest:
+                index = operands[row]
+                key = keys.get(index)
+                if key is None:
+                    key = keys[index] = resolve_key(cf, index)
+                refs.append((key, method, addrs[row]))
+    return cf.name, refs
+
+
+class XrefIndex(Object):
+    """Inverted index from referenced (owner, name, descriptor) keys to the code that uses them.
+
+    Each key has a posting list of (class id, method id, pc) triples, flattened into
+    one array('i'); class and method ids index the `classes` and `methods` string
+    tables. `class_keys` remembers which keys a class contributed to, so a class can
+    be re-indexed without touching the rest of the index.
+    """
+    MAGIC = b'CFXREF\0\0'
+    VERSION = 1
+
+    def __init__(self):
+        self.classes: List[str] = []
+        self.class_ids: Dict[str, int] = {}
+        self.methods: List[str] = []
+        self.method_ids: Dict[str, int] = {}
+        self.keys: List[Key] = []
+        self.key_ids: Dict[Key, int] = {}
+        self.postings: List[array] = []
+        self.class_keys: Dict[int, Set[int]] = {}
+
+    @staticmethod
+    def _intern(table, ids, value) -> int:
+        i = ids.get(value)
+        if i is None:
+            i = ids[value] = len(table)
+            table.append(value)
+        return i
+
+    def _key_id(self, key) -> int:
+        i = self.key_ids.get(key)
+        if i is None:
+            i = self.key_ids[key] = len(self.keys)
+            self.keys.append(key)
+            self.postings.append(array('i'))
+        return i
+
+    def add(self, class_name, refs: Iterable[Tuple[Key, str, int]]):
+        """Indexes the references of one class, replacing whatever was indexed for it before."""
+        self.remove(class_name)
+        class_id = self._intern(self.classes, self.class_ids, class_name)
+        contributed = self.class_keys[class_id] = set()
+        for key, method, pc in refs:
+            key_id = self._key_id(key)
+            method_id = self._intern(self.methods, self.method_ids, method)
+            self.postings[key_id].extend((class_id, method_id, pc))
+            contributed.add(key_id)
+
+    def add_class(self, cf: ClassFile):
+        self.add(*class_refs(cf))
+
+    def remove(self, class_name):
+        class_id = self.class_ids.get(class_name)
+        if class_id is None:
+            return
+        for key_id in self.class_keys.pop(class_id, ()):
+            old = self.postings[key_id]
+            kept = array('i')
+            for i in range(0, len(old), 3):
+                if old[i] != class_id:
+                    kept.extend(old[i:i + 3])
+            self.postings[key_id] = kept
+
+    def __contains__(self, class_name):
+        return self.class_ids.get(class_name) in self.class_keys
+
+    def __repr__(self):
+        return 'XrefIndex({} classes, {} keys)'.format(len(self.class_keys), len(self.keys))
+
+    def usages(self, owner, name=None, descriptor=None) -> List[Tuple[Key, str, str, int]]:
+        """(key, class, method, pc) for every use of a matching key; None matches any name or descriptor."""
+        if name is not None and descriptor is not None:
+            key_id = self.key_ids.get((owner, name, descriptor))
+            key_ids = [] if key_id is None else [key_id]
+        else:
+            key_ids = [i for i, (o, n, d) in enumerate(self.keys)
+                       if o == owner and (name is None or n == name) and (descriptor is None or d == descriptor)]
+        result = []
+        for key_id in key_ids:
+            key = self.keys[key_id]
+            postings = self.postings[key_id]
+            for i in range(0, len(postings), 3):
+                result.append((key, self.classes[postings[i]], self.methods[postings[i + 1]], postings[i + 2]))
+        return result
+
+    @staticmethod
+    def from_classpath(paths, workers=None) -> 'XrefIndex':
+        index = XrefIndex()
+        index.update_classpath(paths, workers)
+        return index
+
+    def update_classpath(self, paths, workers=None, drop_missing=True) -> List[Tuple[str, str, Optional[str]]]:
+        """Re-indexes every class in `paths`; returns (source, entry, error) for entries that failed.
+        Classes indexed before but not found in `paths`, including those that now fail to
+        parse, are removed unless `drop_missing` is False.
+        """
+        errors = []
+        found = set()
+        for result in parse_classpath(paths, class_refs, workers, lazy=True):
+            if result.ok:
+                self.add(*result.value)
+                found.add(result.value[0])
+            else:
+                errors.append((result.source, result.name, result.error))
+        if drop_missing:
+            for class_id in list(self.class_keys):
+                if self.classes[class_id] not in found:
+                    self.remove(self.classes[class_id])
+        return errors
+
+    def save(self, path):
+        symbols = []
+        symbol_ids = {}
+        key_parts = array('i')
+        for key in self.keys:
+            key_parts.extend(self._intern(symbols, symbol_ids, part) for part in key)
+        posting_offsets = array('I', [0])
+        flat = array('i')
+        for postings in self.postings:
+            flat.extend(postings)
+            posting_offsets.append(len(flat))
+        class_ids = array('i', sorted(self.class_keys))
+        key_offsets = array('I', [0])
+        class_key_ids = array('i')
+        for class_id in class_ids:
+            class_key_ids.extend(sorted(self.class_keys[class_id]))
+            key_offsets.append(len(class_key_ids))
+
+        def write(out):
+            store.write_header(out, self.MAGIC, self.VERSION)
+            store.write_strings(out, self.classes)
+            store.write_strings(out, self.methods)
+            store.write_strings(out, symbols)
+            for values in (key_parts, posting_offsets, flat, class_ids, key_offsets, class_key_ids):
+                store.write_array(out, values)
+        store.save(path, write)
+
+    @staticmethod
+    def load(path) -> 'XrefIndex':
+        stream = store.load(path)
+        store.read_header(stream, XrefIndex.MAGIC, XrefIndex.VERSION)
+        index = XrefIndex()
+        index.classes = store.read_strings(stream)
+        index.class_ids = dict(zip(index.classes, range(len(index.classes))))
+        index.methods = store.read_strings(stream)
+        index.method_ids = dict(zip(index.methods, range(len(index.methods))))
+        symbols = store.read_strings(stream)
+        key_parts = store.read_array(stream, 'i')
+        posting_offsets = store.read_array(stream, 'I')
+        flat = store.read_array(stream, 'i')
+        class_ids = store.read_array(stream, 'i')
+        key_offsets = store.read_array(stream, 'I')
+        class_key_ids = store.read_array(stream, 'i')
+        index.keys = [(symbols[key_parts[i]], symbols[key_parts[i + 1]], symbols[key_parts[i + 2]])
+                      for i in range(0, len(key_parts), 3)]
+        index.key_ids = dict(zip(index.keys, range(len(index.keys))))
+        index.postings = [flat[posting_offsets[i]:posting_offsets[i + 1]] for i in range(len(index.keys))]
+        index.class_keys = {class_id: set(class_key_ids[key_offsets[i]:key_offsets[i + 1]])
+                            for i, class_id in enumerate(class_ids)}
+        return index
+
+
+if __name__ == "__main__":
+    import argparse
+    import os
+
+    parser = argparse.ArgumentParser(description='Build, update or query a bytecode cross-reference index.')
+    sub = parser.add_subparsers(dest='command', required=True)
+    build = sub.add_parser('build', help='index the given paths, updating the index file if it exists')
+    build.add_argument('index')
+    build.add_argument('paths', nargs='+')
+    build.add_argument('-j', '--workers', type=int, default=None)
+    query = sub.add_parser('query')
+    query.add_argument('index')
+    query.add_argument('owner')
+    query.add_argument('name', nargs='?')
+    query.add_argument('descriptor', nargs='?')
+    args = parser.parse_args()
+
+    if args.command == 'build':
+        xref = XrefIndex.load(args.index) if os.path.exists(args.index) else XrefIndex()
+        for source, name, error in xref.update_classpath(args.paths, args.workers):
+            print('{}{}\t{}'.format(source, '!' + name if name else '', error), file=sys.stderr)
+        xref.save(args.index)
+        print(xref)
+    else:
+        xref = XrefIndex.load(args.index)
+        for (owner, name, descriptor), cls, method, pc in xref.usages(args.owner, args.name, args.descriptor):
+            target = owner + ('.' + name + descriptor if name else '')
+            print('{}\t{}.{}@{}'.format(target, cls, method, pc))